@@ -0,0 +1,87 @@
+"""Compares the default SQLite setup with the tuned database profile.
+
+Ingestion commits one downloaded file per transaction like finished downloads do.
+The scan phase times scan queries made while a scan's result batches are queued
+on the writer, once with every call on the writer thread and once with read
+connections.
+
+    python -m benchmarks.bench_database --files 2000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from yt_dlp_bot.database import init_database, open_read_connection
+from yt_dlp_bot.helpers import DatabaseConfig
+from yt_dlp_bot.repositories.async_repository import DatabaseThread
+from yt_dlp_bot.repositories.download_repository import DownloadRepository
+
+def open_db(path: str, profile: DatabaseConfig | None, readers: int = 0) -> DatabaseThread:
+    return DatabaseThread(lambda: init_database(path, profile),
+                          lambda: open_read_connection(path, profile or DatabaseConfig()), readers)
+
+def reset_scan_results(con):
+    with con:
+        con.execute("UPDATE downloaded_files SET is_public = NULL, last_check = NULL")
+
+async def bench_ingest(path: str, profile: DatabaseConfig | None, files: int) -> float:
+    db = open_db(path, profile)
+    download_repo = db.repository(DownloadRepository)
+    start = time.perf_counter()
+    await asyncio.gather(*(download_repo.add_downloaded_file(f"https://youtu.be/{i:011d}", f"/videos/{i}.mp4")
+                           for i in range(files)))
+    elapsed = time.perf_counter() - start
+    db.close()
+    return files / elapsed
+
+async def bench_scan(path: str, profile: DatabaseConfig, readers: int, queries: int) -> tuple[float, float]:
+    """Returns the mean and worst latency of scan queries made while a scan's batched writes are queued"""
+    db = open_db(path, profile, readers)
+    download_repo = db.repository(DownloadRepository)
+    await db.run(reset_scan_results, db.con)
+    file_ids = [file_id for file_id, _ in await download_repo.get_downloaded_files_for_scan(None)]
+    job_id = await download_repo.create_scan_job(None, len(file_ids), None, None)
+    latencies = []
+    reading = True
+    async def read():
+        nonlocal reading
+        for _ in range(queries):
+            start = time.perf_counter()
+            await download_repo.get_downloaded_files_for_scan(None)
+            latencies.append(time.perf_counter() - start)
+        reading = False
+    async def write(worker: int):
+        # Like scan workers flushing result batches, writes keep piling up on the writer thread
+        batch = 0
+        while reading:
+            offset = (batch * 8 + worker) * 10 % len(file_ids)
+            statuses = [(file_id, 1) for file_id in file_ids[offset:offset + 10]]
+            await download_repo.flush_scan_progress(job_id, statuses, 0, offset, offset, 0)
+            batch += 1
+    await asyncio.gather(read(), *(write(worker) for worker in range(8)))
+    db.close()
+    return sum(latencies) / len(latencies), max(latencies)
+
+async def main(files: int, queries: int, readers: int, directory: str | None):
+    tuned = DatabaseConfig(read_connections=readers)
+    with tempfile.TemporaryDirectory(dir=directory) as directory:
+        default_path = os.path.join(directory, 'default.db')
+        tuned_path = os.path.join(directory, 'tuned.db')
+        default_rate = await bench_ingest(default_path, None, files)
+        tuned_rate = await bench_ingest(tuned_path, tuned, files)
+        print(f"ingest: default {default_rate:,.0f} rows/s, tuned {tuned_rate:,.0f} rows/s ({tuned_rate / default_rate:.1f}x)")
+
+        for label, pool_size in (("writer only", 0), (f"{readers} read connections", readers)):
+            mean, worst = await bench_scan(tuned_path, tuned, pool_size, queries)
+            print(f"scan query latency during scan writes, {label}: mean {mean * 1000:.1f} ms, worst {worst * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the bot database profile.")
+    parser.add_argument("--files", type=int, default=2000, help="Downloaded files to ingest")
+    parser.add_argument("--queries", type=int, default=20, help="Scan queries to time")
+    parser.add_argument("--readers", type=int, default=2, help="Read connections in the tuned setup")
+    parser.add_argument("--dir", default=None, help="Directory for the benchmark databases, on the disk to measure")
+    args = parser.parse_args()
+    asyncio.run(main(args.files, args.queries, args.readers, args.dir))
@@ -0,0 +1,74 @@
+"""Times the hot lookups before and after the lookup index migration.
+
+The tables are filled at schema version 1, the version before the indexes, then
+every query is timed and its plan printed. After migrating to the latest version
+the same queries are timed again.
+
+    python -m benchmarks.bench_indexes --rows 1000000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from yt_dlp_bot.database import migrate
+
+QUERIES = {
+    "completion channels for url": ("SELECT guild_id, channel_id FROM completion_channels WHERE url = ?",
+                                    lambda rows: (f"https://youtu.be/{rows // 2:011d}",)),
+    "subscribers of channel": ("SELECT guild_id, channel_id FROM subscribed_channels WHERE youtube_channel = ? AND room_kind = ?",
+                               lambda rows: (f"https://youtube.com/channel/{rows // 2}", "streams")),
+    "scheduled downloads": ("SELECT url, utcepoch FROM future_downloads WHERE valid <> 0 ORDER BY utcepoch ASC",
+                            lambda rows: ()),
+    "downloaded file by path": ("SELECT id FROM downloaded_files WHERE filepath = ?",
+                                lambda rows: (f"/videos/{rows // 2}.mp4",)),
+}
+
+def fill(con: sqlite3.Connection, rows: int):
+    now = int(time.time())
+    with con:
+        con.executemany("INSERT INTO completion_channels VALUES (?, ?, ?)",
+                        ((i % 50, i % 500, f"https://youtu.be/{i:011d}") for i in range(rows)))
+        con.executemany("INSERT INTO subscribed_channels VALUES (?, ?, ?, ?)",
+                        ((i % 50, i % 500, f"https://youtube.com/channel/{i}", "streams") for i in range(rows)))
+        # Nearly all scheduled downloads are days away, a handful are due
+        con.executemany("INSERT INTO future_downloads (url, utcepoch) VALUES (?, ?)",
+                        ((f"https://youtu.be/{i:011d}", now + (i if i < 10 else 86400 + i)) for i in range(rows)))
+        con.executemany("INSERT INTO downloaded_files (url, filepath) VALUES (?, ?)",
+                        ((f"https://youtu.be/{i:011d}", f"/videos/{i}.mp4") for i in range(rows)))
+
+def time_queries(con: sqlite3.Connection, rows: int, repeat: int) -> dict:
+    timings = {}
+    for name, (query, params) in QUERIES.items():
+        plan = " ".join(row[-1] for row in con.execute("EXPLAIN QUERY PLAN " + query, params(rows)))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            con.execute(query, params(rows)).fetchall()
+        timings[name] = ((time.perf_counter() - start) / repeat, plan)
+    return timings
+
+def main(rows: int, repeat: int, directory: str | None):
+    with tempfile.TemporaryDirectory(dir=directory) as directory:
+        con = sqlite3.connect(os.path.join(directory, 'indexes.db'))
+        migrate(con, 1)
+        fill(con, rows)
+        before = time_queries(con, rows, repeat)
+        start = time.perf_counter()
+        migrate(con)
+        print(f"{rows:,} rows per table, migration took {time.perf_counter() - start:.1f} s")
+        after = time_queries(con, rows, repeat)
+        con.close()
+    for name in QUERIES:
+        (old, old_plan), (new, new_plan) = before[name], after[name]
+        print(f"{name}: {old * 1000:.2f} ms -> {new * 1000:.3f} ms ({old / new:,.0f}x)")
+        print(f"    before: {old_plan}")
+        print(f"    after:  {new_plan}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the lookup indexes.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows in each table")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs of each query to average")
+    parser.add_argument("--dir", default=None, help="Directory for the benchmark database")
+    args = parser.parse_args()
+    main(args.rows, args.repeat, args.dir)
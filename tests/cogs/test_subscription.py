@@ -19,7 +19,7 @@ def mock_http_client():
 
 @pytest.fixture
 def mock_subscription_service():
-    return MagicMock()
+    return AsyncMock()
 
 @pytest.fixture
 def mock_config():
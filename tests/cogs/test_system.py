@@ -1,8 +1,10 @@
 import pytest
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch, ANY
 from yt_dlp_bot.cogs.system import System, DownloadedFileListView
 from yt_dlp_bot.helpers import Config
 from yt_dlp_bot.repositories.download_repository import DownloadRepository
+from yt_dlp_bot.services.scan_service import ScanService
 import os
 import discord
 import datetime
@@ -12,8 +14,8 @@ def mock_bot():
     return AsyncMock()
 
 @pytest.fixture
-def download_repository(db_conn):
-    return DownloadRepository(db_conn)
+def download_repository(db):
+    return db.repository(DownloadRepository)
 
 @pytest.fixture
 def mock_downloader():
@@ -32,13 +34,25 @@ def mock_config():
     return config
 
 @pytest.fixture
-def system_cog(mock_bot, download_repository, mock_downloader, mock_download_service, mock_config):
-    return System(mock_bot, download_repository, mock_downloader, mock_download_service, mock_config)
+def mock_notification_service():
+    return AsyncMock()
+
+@pytest.fixture
+def scan_service(download_repository, mock_downloader, mock_notification_service):
+    mock_downloader.metadata_cache.get_channels = AsyncMock(return_value={})
+    return ScanService(mock_downloader, download_repository, mock_notification_service,
+                       concurrency=2, host_interval=0, progress_interval=60)
+
+@pytest.fixture
+def system_cog(mock_bot, download_repository, mock_downloader, mock_download_service, scan_service, mock_config):
+    return System(mock_bot, download_repository, mock_downloader, mock_download_service, scan_service, mock_config)
 
 @pytest.fixture
 def mock_ctx():
     ctx = AsyncMock()
     ctx.defer = AsyncMock()
+    ctx.guild.id = 1
+    ctx.channel.id = 2
     return ctx
 
 @pytest.mark.asyncio
@@ -55,9 +69,9 @@ async def test_list_files_empty(system_cog, mock_ctx, download_repository):
 @pytest.mark.asyncio
 async def test_list_files_not_empty(system_cog, mock_ctx, download_repository):
     # Insert data
-    download_repository.add_downloaded_file("http://url1", "/path/to/[3D] very_long_filename_that_should_be_truncated_at_some_point.mp4")
+    await download_repository.add_downloaded_file("http://url1", "/path/to/[3D] very_long_filename_that_should_be_truncated_at_some_point.mp4")
     # ID is 1
-    download_repository.update_downloaded_file_status(1, 0) # Set to private
+    await download_repository.update_downloaded_file_status(1, 0) # Set to private
     
     with patch("os.path.exists", return_value=True), \
          patch("os.path.getsize", return_value=1024 * 1024 * 5): # 5 MiB
@@ -79,41 +93,41 @@ async def test_list_files_not_empty(system_cog, mock_ctx, download_repository):
 @pytest.mark.asyncio
 async def test_delete_file_success(system_cog, mock_ctx, download_repository):
     # Insert data
-    download_repository.add_downloaded_file("url1", "/path/to/file1.mp4")
+    await download_repository.add_downloaded_file("url1", "/path/to/file1.mp4")
     
     with patch("os.path.exists", return_value=True), \
          patch("os.remove") as mock_remove:
         await system_cog.delete_file.callback(system_cog, mock_ctx, "1")
         
         mock_remove.assert_called_once_with("/path/to/file1.mp4")
-        assert download_repository.get_downloaded_file_by_id(1) is None
+        assert await download_repository.get_downloaded_file_by_id(1) is None
         mock_ctx.send.assert_called_once_with("ID 1: Deleted from disk and DB.")
 
 @pytest.mark.asyncio
 async def test_delete_file_multiple(system_cog, mock_ctx, download_repository):
     # Insert data for ID 1 and 2
-    download_repository.add_downloaded_file("url1", "/path/to/file1.mp4") # ID 1
-    download_repository.add_downloaded_file("url2", "/path/to/file2.mp4") # ID 2
+    await download_repository.add_downloaded_file("url1", "/path/to/file1.mp4") # ID 1
+    await download_repository.add_downloaded_file("url2", "/path/to/file2.mp4") # ID 2
     
     with patch("os.path.exists", side_effect=[True, False]), \
          patch("os.remove") as mock_remove:
         await system_cog.delete_file.callback(system_cog, mock_ctx, "1 3 2")
         
         mock_remove.assert_called_once_with("/path/to/file1.mp4")
-        assert download_repository.get_downloaded_file_by_id(1) is None
-        assert download_repository.get_downloaded_file_by_id(2) is None
+        assert await download_repository.get_downloaded_file_by_id(1) is None
+        assert await download_repository.get_downloaded_file_by_id(2) is None
         
         expected_output = "ID 1: Deleted from disk and DB.\nID 3: No file found.\nID 2: Not on disk, record removed from DB."
         mock_ctx.send.assert_called_once_with(expected_output)
 
 @pytest.mark.asyncio
 async def test_delete_file_not_found_on_disk(system_cog, mock_ctx, download_repository):
-    download_repository.add_downloaded_file("url1", "/path/to/file1.mp4")
+    await download_repository.add_downloaded_file("url1", "/path/to/file1.mp4")
     
     with patch("os.path.exists", return_value=False):
         await system_cog.delete_file.callback(system_cog, mock_ctx, "1")
         
-        assert download_repository.get_downloaded_file_by_id(1) is None
+        assert await download_repository.get_downloaded_file_by_id(1) is None
         mock_ctx.send.assert_called_once_with("ID 1: Not on disk, record removed from DB.")
 
 @pytest.mark.asyncio
@@ -123,8 +137,8 @@ async def test_delete_file_not_in_db(system_cog, mock_ctx, download_repository):
 
 @pytest.mark.asyncio
 async def test_delete_file_multiple_comma_separated(system_cog, mock_ctx, download_repository):
-    download_repository.add_downloaded_file("url1", "/path/to/file1.mp4") # 1
-    download_repository.add_downloaded_file("url2", "/path/to/file2.mp4") # 2
+    await download_repository.add_downloaded_file("url1", "/path/to/file1.mp4") # 1
+    await download_repository.add_downloaded_file("url2", "/path/to/file2.mp4") # 2
     
     with patch("os.path.exists", side_effect=[True, False]), \
          patch("os.remove") as mock_remove:
@@ -147,8 +161,8 @@ async def test_delete_file_empty_input(system_cog, mock_ctx, download_repository
 
 @pytest.mark.asyncio
 async def test_purge_files(system_cog, mock_ctx, download_repository):
-    download_repository.add_downloaded_file("url1", "/path/exists")
-    download_repository.add_downloaded_file("url2", "/path/missing")
+    await download_repository.add_downloaded_file("url1", "/path/exists")
+    await download_repository.add_downloaded_file("url2", "/path/missing")
     
     def exists_side_effect(path):
         return path == "/path/exists"
@@ -156,50 +170,54 @@ async def test_purge_files(system_cog, mock_ctx, download_repository):
     with patch("os.path.exists", side_effect=exists_side_effect):
         await system_cog.purge_files.callback(system_cog, mock_ctx)
         
-        assert download_repository.get_downloaded_file_by_id(1) is not None
-        assert download_repository.get_downloaded_file_by_id(2) is None
+        assert await download_repository.get_downloaded_file_by_id(1) is not None
+        assert await download_repository.get_downloaded_file_by_id(2) is None
         mock_ctx.send.assert_called_once_with("Purged 1 records from the database for missing files.")
 
 @pytest.mark.asyncio
-async def test_scan_files_no_arg(system_cog, mock_ctx, download_repository, mock_downloader):
+async def test_scan_files_no_arg(system_cog, mock_ctx, download_repository, mock_downloader, mock_notification_service):
     # Setup test data:
     # 1. New file (is_public is NULL) - should be scanned
-    download_repository.add_downloaded_file("url_new", "/path1") 
+    await download_repository.add_downloaded_file("url_new", "/path1") 
     # 2. Public file (is_public is 1) - should NOT be scanned
-    download_repository.add_downloaded_file("url_pub", "/path2")
-    download_repository.update_downloaded_file_status(2, 1)
+    await download_repository.add_downloaded_file("url_pub", "/path2")
+    await download_repository.update_downloaded_file_status(2, 1)
     # 3. Private file (is_public is 0) - should NOT be scanned
-    download_repository.add_downloaded_file("url_priv", "/path3")
-    download_repository.update_downloaded_file_status(3, 0)
+    await download_repository.add_downloaded_file("url_priv", "/path3")
+    await download_repository.update_downloaded_file_status(3, 0)
     
     mock_downloader.check_video_availability.return_value = True
     
     await system_cog.scan_files.callback(system_cog, mock_ctx)
+    await system_cog.scan_service.current.task
     
     # Should only scan the NULL one
     mock_downloader.check_video_availability.assert_called_once_with("url_new")
     
     # Verify summary message
-    sent_msgs = [call.args[0] for call in mock_ctx.send.call_args_list]
+    sent_msgs = [call.args[2] for call in mock_notification_service.notify.call_args_list]
     assert any("Scan complete. Scanned: 1, Still Public: 1, Now Private/Unavailable: 0" in m for m in sent_msgs)
 
 @pytest.mark.asyncio
-async def test_scan_files_with_older_than(system_cog, mock_ctx, download_repository, mock_downloader):
+async def test_scan_files_with_older_than(system_cog, mock_ctx, download_repository, mock_downloader, mock_notification_service):
     # Setup test data:
     # 1. New file (is_public is NULL) - should be scanned
-    download_repository.add_downloaded_file("url_new", "/path1") # ID 1
+    await download_repository.add_downloaded_file("url_new", "/path1") # ID 1
     # 2. Recently checked public file (last_check is now) - should NOT be scanned
-    download_repository.add_downloaded_file("url_pub_recent", "/path2") # ID 2
-    download_repository.update_downloaded_file_status(2, 1)
+    await download_repository.add_downloaded_file("url_pub_recent", "/path2") # ID 2
+    await download_repository.update_downloaded_file_status(2, 1)
     # 3. Old public file (last_check is 1 week ago) - SHOULD be scanned
-    download_repository.add_downloaded_file("url_pub_old", "/path3") # ID 3
-    with download_repository.con:
-        download_repository.con.execute("UPDATE downloaded_files SET is_public = 1, last_check = unixepoch() - (86400 * 7) WHERE id = 3")
+    await download_repository.add_downloaded_file("url_pub_old", "/path3") # ID 3
+    def _check_a_week_ago(con):
+        with con:
+            con.execute("UPDATE downloaded_files SET is_public = 1, last_check = unixepoch() - (86400 * 7) WHERE id = 3")
+    await download_repository.db.run(_check_a_week_ago, download_repository.repository.con)
     
     mock_downloader.check_video_availability.side_effect = [True, False]
     
     # Scan files older than 3 days
     await system_cog.scan_files.callback(system_cog, mock_ctx, older_than="3d")
+    await system_cog.scan_service.current.task
     
     # Should scan ID 1 and ID 3
     assert mock_downloader.check_video_availability.call_count == 2
@@ -207,10 +225,47 @@ async def test_scan_files_with_older_than(system_cog, mock_ctx, download_reposit
     mock_downloader.check_video_availability.assert_any_call("url_pub_old")
     
     # Verify result for ID 3 was updated to 0 (since check_video_availability returned False for the 2nd call)
-    files = download_repository.get_downloaded_files()
+    files = await download_repository.get_downloaded_files()
     id_3_info = next(f for f in files if f[0] == 3)
     assert id_3_info[4] == 0 # is_public is 0 (Now Private/Unavailable)
     
     # Verify summary message
-    sent_msgs = [call.args[0] for call in mock_ctx.send.call_args_list]
+    sent_msgs = [call.args[2] for call in mock_notification_service.notify.call_args_list]
     assert any("Scan complete. Scanned: 2, Still Public: 1, Now Private/Unavailable: 1" in m for m in sent_msgs)
+
+@pytest.mark.asyncio
+async def test_scan_files_in_direct_message(system_cog, mock_ctx, download_repository, mock_downloader, mock_notification_service):
+    mock_ctx.guild = None
+    await download_repository.add_downloaded_file("url_new", "/path1")
+    mock_downloader.check_video_availability.return_value = True
+
+    await system_cog.scan_files.callback(system_cog, mock_ctx)
+    await system_cog.scan_service.current.task
+
+    assert "system scan-status" in mock_ctx.send.call_args.args[0]
+    mock_notification_service.notify.assert_not_called()
+    assert "Scanned: 1/1" in system_cog.scan_service.current.progress()
+
+@pytest.mark.asyncio
+async def test_scan_runs_in_background_and_can_be_cancelled(system_cog, mock_ctx, download_repository, mock_downloader, mock_notification_service):
+    await download_repository.add_downloaded_file("url_new", "/path1")
+    release = asyncio.Event()
+    async def slow_check(url):
+        await release.wait()
+        return True
+    mock_downloader.check_video_availability.side_effect = slow_check
+
+    await system_cog.scan_files.callback(system_cog, mock_ctx)
+    job = system_cog.scan_service.current
+    await asyncio.sleep(0)
+    assert job.running
+
+    await system_cog.scan_status.callback(system_cog, mock_ctx)
+    assert "Scanned: 0/1" in mock_ctx.send.call_args.args[0]
+    await system_cog.scan_files.callback(system_cog, mock_ctx)
+    assert "already running" in mock_ctx.send.call_args.args[0]
+
+    await system_cog.scan_cancel.callback(system_cog, mock_ctx)
+    with pytest.raises(asyncio.CancelledError):
+        await job.task
+    assert "Scan cancelled" in mock_notification_service.notify.call_args.args[2]
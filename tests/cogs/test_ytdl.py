@@ -13,12 +13,16 @@ def mock_http_client():
 
 @pytest.fixture
 def mock_download_repository():
-    return MagicMock()
+    return AsyncMock()
 
 @pytest.fixture
 def mock_download_service():
     mock_service = MagicMock()
     mock_service.initiate_download = AsyncMock() # This one is awaited in the cog
+    mock_service.resume_interrupted_downloads = AsyncMock()
+    mock_service.schedule_download = AsyncMock()
+    mock_service.get_scheduled_downloads = AsyncMock()
+    mock_service.cancel_download = AsyncMock()
     return mock_service
 
 @pytest.fixture
@@ -51,9 +55,10 @@ def mock_ctx():
     return ctx
 
 @pytest.mark.asyncio
-async def test_on_ready(ytdl_cog, mock_scheduler_service):
+async def test_on_ready(ytdl_cog, mock_scheduler_service, mock_download_service):
     await ytdl_cog.on_ready()
     mock_scheduler_service.start.assert_called_once()
+    mock_download_service.resume_interrupted_downloads.assert_called_once()
 
 @pytest.mark.asyncio
 async def test_download_command(ytdl_cog, mock_ctx, mock_download_service):
@@ -88,6 +93,13 @@ async def test_running_downloads_command(ytdl_cog, mock_ctx, mock_download_servi
     mock_download_service.get_running_downloads.assert_called_once()
     mock_ctx.send.assert_called_once_with("Running downloads list")
 
+@pytest.mark.asyncio
+async def test_download_history_command(ytdl_cog, mock_ctx, mock_download_service):
+    mock_download_service.get_download_history.return_value = "Download history"
+    await ytdl_cog.download_history.callback(ytdl_cog, mock_ctx)
+    mock_download_service.get_download_history.assert_called_once()
+    mock_ctx.send.assert_called_once_with("Download history")
+
 @pytest.mark.asyncio
 async def test_scheduled_downloads_command(ytdl_cog, mock_ctx, mock_download_service):
     mock_download_service.get_scheduled_downloads.return_value = "Scheduled downloads list"
@@ -1,10 +1,22 @@
 import pytest
 import sqlite3
-from yt_dlp_bot.database import _setup_tables
+from yt_dlp_bot.database import migrate
+from yt_dlp_bot.repositories.async_repository import DatabaseThread
 
 @pytest.fixture
 def db_conn():
     """Provides an in-memory SQLite connection with the schema initialized."""
     con = sqlite3.connect(":memory:")
-    _setup_tables(con)
+    migrate(con)
     return con
+
+@pytest.fixture
+def db():
+    """Provides a DatabaseThread over an in-memory SQLite database with the schema initialized."""
+    def _connect():
+        con = sqlite3.connect(":memory:")
+        migrate(con)
+        return con
+    db = DatabaseThread(_connect)
+    yield db
+    db.close()
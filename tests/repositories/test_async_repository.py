@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import patch
+from yt_dlp_bot.database import DownloadJobState, init_database, open_read_connection
+from yt_dlp_bot.helpers import DatabaseConfig
+from yt_dlp_bot.repositories.async_repository import DatabaseThread, read_only
+from yt_dlp_bot.repositories.download_repository import DownloadRepository
+
+@pytest.fixture
+def download_repo(db):
+    return db.repository(DownloadRepository)
+
+@pytest.mark.asyncio
+async def test_methods_return_results_of_the_repository(download_repo):
+    await download_repo.add_completion_for_url(123, 456, "http://example.com")
+    assert await download_repo.get_completion_channels_for_url("http://example.com") == [(123, 456)]
+    with pytest.raises(AttributeError):
+        download_repo.no_such_method
+
+@pytest.mark.asyncio
+async def test_calls_run_in_order_on_the_database_thread(db):
+    threads = []
+    order = []
+    class Repository:
+        def __init__(self, con):
+            pass
+        def record(self, i):
+            threads.append(threading.current_thread())
+            order.append(i)
+        def fail(self):
+            raise ValueError("failed")
+    repo = db.repository(Repository)
+
+    await asyncio.gather(*(repo.record(i) for i in range(20)))
+    with pytest.raises(ValueError, match="failed"):
+        await repo.fail()
+
+    assert order == list(range(20))
+    assert len(set(threads)) == 1 and threads[0] is not threading.current_thread()
+
+@pytest.mark.asyncio
+async def test_cancelled_call_still_writes(download_repo):
+    task = asyncio.create_task(download_repo.add_downloaded_file("http://url", "/path"))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert len(await download_repo.get_downloaded_files()) == 1
+
+@pytest.mark.asyncio
+async def test_event_loop_lag_stays_bounded_under_write_load(tmp_path):
+    db = DatabaseThread(lambda: init_database(str(tmp_path / "bot.db")))
+    download_repo = db.repository(DownloadRepository)
+    max_lag = 0.0
+    writing = True
+    async def measure_lag():
+        nonlocal max_lag
+        while writing:
+            start = time.monotonic()
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.monotonic() - start - 0.001)
+    async def write(i):
+        # Every call is its own transaction with a commit on disk
+        for j in range(10):
+            url = f"http://video{i}-{j}"
+            await download_repo.add_download_job(url, False, 1, {})
+            await download_repo.update_download_job_state(url, DownloadJobState.DONE)
+            await download_repo.add_downloaded_file(url, "/path")
+
+    ticker = asyncio.create_task(measure_lag())
+    await asyncio.sleep(0)
+    await asyncio.gather(*(write(i) for i in range(50)))
+    writing = False
+    await ticker
+
+    assert len(await download_repo.get_downloaded_files()) == 500
+    db.close()
+    assert max_lag < 0.05
+
+@pytest.mark.asyncio
+async def test_reads_run_on_read_connections(tmp_path):
+    path = str(tmp_path / "bot.db")
+    profile = DatabaseConfig()
+    db = DatabaseThread(lambda: init_database(path, profile), lambda: open_read_connection(path, profile), readers=2)
+    download_repo = db.repository(DownloadRepository)
+    reader_threads = set()
+    get_downloaded_files = DownloadRepository.get_downloaded_files
+    @read_only
+    def record_thread(self):
+        reader_threads.add(threading.current_thread().name)
+        return get_downloaded_files(self)
+
+    with patch.object(DownloadRepository, 'get_downloaded_files', record_thread):
+        await download_repo.add_downloaded_file("http://url", "/path")
+        # Awaited writes are visible to the next read
+        files = await asyncio.gather(*(download_repo.get_downloaded_files() for _ in range(10)))
+    db.close()
+
+    assert all(len(result) == 1 for result in files)
+    assert reader_threads and all(name.startswith('database-reader') for name in reader_threads)
+
+@pytest.mark.asyncio
+async def test_unmarked_methods_run_on_the_writer(tmp_path):
+    path = str(tmp_path / "bot.db")
+    profile = DatabaseConfig()
+    db = DatabaseThread(lambda: init_database(path, profile), lambda: open_read_connection(path, profile), readers=2)
+    class Repository(DownloadRepository):
+        # Reads by its name but writes, a read-only connection would refuse it
+        def get_or_add_downloaded_file(self, url, filepath):
+            if not self.get_downloaded_files():
+                self.add_downloaded_file(url, filepath)
+            return self.get_downloaded_files()
+    repo = db.repository(Repository)
+
+    assert len(await repo.get_or_add_downloaded_file("http://url", "/path")) == 1
+    db.close()
+
+def test_close_checkpoints_the_write_ahead_log(tmp_path):
+    path = tmp_path / "bot.db"
+    profile = DatabaseConfig()
+    db = DatabaseThread(lambda: init_database(str(path), profile), lambda: open_read_connection(str(path), profile), readers=1)
+    asyncio.run(db.repository(DownloadRepository).add_downloaded_file("http://url", "/path"))
+    db.close()
+
+    wal = tmp_path / "bot.db-wal"
+    assert not wal.exists() or wal.stat().st_size == 0
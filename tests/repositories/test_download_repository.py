@@ -2,7 +2,7 @@
 import sqlite3
 import pytest
 from yt_dlp_bot.repositories.download_repository import DownloadRepository
-from yt_dlp_bot.database import YoutubeWaitingRoom, RoomKind
+from yt_dlp_bot.database import YoutubeWaitingRoom, RoomKind, DownloadJobState, ScanJobState
 
 @pytest.fixture
 def download_repo(db_conn: sqlite3.Connection):
@@ -13,6 +13,13 @@ def test_add_and_get_completion_for_url(download_repo):
     result = download_repo.get_completion_channel_for_url("http://example.com")
     assert result == (123, 456)
 
+def test_get_completion_channels_for_url(download_repo):
+    download_repo.add_completion_for_url(123, 456, "http://example.com")
+    download_repo.add_completion_for_url(123, 789, "http://example.com")
+    download_repo.add_completion_for_url(123, 456, "http://other.com")
+    result = download_repo.get_completion_channels_for_url("http://example.com")
+    assert sorted(result) == [(123, 456), (123, 789)]
+
 def test_delete_completion_for_url(download_repo):
     download_repo.add_completion_for_url(123, 456, "http://example.com")
     download_repo.delete_completion_for_url("http://example.com")
@@ -49,16 +56,6 @@ def test_cleanup_future_downloads(download_repo, db_conn):
     assert "old" not in urls
     assert "recent" in urls
 
-def test_get_downloads_now(download_repo, db_conn):
-    # Now is 1000, threshold is 100
-    # Download at 1050 should be picked up (1050 < 1000 + 100)
-    db_conn.execute("INSERT INTO future_downloads (url, utcepoch) VALUES (?, unixepoch() + 50)", ("nowish",))
-    db_conn.execute("INSERT INTO future_downloads (url, utcepoch) VALUES (?, unixepoch() + 150)", ("later",))
-    
-    results = download_repo.get_downloads_now(100)
-    assert "nowish" in results
-    assert "later" not in results
-
 def test_add_subscribed_waiting_room_when_subscribed(download_repo, db_conn):
     # Setup subscription
     db_conn.execute("""INSERT INTO subscribed_channels (youtube_channel, room_kind, guild_id, channel_id) 
@@ -71,6 +68,16 @@ def test_add_subscribed_waiting_room_when_subscribed(download_repo, db_conn):
     cursor = db_conn.execute("SELECT url FROM future_downloads WHERE url=?", (room.url,))
     assert cursor.fetchone() is not None
 
+def test_add_subscribed_waiting_room_already_scheduled(download_repo, db_conn):
+    db_conn.execute("""INSERT INTO subscribed_channels (youtube_channel, room_kind, guild_id, channel_id) 
+                       VALUES (?, ?, ?, ?)""", ("chan1", "streams", 1, 1))
+    room = YoutubeWaitingRoom(channel_id="chan1", video_id="vid1", title="test", kind=RoomKind.STREAM, utcepoch=3000)
+    assert download_repo.add_subscribed_waiting_room(room, room.url) is True
+    download_repo.add_downloaded_file("http://other", "/path")
+
+    # Also after other inserts on the connection
+    assert download_repo.add_subscribed_waiting_room(room, room.url) is False
+
 def test_add_subscribed_waiting_room_when_not_subscribed(download_repo, db_conn):
     room = YoutubeWaitingRoom(channel_id="chan1", video_id="vid1", title="test", kind=RoomKind.STREAM, utcepoch=3000)
     added = download_repo.add_subscribed_waiting_room(room, room.url)
@@ -79,11 +86,39 @@ def test_add_subscribed_waiting_room_when_not_subscribed(download_repo, db_conn)
     cursor = db_conn.execute("SELECT url FROM future_downloads WHERE url=?", (room.url,))
     assert cursor.fetchone() is None
 
-def test_delete_future_download(download_repo, db_conn):
-    db_conn.execute("INSERT INTO future_downloads (url, utcepoch) VALUES (?, ?)", ("http://example.com/delete", 1000))
-    download_repo.delete_future_download("http://example.com/delete")
-    cursor = db_conn.execute("SELECT COUNT(*) FROM future_downloads WHERE url=?", ("http://example.com/delete",))
-    assert cursor.fetchone()[0] == 0
+def test_claim_future_download(download_repo, db_conn):
+    download_repo.add_future_download("http://due", 1000)
+    download_repo.add_future_download("http://rescheduled", 2000)
+    download_repo.add_future_download("http://cancelled", 1000)
+    download_repo.disable_future_download("http://cancelled")
+
+    assert download_repo.claim_future_download("http://due", 1000) is True
+    assert download_repo.claim_future_download("http://due", 1000) is False
+    assert download_repo.claim_future_download("http://rescheduled", 1000) is False
+    assert download_repo.claim_future_download("http://cancelled", 1000) is False
+    assert [url for (url,) in db_conn.execute("SELECT url FROM future_downloads ORDER BY url")] == ["http://cancelled", "http://rescheduled"]
+
+def test_reschedule_future_downloads(download_repo, db_conn):
+    download_repo.add_future_download("http://moved", 1000)
+    download_repo.add_future_download("http://gone", 1000)
+    download_repo.add_future_download("http://changed", 1500)
+    download_repo.add_future_download("http://cancelled", 1000)
+    download_repo.disable_future_download("http://cancelled")
+
+    changed = download_repo.reschedule_future_downloads(
+        [("http://moved", 1000, 2000), ("http://changed", 1000, 2000), ("http://cancelled", 1000, 2000)],
+        [("http://gone", 1000)])
+
+    assert changed == ["http://moved", "http://gone"]
+    assert sorted(db_conn.execute("SELECT url, utcepoch FROM future_downloads").fetchall()) == [
+        ("http://cancelled", 1000), ("http://changed", 1500), ("http://moved", 2000)]
+
+def test_get_future_download(download_repo):
+    download_repo.add_future_download("http://url", 1000)
+    assert download_repo.get_future_download("http://url") == (1000, 1)
+    download_repo.disable_future_download("http://url")
+    assert download_repo.get_future_download("http://url") == (1000, 0)
+    assert download_repo.get_future_download("http://other") is None
 
 def test_disable_future_download(download_repo, db_conn):
     db_conn.execute("INSERT INTO future_downloads (url, utcepoch, valid) VALUES (?, ?, 1)", ("http://example.com/disable", 1000))
@@ -162,3 +197,45 @@ def test_delete_downloaded_file(download_repo, db_conn):
     download_repo.delete_downloaded_file(file_id + 100)
     results_after_non_existent_delete = download_repo.get_downloaded_files()
     assert len(results_after_non_existent_delete) == 0
+
+def test_download_job_lifecycle(download_repo):
+    download_repo.add_download_job("http://url", False, 1, {'wait_for_video': [15, 60]})
+    download_repo.start_download_job("http://url")
+    download_repo.set_download_job_partial_path("http://url", "/tmp/video.mp4.part")
+
+    jobs = download_repo.get_unfinished_download_jobs()
+    assert len(jobs) == 1
+    assert jobs[0].state == DownloadJobState.RUNNING
+    assert jobs[0].attempts == 1
+    assert jobs[0].extra_args == {'wait_for_video': [15, 60]}
+    assert jobs[0].partial_path == "/tmp/video.mp4.part"
+
+    download_repo.update_download_job_state("http://url", DownloadJobState.DONE)
+    assert download_repo.get_unfinished_download_jobs() == []
+
+def test_add_download_job_resets_existing_job(download_repo):
+    download_repo.add_download_job("http://url", True, 0, {})
+    download_repo.start_download_job("http://url")
+    download_repo.update_download_job_state("http://url", DownloadJobState.FAILED)
+
+    download_repo.add_download_job("http://url", True, 0, {})
+    jobs = download_repo.get_unfinished_download_jobs()
+    assert jobs[0].state == DownloadJobState.QUEUED
+    assert jobs[0].attempts == 0
+    assert jobs[0].streamlink is True
+
+def test_scan_job_checkpoint(download_repo, db_conn):
+    for i in range(3):
+        download_repo.add_downloaded_file(f"http://url{i}", f"/path{i}")
+    job_id = download_repo.create_scan_job(86400.0, 3, 1, 2)
+
+    download_repo.flush_scan_progress(job_id, [(1, 1), (2, 0)], 2, 2, 1, 1)
+
+    job = download_repo.get_interrupted_scan_job()
+    assert (job.id, job.older_than_s, job.cursor, job.scanned, job.public, job.unavailable) == (job_id, 86400.0, 2, 2, 1, 1)
+    statuses = db_conn.execute("SELECT id, is_public FROM downloaded_files ORDER BY id").fetchall()
+    assert statuses == [(1, 1), (2, 0), (3, None)]
+    assert download_repo.get_downloaded_files_for_scan(None, after_id=2) == [(3, "http://url2")]
+
+    download_repo.finish_scan_job(job_id, ScanJobState.DONE)
+    assert download_repo.get_interrupted_scan_job() is None
@@ -0,0 +1,49 @@
+import sqlite3
+import pytest
+from yt_dlp_bot.repositories.metadata_repository import MetadataRepository
+
+@pytest.fixture
+def metadata_repo(db_conn: sqlite3.Connection):
+    return MetadataRepository(db_conn)
+
+def test_put_and_get_video_metadata(metadata_repo):
+    metadata_repo.put_video_metadata("vid1", {'title': 'video'}, None, 2000.0)
+    assert metadata_repo.get_video_metadata("vid1") == ({'title': 'video'}, None, 2000.0)
+
+    metadata_repo.put_video_metadata("vid1", None, "Private video", 3000.0)
+    assert metadata_repo.get_video_metadata("vid1") == (None, "Private video", 3000.0)
+
+def test_get_video_metadata_missing(metadata_repo):
+    assert metadata_repo.get_video_metadata("vid1") is None
+
+def test_cleanup_video_metadata(metadata_repo, db_conn):
+    metadata_repo.put_video_metadata("old", {}, None, 0)
+    metadata_repo.put_video_metadata("new", {}, None, 32503680000)
+    metadata_repo.cleanup_video_metadata()
+    rows = db_conn.execute("SELECT video_id FROM video_metadata").fetchall()
+    assert rows == [("new",)]
+
+def test_video_channels(metadata_repo):
+    metadata_repo.set_video_channel("vid1", "https://www.youtube.com/@a")
+    metadata_repo.set_video_channel("vid2", "https://www.youtube.com/@b")
+    metadata_repo.set_video_channel("vid1", "https://www.youtube.com/@c")
+    assert metadata_repo.get_video_channels(["vid1", "vid3"]) == {"vid1": "https://www.youtube.com/@c"}
+
+def test_handle_does_not_replace_channel_url(metadata_repo):
+    metadata_repo.set_video_channel("vid1", "https://www.youtube.com/channel/UC1")
+    metadata_repo.set_video_channel("vid1", "https://www.youtube.com/@a")
+    assert metadata_repo.get_video_channels(["vid1"]) == {"vid1": "https://www.youtube.com/channel/UC1"}
+
+def test_video_channels_resolve_known_handles(metadata_repo):
+    metadata_repo.set_video_channel("vid1", "https://www.youtube.com/@a")
+    metadata_repo.set_video_channel("vid2", "https://www.youtube.com/channel/UC1")
+    metadata_repo.set_channel_handle("https://www.youtube.com/@a", "https://www.youtube.com/channel/UC1")
+    assert metadata_repo.get_video_channels(["vid1", "vid2"]) == {"vid1": "https://www.youtube.com/channel/UC1",
+                                                                  "vid2": "https://www.youtube.com/channel/UC1"}
+
+def test_get_video_channels_in_chunks(metadata_repo):
+    video_ids = [f"vid{i}" for i in range(1200)]
+    for video_id in video_ids[::100]:
+        metadata_repo.set_video_channel(video_id, "https://www.youtube.com/channel/UC1")
+    assert metadata_repo.get_video_channels(video_ids) == {video_id: "https://www.youtube.com/channel/UC1"
+                                                           for video_id in video_ids[::100]}
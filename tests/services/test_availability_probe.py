@@ -0,0 +1,57 @@
+import httpx
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from yt_dlp_bot.services.availability_probe import OEmbedProbe, ProbeResult
+
+@pytest.fixture
+def probe():
+    probe = OEmbedProbe()
+    probe.client = MagicMock()
+    probe.client.get = AsyncMock()
+    return probe
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("status_code, expected", [
+    (200, ProbeResult.PUBLIC),
+    (404, ProbeResult.UNAVAILABLE),
+    (401, ProbeResult.AMBIGUOUS),
+    (403, ProbeResult.AMBIGUOUS),
+    (500, ProbeResult.AMBIGUOUS),
+])
+async def test_probe_classifies_status(probe, status_code, expected):
+    probe.client.get.return_value = MagicMock(status_code=status_code)
+    result, _ = await probe.probe("https://youtu.be/dQw4w9WgXcQ")
+    assert result == expected
+    probe.client.get.assert_called_once_with(
+        "https://www.youtube.com/oembed",
+        params={'url': "https://www.youtube.com/watch?v=dQw4w9WgXcQ", 'format': 'json'})
+
+@pytest.mark.asyncio
+async def test_probe_skips_other_sites(probe):
+    assert await probe.probe("https://example.com/video") == (ProbeResult.AMBIGUOUS, None)
+    probe.client.get.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_probe_network_error_is_ambiguous(probe):
+    probe.client.get.side_effect = httpx.ConnectError("boom")
+    assert await probe.probe("https://youtu.be/dQw4w9WgXcQ") == (ProbeResult.AMBIGUOUS, None)
+
+@pytest.mark.asyncio
+async def test_probe_reports_channel_of_public_videos(probe):
+    response = MagicMock(status_code=200)
+    response.json.return_value = {'title': 'video', 'author_url': 'https://www.youtube.com/@channel'}
+    probe.client.get.return_value = response
+    assert await probe.probe("https://youtu.be/dQw4w9WgXcQ") == (ProbeResult.PUBLIC, 'https://www.youtube.com/@channel')
+
+def test_probe_uses_proxy():
+    with patch('httpx.AsyncClient') as mock_client:
+        OEmbedProbe(timeout=5.0, proxy="http://proxy.example:3128")
+    mock_client.assert_called_once_with(timeout=5.0, proxy="http://proxy.example:3128")
+
+@pytest.mark.asyncio
+async def test_probe_disabled_when_proxy_is_unsupported():
+    with patch('httpx.AsyncClient', side_effect=ImportError("socksio is not installed")):
+        probe = OEmbedProbe(proxy="socks5://proxy.example:1080")
+    assert await probe.probe("https://youtu.be/dQw4w9WgXcQ") == (ProbeResult.AMBIGUOUS, None)
+    await probe.aclose()
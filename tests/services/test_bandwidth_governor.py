@@ -0,0 +1,50 @@
+import pytest
+from unittest.mock import MagicMock
+from yt_dlp_bot.services.bandwidth_governor import BandwidthGovernor, RateLimit
+from yt_dlp_bot.services.download_queue import DownloadPriority
+
+MiB = 1024 * 1024
+
+def test_unlimited_without_budget():
+    governor = BandwidthGovernor(None, 2 * MiB, MiB // 4)
+    rate_limit = RateLimit()
+    governor.register("vod", DownloadPriority.VOD, rate_limit)
+    assert rate_limit.value is None
+
+def test_vods_share_budget_left_by_live_reserve():
+    governor = BandwidthGovernor(10 * MiB, 2 * MiB, MiB // 4)
+    live, vod1, vod2 = RateLimit(), RateLimit(), RateLimit()
+    governor.register("live", DownloadPriority.LIVE, live)
+    governor.register("vod1", DownloadPriority.VOD, vod1)
+    assert vod1.value == 8 * MiB
+    governor.register("vod2", DownloadPriority.VOD, vod2)
+    assert live.value is None
+    assert vod1.value == 4 * MiB
+    assert vod2.value == 4 * MiB
+
+def test_rebalances_when_jobs_finish():
+    governor = BandwidthGovernor(10 * MiB, 2 * MiB, MiB // 4)
+    live, vod = RateLimit(), RateLimit()
+    governor.register("live", DownloadPriority.LIVE, live)
+    governor.register("vod", DownloadPriority.VOD, vod)
+    governor.unregister("live")
+    assert vod.value == 10 * MiB
+
+def test_vod_limit_floor():
+    governor = BandwidthGovernor(4 * MiB, 2 * MiB, MiB)
+    for name in ("live1", "live2"):
+        governor.register(name, DownloadPriority.LIVE, RateLimit())
+    vod = RateLimit()
+    governor.register("vod", DownloadPriority.VOD, vod)
+    assert vod.value == MiB
+
+def test_rate_limit_notifies_bound_targets():
+    rate_limit = RateLimit(100)
+    apply = MagicMock()
+    rate_limit.bind(apply)
+    apply.assert_called_once_with(100)
+    rate_limit.set(200)
+    rate_limit.set(200)
+    rate_limit.unbind(apply)
+    rate_limit.set(300)
+    assert [c.args[0] for c in apply.call_args_list] == [100, 200]
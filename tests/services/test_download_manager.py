@@ -3,8 +3,12 @@ import asyncio
 import threading
 import datetime
 import os
+import collections
 from unittest.mock import MagicMock, patch, AsyncMock
-from yt_dlp_bot.services.download_manager import DownloadManager, DownloadTask
+from yt_dlp_bot.services.download_manager import DownloadManager, DownloadTask, config
+from yt_dlp_bot.services.download_queue import DownloadPriority
+from yt_dlp_bot.services.ytdl_pool import YoutubeDLPool
+from yt_dlp_bot.database import DownloadJobState, DownloadJobModel
 
 @pytest.fixture
 def mock_downloader():
@@ -12,8 +16,9 @@ def mock_downloader():
 
 @pytest.fixture
 def mock_repo():
-    m = MagicMock()
+    m = AsyncMock()
     m.get_completion_channel_for_url.return_value = None
+    m.get_completion_channels_for_url.return_value = []
     return m
 
 @pytest.fixture
@@ -22,7 +27,7 @@ def mock_notif():
 
 @pytest.fixture
 def download_manager(mock_downloader, mock_repo, mock_notif):
-    return DownloadManager(mock_downloader, mock_repo, mock_notif)
+    return DownloadManager(mock_downloader, mock_repo, mock_notif, YoutubeDLPool())
 
 @pytest.mark.asyncio
 async def test_start_download_adds_to_repo_and_tasks(download_manager, mock_repo):
@@ -33,29 +38,124 @@ async def test_start_download_adds_to_repo_and_tasks(download_manager, mock_repo
         await download_manager.start_download("http://url", 123, 456)
         
         mock_repo.add_completion_for_url.assert_called_once_with(123, 456, "http://url")
-        mock_create.assert_called_once_with("http://url", False, {}, False)
+        mock_repo.add_download_job.assert_called_once_with("http://url", False, DownloadPriority.VOD, {})
+        mock_create.assert_called_once_with("http://url", False, {}, False, DownloadPriority.VOD, None)
         assert download_manager.current_downloads["http://url"] == mock_task
 
-def test_cancel_download_success(download_manager):
+@pytest.mark.asyncio
+async def test_cancel_download_success(download_manager):
     mock_task = MagicMock(spec=DownloadTask)
+    mock_task.url = "http://url"
     mock_task.event = MagicMock(spec=threading.Event)
     download_manager.current_downloads["http://url"] = mock_task
     
-    result = download_manager.cancel_download("http://url")
+    result = await download_manager.cancel_download("http://url")
     assert result is True
     mock_task.event.set.assert_called_once()
 
-def test_cancel_download_not_running(download_manager):
-    result = download_manager.cancel_download("http://url")
+@pytest.mark.asyncio
+async def test_cancel_download_refused_while_remuxing(download_manager, mock_repo):
+    download_task = DownloadTask(None, threading.Event(), "http://url", state=DownloadJobState.REMUXING)
+    download_manager.current_downloads["http://url"] = download_task
+
+    assert await download_manager.cancel_download("http://url") is False
+    assert download_task.state == DownloadJobState.REMUXING
+    assert not download_task.event.is_set()
+    mock_repo.update_download_job_state.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_cancel_download_queued(download_manager):
+    download_manager.queue.max_concurrent = 0
+    await download_manager.start_download("http://url")
+    download_task = download_manager.current_downloads["http://url"]
+    await asyncio.sleep(0)
+    assert download_manager.queue.depth == 1
+
+    assert await download_manager.cancel_download("http://url") is True
+    with pytest.raises(asyncio.CancelledError):
+        await download_task.task
+    assert download_manager.queue.depth == 0
+
+@pytest.mark.asyncio
+async def test_preempted_download_is_requeued(download_manager):
+    download_manager.queue.max_concurrent = 1
+    attempts = []
+    vod_started = asyncio.Event()
+
+    async def fake_download(url, notify, extra_args, event, progress=None, rate_limit=None, info=None):
+        attempts.append((url, notify))
+        if url == "http://vod" and len(attempts) == 1:
+            vod_started.set()
+            while not event.is_set():
+                await asyncio.sleep(0)
+            raise asyncio.CancelledError
+
+    with patch.object(download_manager, '_download', side_effect=fake_download):
+        await download_manager.start_download("http://vod", notify=True)
+        await vod_started.wait()
+        await download_manager.start_download("http://live", notify=True, priority=DownloadPriority.LIVE)
+        tasks = [d.task for d in download_manager.current_downloads.values()]
+        await asyncio.gather(*tasks)
+
+    assert attempts == [("http://vod", True), ("http://live", True), ("http://vod", False)]
+
+@pytest.mark.asyncio
+async def test_cancel_download_not_running(download_manager):
+    result = await download_manager.cancel_download("http://url")
     assert result is False
 
 @pytest.mark.asyncio
 async def test_notify_for_download(download_manager, mock_repo, mock_notif):
-    mock_repo.get_completion_channel_for_url.return_value = (123, 456)
+    mock_repo.get_completion_channels_for_url.return_value = [(123, 456), (123, 789)]
     
     await download_manager._notify_for_download("http://url", "message")
     
-    mock_notif.notify.assert_called_once_with(123, 456, "message")
+    mock_notif.notify.assert_any_call(123, 456, "message")
+    mock_notif.notify.assert_any_call(123, 789, "message")
+
+@pytest.mark.asyncio
+async def test_duplicate_download_attaches_to_in_flight_job(download_manager, mock_repo):
+    url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    duplicate_url = "https://youtu.be/dQw4w9WgXcQ"
+    mock_repo.get_completion_channels_for_url.return_value = [(1, 2)]
+    with patch.object(download_manager, 'create_download_task') as mock_create:
+        mock_create.return_value.url = url
+        assert await download_manager.start_download(url, 10, 20) is True
+        assert await download_manager.start_download(duplicate_url, 30, 40) is False
+
+    mock_create.assert_called_once()
+    assert list(download_manager.current_downloads) == ["dQw4w9WgXcQ"]
+    mock_repo.add_download_job.assert_called_once()
+    mock_repo.add_completion_for_url.assert_any_call(30, 40, url)
+    mock_repo.add_completion_for_url.assert_any_call(1, 2, url)
+    mock_repo.delete_completion_for_url.assert_called_once_with(duplicate_url)
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_start_one_download(download_manager, mock_repo):
+    async def _slow_write(*args):
+        await asyncio.sleep(0.01)
+    mock_repo.add_completion_for_url.side_effect = _slow_write
+    mock_repo.add_download_job.side_effect = _slow_write
+    url = "https://www.youtube.com/watch?v=abcdefghijk"
+    with patch.object(download_manager, 'create_download_task') as mock_create:
+        mock_create.return_value.url = url
+        started = await asyncio.gather(download_manager.start_download(url, 10, 20),
+                                       download_manager.start_download("https://youtu.be/abcdefghijk", 30, 40))
+
+    assert sorted(started) == [False, True]
+    mock_create.assert_called_once()
+    mock_repo.add_download_job.assert_called_once()
+    mock_repo.add_completion_for_url.assert_any_call(30, 40, url)
+
+@pytest.mark.asyncio
+async def test_cancel_download_by_other_url_form(download_manager):
+    mock_task = MagicMock(spec=DownloadTask)
+    mock_task.url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+    mock_task.event = MagicMock(spec=threading.Event)
+    download_manager.current_downloads["dQw4w9WgXcQ"] = mock_task
+
+    assert await download_manager.cancel_download("https://youtube.com/live/dQw4w9WgXcQ") is True
+    mock_task.event.set.assert_called_once()
 
 @pytest.mark.asyncio
 async def test_download_records_file(download_manager, mock_repo):
@@ -64,7 +164,7 @@ async def test_download_records_file(download_manager, mock_repo):
     event = MagicMock()
     
     with patch('yt_dlp.YoutubeDL') as mock_ydl:
-        instance = mock_ydl.return_value.__enter__.return_value
+        instance = mock_ydl.return_value
         instance.extract_info.return_value = {'title': 'video'}
         instance.prepare_filename.return_value = filename
         
@@ -76,7 +176,7 @@ async def test_download_records_file(download_manager, mock_repo):
 @pytest.mark.asyncio
 async def test_download_streamlink_records_file(download_manager, mock_downloader, mock_repo):
     url = "http://example.com/stream"
-    mock_downloader.get_info = MagicMock(return_value={'title': 'stream', 'id': 'vid1'})
+    mock_downloader.fetch_info = AsyncMock(return_value={'title': 'stream', 'id': 'vid1'})
     
     # Mock subprocess execution for streamlink and ffmpeg
     with patch('asyncio.create_subprocess_exec') as mock_exec, \
@@ -87,7 +187,7 @@ async def test_download_streamlink_records_file(download_manager, mock_downloade
         mock_proc.returncode = 0
         mock_exec.return_value = mock_proc
         
-        await download_manager._download_streamlink(url, notify=False, event=MagicMock())
+        await download_manager._download_streamlink(url, notify=False, event=threading.Event())
         
         # Should be called twice: once for streamlink, once for ffmpeg
         assert mock_exec.call_count == 2
@@ -99,3 +199,392 @@ async def test_download_streamlink_records_file(download_manager, mock_downloade
         assert args[1].endswith(".mp4")
         
         mock_repo.delete_completion_for_url.assert_called_once_with(url)
+
+@pytest.mark.asyncio
+async def test_download_uses_process_backend(download_manager, mock_repo):
+    url = "http://example.com/video"
+    with patch('yt_dlp_bot.services.download_manager.config') as mock_config, \
+         patch('yt_dlp_bot.services.download_manager.run_download_process', new_callable=AsyncMock) as mock_run:
+        mock_config.download_backend = 'process'
+        mock_config.yt_dlp_config = {'quiet': True}
+        mock_run.return_value = "/path/to/video.mp4"
+        event = threading.Event()
+
+        await download_manager._download(url, notify=False, extra_args={'wait_for_video': [15, 60]}, event=event)
+
+        args, kwargs = mock_run.call_args
+        assert args[:3] == (url, {'quiet': True, 'wait_for_video': [15, 60]}, event)
+        mock_repo.add_downloaded_file.assert_called_once_with(url, "/path/to/video.mp4")
+
+@pytest.mark.asyncio
+async def test_run_queued_tracks_job_state(download_manager, mock_repo):
+    with patch.object(download_manager, '_download', new_callable=AsyncMock):
+        await download_manager.start_download("http://url")
+        await download_manager.current_downloads["http://url"].task
+
+    mock_repo.start_download_job.assert_called_once_with("http://url")
+    mock_repo.update_download_job_state.assert_called_once_with("http://url", DownloadJobState.DONE)
+
+@pytest.mark.asyncio
+async def test_run_queued_marks_failed_job(download_manager, mock_repo):
+    with patch.object(download_manager, '_download', new_callable=AsyncMock) as mock_download:
+        mock_download.side_effect = RuntimeError("boom")
+        await download_manager.start_download("http://url")
+        with pytest.raises(RuntimeError):
+            await download_manager.current_downloads["http://url"].task
+
+    mock_repo.update_download_job_state.assert_called_once_with("http://url", DownloadJobState.FAILED)
+
+def _job(**kwargs):
+    fields = dict(url="http://url", state=DownloadJobState.RUNNING, streamlink=False, priority=DownloadPriority.VOD,
+                  extra_args={'wait_for_video': [15, 60]}, attempts=1, partial_path=None)
+    return DownloadJobModel(**(fields | kwargs))
+
+@pytest.mark.asyncio
+async def test_resume_download_jobs_continues_partial_download(download_manager, mock_repo):
+    mock_repo.get_unfinished_download_jobs.return_value = [_job()]
+    with patch.object(download_manager, '_download', new_callable=AsyncMock) as mock_download:
+        await download_manager.resume_download_jobs()
+        await download_manager.resume_download_jobs()
+        await download_manager.current_downloads["http://url"].task
+
+    mock_repo.get_unfinished_download_jobs.assert_called_once()
+    mock_repo.add_download_job.assert_not_called()
+    args, kwargs = mock_download.call_args
+    assert args[:3] == ("http://url", False, {'wait_for_video': [15, 60], 'continuedl': True})
+
+@pytest.mark.asyncio
+async def test_resume_download_jobs_gives_up_after_max_attempts(download_manager, mock_repo):
+    mock_repo.get_unfinished_download_jobs.return_value = [_job(attempts=3)]
+    with patch('yt_dlp_bot.services.download_manager.config') as mock_config:
+        mock_config.max_download_attempts = 3
+        await download_manager.resume_download_jobs()
+
+    assert "http://url" not in download_manager.current_downloads
+    mock_repo.update_download_job_state.assert_called_once_with("http://url", DownloadJobState.FAILED)
+
+@pytest.mark.asyncio
+async def test_resume_download_jobs_finishes_interrupted_remux(download_manager, mock_repo):
+    job = _job(streamlink=True, state=DownloadJobState.REMUXING, partial_path="/tmp/stream.ts", priority=DownloadPriority.LIVE)
+    mock_repo.get_unfinished_download_jobs.return_value = [job]
+    with patch('os.path.exists', return_value=True), \
+         patch.object(download_manager, '_finish_streamlink', new_callable=AsyncMock) as mock_finish:
+        await download_manager.resume_download_jobs()
+        await download_manager.current_downloads["http://url"].task
+
+    mock_finish.assert_called_once_with("http://url", "/tmp/stream.ts")
+
+@pytest.mark.asyncio
+async def test_resumed_recording_keeps_its_slot_while_remuxing_the_old_one(download_manager, mock_repo):
+    job = _job(streamlink=True, partial_path="/tmp/stream.ts", priority=DownloadPriority.LIVE)
+    mock_repo.get_unfinished_download_jobs.return_value = [job]
+    recording = {}
+    async def fake_record(url, notify, event):
+        download_task = download_manager.current_downloads["http://url"]
+        recording.update(state=download_task.state, running=download_manager.queue.running,
+                         unregistered=mock_unregister.called)
+    with patch('os.path.exists', return_value=True), patch('os.remove'), \
+         patch.object(download_manager.bandwidth, 'unregister') as mock_unregister, \
+         patch.object(download_manager.postprocess, 'run', new_callable=AsyncMock, return_value=0), \
+         patch.object(download_manager, '_download_streamlink', side_effect=fake_record):
+        await download_manager.resume_download_jobs()
+        await download_manager.current_downloads["http://url"].task
+
+    assert recording == {'state': DownloadJobState.RUNNING, 'running': 1, 'unregistered': False}
+    mock_repo.add_downloaded_file.assert_called_once_with("http://url", os.path.join(".", "stream.mp4"))
+    assert DownloadJobState.REMUXING not in [c.args[1] for c in mock_repo.update_download_job_state.call_args_list]
+    mock_repo.update_download_job_state.assert_called_with("http://url", DownloadJobState.DONE)
+
+@pytest.mark.asyncio
+async def test_finished_downloads_are_reaped_into_history(download_manager):
+    with patch.object(download_manager, '_download', new_callable=AsyncMock) as mock_download:
+        mock_download.side_effect = [None, RuntimeError("boom")]
+        await download_manager.start_download("http://ok")
+        await download_manager.start_download("http://bad")
+        tasks = [d.task for d in download_manager.current_downloads.values()]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert download_manager.current_downloads == {}
+    assert download_manager.get_running_downloads() == []
+    history = download_manager.get_download_history()
+    assert [(r.url, r.state, r.outcome) for r in history] == [
+        ("http://bad", DownloadJobState.FAILED, "failed: boom"),
+        ("http://ok", DownloadJobState.DONE, "done"),
+    ]
+    assert history[1].run_time >= 0
+
+@pytest.mark.asyncio
+async def test_download_history_is_bounded(download_manager):
+    download_manager.history = collections.deque(maxlen=2)
+    with patch.object(download_manager, '_download', new_callable=AsyncMock):
+        for i in range(3):
+            await download_manager.start_download(f"http://url{i}")
+            await download_manager.current_downloads[f"http://url{i}"].task
+            await asyncio.sleep(0)
+
+    assert [r.url for r in download_manager.get_download_history()] == ["http://url2", "http://url1"]
+
+@pytest.mark.asyncio
+async def test_cancelled_queued_download_is_recorded(download_manager, mock_repo):
+    download_manager.queue.max_concurrent = 0
+    await download_manager.start_download("http://url")
+    download_task = download_manager.current_downloads["http://url"]
+    await asyncio.sleep(0)
+    await download_manager.cancel_download("http://url")
+    await asyncio.gather(download_task.task, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    mock_repo.update_download_job_state.assert_called_once_with("http://url", DownloadJobState.CANCELLED)
+    record = download_manager.get_download_history()[0]
+    assert record.state == DownloadJobState.CANCELLED
+    assert record.started_at is None
+
+def test_download_task_rejects_invalid_transition():
+    download_task = DownloadTask(None, threading.Event(), "http://url", state=DownloadJobState.DONE)
+    assert download_task.transition(DownloadJobState.RUNNING) is False
+    assert download_task.state == DownloadJobState.DONE
+
+@pytest.mark.asyncio
+async def test_rejected_transition_is_not_written(download_manager, mock_repo):
+    download_manager.current_downloads["http://url"] = DownloadTask(None, threading.Event(), "http://url",
+                                                                    state=DownloadJobState.CANCELLED)
+    await download_manager._set_state("http://url", DownloadJobState.DONE)
+    mock_repo.update_download_job_state.assert_not_called()
+
+class _FakeRecordingProcess:
+    """Stands in for a streamlink or ffmpeg process that runs until it is terminated"""
+    def __init__(self):
+        self.returncode = None
+        self._exited = asyncio.Event()
+
+    async def wait(self):
+        await self._exited.wait()
+        return self.returncode
+
+    def terminate(self):
+        self.returncode = -15
+        self._exited.set()
+
+@pytest.mark.asyncio
+async def test_progress_messages_are_coalesced(download_manager, mock_repo, mock_notif):
+    mock_repo.get_completion_channels_for_url.return_value = [(1, 2)]
+    mock_notif.notify.return_value = "handle"
+
+    async def fake_run_ytdlp(url, extra_args, event, progress, rate_limit, info):
+        for i in range(100):
+            progress.interval = 0
+            progress.update({'status': 'downloading', 'downloaded_bytes': i, 'total_bytes': 100})
+            await asyncio.sleep(0.001)
+        progress.update({'status': 'finished', 'downloaded_bytes': 100, 'total_bytes': 100})
+
+    with patch('yt_dlp_bot.services.download_manager.config') as mock_config, \
+         patch.object(download_manager, '_run_ytdlp', side_effect=fake_run_ytdlp):
+        mock_config.progress_interval_s = 0
+        mock_config.progress_message_interval_s = 0.05
+        await download_manager._download("http://url", notify=True, extra_args={}, event=threading.Event())
+
+    edits = [call.args for call in mock_notif.edit.call_args_list]
+    assert 1 < len(edits) < 50
+    assert edits[-1] == ("handle", "Downloaded <http://url>: 100.0%")
+
+@pytest.mark.asyncio
+async def test_running_downloads_share_bandwidth(download_manager):
+    download_manager.bandwidth.total = 8 * 1024 * 1024
+    download_manager.bandwidth.live_reserve = 2 * 1024 * 1024
+    limits = {}
+    release = asyncio.Event()
+
+    async def fake_download(url, notify, extra_args, event, progress=None, rate_limit=None, info=None):
+        await release.wait()
+        limits[url] = rate_limit.value
+
+    with patch.object(download_manager, '_download', side_effect=fake_download):
+        await download_manager.start_download("http://vod")
+        await download_manager.start_download("http://live", priority=DownloadPriority.LIVE)
+        tasks = [d.task for d in download_manager.current_downloads.values()]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    assert limits == {"http://vod": 6 * 1024 * 1024, "http://live": None}
+    assert download_manager.bandwidth.vod_limit() is None
+
+@pytest.mark.asyncio
+async def test_download_streamlink_piped_to_ffmpeg(download_manager, mock_downloader, mock_repo):
+    url = "http://example.com/stream"
+    mock_downloader.fetch_info = AsyncMock(return_value={'title': 'stream', 'id': 'vid1'})
+
+    with patch('yt_dlp_bot.services.download_manager.config') as mock_config, \
+         patch('asyncio.create_subprocess_exec') as mock_exec:
+        mock_config.yt_dlp_config = {'paths': {'home': '/home', 'temp': '/tmp'}}
+        mock_config.streamlink_config.pipe_to_ffmpeg = True
+        mock_config.streamlink_config.segment_duration_s = None
+        mock_config.streamlink_config.executable = "streamlink"
+        mock_config.streamlink_config.resolution = "best"
+        mock_config.streamlink_config.extra_args = []
+        mock_proc = AsyncMock()
+        mock_proc.wait.return_value = 0
+        mock_proc.returncode = 0
+        mock_exec.return_value = mock_proc
+
+        await download_manager._download_streamlink(url, notify=False, event=threading.Event())
+
+    assert mock_exec.call_count == 2
+    streamlink_call, ffmpeg_call = mock_exec.call_args_list
+    assert "-O" in streamlink_call.args
+    assert "stdout" in streamlink_call.kwargs
+    assert "pipe:0" in ffmpeg_call.args
+    assert "stdin" in ffmpeg_call.kwargs
+    args, kwargs = mock_repo.add_downloaded_file.call_args
+    assert args[1].startswith("/home/stream_vid1_")
+    assert args[1].endswith(".mp4")
+    mock_repo.update_download_job_state.assert_not_called()
+    mock_repo.delete_completion_for_url.assert_called_once_with(url)
+
+@pytest.mark.asyncio
+async def test_download_streamlink_segmented(download_manager, mock_downloader, mock_repo):
+    url = "http://example.com/stream"
+    mock_downloader.fetch_info = AsyncMock(return_value={'title': 'stream', 'id': 'vid1'})
+
+    with patch('yt_dlp_bot.services.download_manager.config') as mock_config, \
+         patch('asyncio.create_subprocess_exec') as mock_exec, \
+         patch('os.makedirs'), \
+         patch('yt_dlp_bot.services.segmented_recording.finalize_segments', return_value=True) as mock_finalize:
+        mock_config.yt_dlp_config = {'paths': {'home': '/home', 'temp': '/tmp'}}
+        mock_config.streamlink_config.segment_duration_s = 60
+        mock_config.streamlink_config.executable = "streamlink"
+        mock_config.streamlink_config.resolution = "best"
+        mock_config.streamlink_config.extra_args = []
+        mock_proc = AsyncMock()
+        mock_proc.wait.return_value = 0
+        mock_proc.returncode = 0
+        mock_exec.return_value = mock_proc
+
+        await download_manager._download_streamlink(url, notify=False, event=threading.Event())
+
+    streamlink_call, ffmpeg_call = mock_exec.call_args_list
+    assert "-O" in streamlink_call.args
+    assert "hls" in ffmpeg_call.args
+    work_dir, part_path, output = mock_finalize.call_args.args
+    assert output.startswith("/home/stream_vid1_") and output.endswith(".mp4")
+    assert part_path == output + ".part"
+    assert work_dir == output + ".segments"
+    mock_repo.set_download_job_partial_path.assert_called_once_with(url, part_path)
+    mock_repo.add_downloaded_file.assert_called_once_with(url, output)
+    mock_repo.delete_completion_for_url.assert_called_once_with(url)
+
+@pytest.mark.asyncio
+async def test_remux_gives_up_download_slot(download_manager, mock_repo):
+    remuxing = asyncio.Event()
+    release = asyncio.Event()
+    async def fake_run(args, path):
+        remuxing.set()
+        await release.wait()
+        return 0
+
+    with patch.object(download_manager.queue, 'max_concurrent', 1), \
+         patch.object(download_manager.postprocess, 'run', side_effect=fake_run), \
+         patch('os.remove'), \
+         patch.object(download_manager, '_download', new_callable=AsyncMock) as mock_download:
+        stream = download_manager._queue_download_task(
+            "http://stream", False, DownloadPriority.LIVE,
+            lambda d: lambda notify: download_manager._finish_streamlink("http://stream", "/tmp/stream.ts"))
+        download_manager.current_downloads["http://stream"] = stream
+        await remuxing.wait()
+        assert download_manager.queue.running == 0
+
+        await download_manager.start_download("http://vod")
+        await download_manager.current_downloads["http://vod"].task
+        mock_download.assert_called_once()
+
+        release.set()
+        await stream.task
+
+    mock_repo.add_downloaded_file.assert_called_once_with("http://stream", os.path.join("./", "stream.mp4"))
+
+@pytest.mark.asyncio
+async def test_download_processes_probed_info(download_manager, mock_repo):
+    url = "http://example.com/video"
+    info = {'id': 'video', 'formats': [{'url': 'http://cdn/video.mp4'}]}
+
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        instance = mock_ydl.return_value
+        instance.process_ie_result.return_value = info
+        instance.prepare_filename.return_value = "/path/to/video.mp4"
+        await download_manager.start_download(url, info=info)
+        await download_manager.current_downloads[url].task
+
+    instance.process_ie_result.assert_called_once_with(info, download=True)
+    instance.extract_info.assert_not_called()
+    mock_repo.add_downloaded_file.assert_called_once_with(url, "/path/to/video.mp4")
+
+@pytest.mark.asyncio
+async def test_stale_probed_info_is_extracted_again(download_manager):
+    info = {'id': 'video', 'formats': []}
+    with patch.object(download_manager, '_download', new_callable=AsyncMock) as mock_download, \
+         patch('time.time', return_value=10_000.0):
+        task = download_manager.create_download_task("http://url", False, {}, False, info=info)
+        task.queued_at = 10_000.0 - 3600
+        await task.task
+
+    assert mock_download.call_args.args[-1] is None
+
+@pytest.mark.asyncio
+async def test_prewarm_download_leaves_a_warm_instance(download_manager, tmp_path):
+    info = {'id': 'video', 'live_status': 'is_upcoming'}
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        instance = mock_ydl.return_value
+        instance.params = {}
+        instance.extract_info.return_value = info
+        instance.prepare_filename.return_value = str(tmp_path / "channel" / "video.mp4")
+
+        assert await download_manager.prewarm_download("http://url") == info
+        # The download checks out the same instance
+        with download_manager.ytdl_pool.checkout(config.yt_dlp_config | {}) as ydl:
+            assert ydl is instance
+
+    instance.extract_info.assert_called_once_with("http://url", download=False, process=False)
+    assert mock_ydl.call_count == 1
+    assert (tmp_path / "channel").is_dir()
+
+@pytest.mark.asyncio
+async def test_prewarm_download_skips_the_pool_for_the_process_backend(download_manager, mock_downloader):
+    info = {'id': 'video', 'live_status': 'is_upcoming'}
+    mock_downloader.get_info.return_value = info
+    with patch('yt_dlp_bot.services.download_manager.config') as mock_config, \
+         patch('yt_dlp.YoutubeDL') as mock_ydl:
+        mock_config.download_backend = 'process'
+        assert await download_manager.prewarm_download("http://url") == info
+
+    mock_downloader.get_info.assert_called_once_with("http://url")
+    mock_ydl.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_cancel_download_stops_streamlink_recording(download_manager, mock_downloader, mock_repo):
+    url = "http://example.com/stream"
+    mock_downloader.fetch_info = AsyncMock(return_value={'title': 'stream', 'id': 'vid1'})
+    procs = []
+    async def fake_exec(*args, **kwargs):
+        procs.append(_FakeRecordingProcess())
+        return procs[-1]
+
+    with patch('yt_dlp_bot.services.download_manager.config') as mock_config, \
+         patch('yt_dlp_bot.services.download_manager.STREAMLINK_CANCEL_POLL_S', 0.01), \
+         patch('asyncio.create_subprocess_exec', side_effect=fake_exec):
+        mock_config.yt_dlp_config = {'paths': {'home': '/home', 'temp': '/tmp'}}
+        mock_config.streamlink_config.pipe_to_ffmpeg = True
+        mock_config.streamlink_config.segment_duration_s = None
+        mock_config.streamlink_config.extra_args = []
+        await download_manager.start_download(url, streamlink=True)
+        download_task = download_manager.current_downloads[url]
+        while len(procs) < 2:
+            await asyncio.sleep(0.01)
+        assert await download_manager.cancel_download(url) is True
+        with pytest.raises(asyncio.CancelledError):
+            await download_task.task
+
+    assert all(proc.returncode == -15 for proc in procs)
+    assert download_manager.queue.running == 0
+    assert download_task.state == DownloadJobState.CANCELLED
+    mock_repo.add_downloaded_file.assert_not_called()
+    assert DownloadJobState.DONE not in [c.args[1] for c in mock_repo.update_download_job_state.call_args_list]
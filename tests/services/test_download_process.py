@@ -0,0 +1,92 @@
+import pytest
+import asyncio
+import threading
+import time
+from yt_dlp_bot.services.download_process import run_download_process, DownloadProcessError
+from yt_dlp_bot.services.bandwidth_governor import RateLimit
+
+def _successful_worker(conn, url, ydl_opts):
+    conn.send(('progress', {'status': 'downloading', 'downloaded_bytes': 10}))
+    conn.send(('result', f"{ydl_opts['outtmpl']}/{url}"))
+    conn.close()
+
+def _failing_worker(conn, url, ydl_opts):
+    conn.send(('error', 'video unavailable'))
+    conn.close()
+
+def _silent_worker(conn, url, ydl_opts):
+    conn.close()
+
+def _ratelimit_worker(conn, url, ydl_opts, ratelimit):
+    initial = ratelimit.value
+    deadline = time.monotonic() + 10
+    while ratelimit.value == initial and time.monotonic() < deadline:
+        time.sleep(0.01)
+    conn.send(('result', (initial, ratelimit.value)))
+    conn.close()
+
+def _hanging_worker(conn, url, ydl_opts):
+    time.sleep(60)
+
+def _cleanup_worker(conn, url, ydl_opts):
+    conn.send(('result', url))
+    conn.close()
+    # Stands in for leaving YoutubeDL, which saves the cookies
+    time.sleep(0.5)
+    with open(ydl_opts['cookiefile'], 'w') as f:
+        f.write('saved')
+
+def _lingering_worker(conn, url, ydl_opts):
+    conn.send(('result', url))
+    time.sleep(60)
+
+@pytest.mark.asyncio
+async def test_run_download_process_returns_filename_and_progress():
+    progress = []
+    filename = await run_download_process("vid", {'outtmpl': '/tmp'}, threading.Event(),
+                                          progress.append, worker=_successful_worker)
+    assert filename == "/tmp/vid"
+    assert progress == [{'status': 'downloading', 'downloaded_bytes': 10}]
+
+@pytest.mark.asyncio
+async def test_run_download_process_raises_worker_error():
+    with pytest.raises(DownloadProcessError, match="video unavailable"):
+        await run_download_process("vid", {}, threading.Event(), worker=_failing_worker)
+
+@pytest.mark.asyncio
+async def test_run_download_process_worker_exits_without_result():
+    with pytest.raises(DownloadProcessError):
+        await run_download_process("vid", {}, threading.Event(), worker=_silent_worker)
+
+@pytest.mark.asyncio
+async def test_run_download_process_kills_worker_on_cancel():
+    event = threading.Event()
+    task = asyncio.create_task(run_download_process("vid", {}, event, poll_interval=0.05, worker=_hanging_worker))
+    await asyncio.sleep(0.5)
+    start = time.monotonic()
+    event.set()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert time.monotonic() - start < 5
+
+@pytest.mark.asyncio
+async def test_run_download_process_forwards_rate_limit_changes():
+    rate_limit = RateLimit(1000)
+    task = asyncio.create_task(run_download_process("vid", {}, threading.Event(), poll_interval=0.05,
+                                                    worker=_ratelimit_worker, rate_limit=rate_limit))
+    await asyncio.sleep(0.5)
+    rate_limit.set(2000)
+    assert await task == (1000, 2000)
+
+@pytest.mark.asyncio
+async def test_run_download_process_lets_worker_finish_after_result(tmp_path):
+    cookiefile = tmp_path / "cookies.txt"
+    assert await run_download_process("vid", {'cookiefile': str(cookiefile)}, threading.Event(),
+                                      worker=_cleanup_worker) == "vid"
+    assert cookiefile.read_text() == 'saved'
+
+@pytest.mark.asyncio
+async def test_run_download_process_kills_worker_that_does_not_exit():
+    start = time.monotonic()
+    assert await run_download_process("vid", {}, threading.Event(), worker=_lingering_worker, exit_timeout=0.5) == "vid"
+    assert time.monotonic() - start < 5
@@ -0,0 +1,40 @@
+import pytest
+from unittest.mock import patch
+from yt_dlp_bot.services.download_progress import DownloadProgress
+
+def test_update_samples_progress():
+    progress = DownloadProgress(interval=1.0)
+    assert not progress.has_data
+    progress.update({'status': 'downloading', 'downloaded_bytes': 50, 'total_bytes': 200, 'speed': 10.0, 'eta': 15})
+    assert progress.has_data
+    assert progress.percent == 25.0
+    assert progress.speed == 10.0
+    assert progress.eta == 15
+
+def test_update_is_rate_limited():
+    progress = DownloadProgress(interval=1.0)
+    with patch('yt_dlp_bot.services.download_progress.time.monotonic', side_effect=[10.0, 10.5, 11.2]):
+        progress.update({'status': 'downloading', 'downloaded_bytes': 10, 'total_bytes': 100})
+        progress.update({'status': 'downloading', 'downloaded_bytes': 20, 'total_bytes': 100})
+        assert progress.downloaded_bytes == 10
+        progress.update({'status': 'downloading', 'downloaded_bytes': 30, 'total_bytes': 100})
+        assert progress.downloaded_bytes == 30
+
+def test_update_always_records_status_change():
+    progress = DownloadProgress(interval=60.0)
+    progress.update({'status': 'downloading', 'downloaded_bytes': 10, 'total_bytes': 100})
+    progress.update({'status': 'finished', 'downloaded_bytes': 100, 'total_bytes': 100})
+    assert progress.status == 'finished'
+    assert progress.percent == 100.0
+
+def test_percent_from_fragments():
+    progress = DownloadProgress(interval=1.0)
+    progress.update({'status': 'downloading', 'fragment_index': 3, 'fragment_count': 12})
+    assert progress.percent == 25.0
+
+def test_started_at_is_the_first_downloading_sample():
+    progress = DownloadProgress(interval=0.0)
+    with patch('yt_dlp_bot.services.download_progress.time.time', side_effect=[100.0, 200.0]):
+        progress.update({'status': 'downloading', 'downloaded_bytes': 10})
+        progress.update({'status': 'downloading', 'downloaded_bytes': 20})
+    assert progress.started_at == 100.0
@@ -0,0 +1,88 @@
+import pytest
+import asyncio
+from unittest.mock import MagicMock
+from yt_dlp_bot.services.download_queue import DownloadQueue, DownloadPriority
+
+class FakeJob:
+    def __init__(self, name):
+        self.name = name
+        self.preempted = False
+        self.preempt = MagicMock(side_effect=self._preempt)
+
+    def _preempt(self):
+        self.preempted = True
+
+@pytest.mark.asyncio
+async def test_acquire_within_limit():
+    queue = DownloadQueue(2)
+    await queue.acquire(FakeJob("a"), DownloadPriority.VOD)
+    await queue.acquire(FakeJob("b"), DownloadPriority.VOD)
+    assert queue.running == 2
+    assert queue.depth == 0
+
+@pytest.mark.asyncio
+async def test_live_jobs_are_served_first():
+    queue = DownloadQueue(1)
+    first = FakeJob("first")
+    await queue.acquire(first, DownloadPriority.LIVE)
+
+    order = []
+    async def waiter(job, priority):
+        await queue.acquire(job, priority)
+        order.append(job.name)
+
+    vod = asyncio.create_task(waiter(FakeJob("vod"), DownloadPriority.VOD))
+    await asyncio.sleep(0)
+    live = asyncio.create_task(waiter(FakeJob("live"), DownloadPriority.LIVE))
+    await asyncio.sleep(0)
+    assert queue.depth == 2
+    assert queue.wait_time(first) is None
+
+    queue.release(first)
+    await asyncio.sleep(0)
+    assert order == ["live"]
+    assert queue.depth == 1
+    vod.cancel()
+    await asyncio.gather(live, vod, return_exceptions=True)
+
+@pytest.mark.asyncio
+async def test_live_job_preempts_running_vod():
+    queue = DownloadQueue(1)
+    vod = FakeJob("vod")
+    await queue.acquire(vod, DownloadPriority.VOD)
+
+    live = asyncio.create_task(queue.acquire(FakeJob("live"), DownloadPriority.LIVE))
+    await asyncio.sleep(0)
+    vod.preempt.assert_called_once()
+
+    queue.release(vod)
+    await live
+    assert queue.running == 1
+
+@pytest.mark.asyncio
+async def test_live_job_does_not_preempt_live():
+    queue = DownloadQueue(1)
+    running = FakeJob("running")
+    await queue.acquire(running, DownloadPriority.LIVE)
+
+    waiting = asyncio.create_task(queue.acquire(FakeJob("live"), DownloadPriority.LIVE))
+    await asyncio.sleep(0)
+    running.preempt.assert_not_called()
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert queue.depth == 0
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    queue = DownloadQueue(1)
+    running = FakeJob("running")
+    await queue.acquire(running, DownloadPriority.VOD)
+    job = FakeJob("waiting")
+    waiting = asyncio.create_task(queue.acquire(job, DownloadPriority.VOD))
+    await asyncio.sleep(0)
+    assert queue.is_queued(job)
+
+    waiting.cancel()
+    await asyncio.gather(waiting, return_exceptions=True)
+    assert not queue.is_queued(job)
+    assert queue.depth == 0
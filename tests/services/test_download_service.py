@@ -3,21 +3,25 @@ from unittest.mock import MagicMock, patch, AsyncMock
 from datetime import datetime, timedelta, timezone
 from yt_dlp_bot.services.download_service import DownloadService
 from yt_dlp_bot.services.downloader import AvailableNow, AvailableFuture, AvailabilityError
+from yt_dlp_bot.services.download_manager import DownloadTask, DownloadRecord
+from yt_dlp_bot.database import DownloadJobState
+from yt_dlp_bot.services.download_queue import DownloadPriority
 
 @pytest.fixture
 def mock_downloader():
-    m = MagicMock()
+    m = AsyncMock()
     m.get_availability = AsyncMock()
     return m
 
 @pytest.fixture
 def mock_repo():
-    return MagicMock()
+    return AsyncMock()
 
 @pytest.fixture
 def mock_manager():
     m = MagicMock()
     m.start_download = AsyncMock()
+    m.cancel_download = AsyncMock()
     return m
 
 @pytest.fixture
@@ -43,14 +47,28 @@ def test_parse_text_as_datetime_duration(download_service):
 async def test_initiate_download_streamlink(download_service, mock_manager):
     result = await download_service.initiate_download("http://url", 1, 1, streamlink=True)
     assert result == "Starting streamlink download"
-    mock_manager.start_download.assert_called_once_with("http://url", 1, 1, streamlink=True, notify=True)
+    mock_manager.start_download.assert_called_once_with("http://url", 1, 1, streamlink=True, notify=True, priority=DownloadPriority.LIVE)
 
 @pytest.mark.asyncio
 async def test_initiate_download_now(download_service, mock_downloader, mock_manager):
     mock_downloader.get_availability.return_value = AvailableNow()
     result = await download_service.initiate_download("http://url", 1, 1)
     assert result == "Downloading video now"
-    mock_manager.start_download.assert_called_once_with("http://url", 1, 1, notify=True)
+    mock_manager.start_download.assert_called_once_with("http://url", 1, 1, notify=True, priority=DownloadPriority.VOD, info=None)
+
+@pytest.mark.asyncio
+async def test_initiate_download_already_running(download_service, mock_downloader, mock_manager):
+    mock_downloader.get_availability.return_value = AvailableNow()
+    mock_manager.start_download.return_value = False
+    result = await download_service.initiate_download("http://url", 1, 1)
+    assert "already being downloaded" in result
+
+@pytest.mark.asyncio
+async def test_initiate_download_live_now(download_service, mock_downloader, mock_manager):
+    info = {'id': 'vid', 'formats': []}
+    mock_downloader.get_availability.return_value = AvailableNow(is_live=True, info=info)
+    await download_service.initiate_download("http://url", 1, 1)
+    mock_manager.start_download.assert_called_once_with("http://url", 1, 1, notify=True, priority=DownloadPriority.LIVE, info=info)
 
 @pytest.mark.asyncio
 async def test_initiate_download_future(download_service, mock_downloader):
@@ -62,29 +80,88 @@ async def test_initiate_download_future(download_service, mock_downloader):
         assert "Scheduling download for formatted_time" in result
         mock_downloader.defer_download_until_time.assert_called_once_with("http://url", future_time, 1, 1)
 
-def test_schedule_download_success(download_service, mock_downloader):
+@pytest.mark.asyncio
+async def test_schedule_download_success(download_service, mock_downloader):
     with patch('discord.utils.format_dt', return_value="formatted_time"):
-        result = download_service.schedule_download("http://url", "1h", 1, 1)
+        result = await download_service.schedule_download("http://url", "1h", 1, 1)
         assert "Scheduling download for formatted_time" in result
         mock_downloader.defer_download_until_time.assert_called_once()
 
-def test_schedule_download_invalid(download_service):
-    result = download_service.schedule_download("http://url", "invalid", 1, 1)
+@pytest.mark.asyncio
+async def test_schedule_download_invalid(download_service):
+    result = await download_service.schedule_download("http://url", "invalid", 1, 1)
     assert "Invalid timestamp format" in result
 
-def test_cancel_download_running(download_service, mock_manager):
+@pytest.mark.asyncio
+async def test_cancel_download_running(download_service, mock_manager):
     mock_manager.cancel_download.return_value = True
-    result = download_service.cancel_download("http://url")
+    result = await download_service.cancel_download("http://url")
     assert "Successfully cancelled running download" in result
 
-def test_cancel_download_scheduled(download_service, mock_manager, mock_downloader):
+@pytest.mark.asyncio
+async def test_cancel_download_scheduled(download_service, mock_manager, mock_downloader):
     mock_manager.cancel_download.return_value = False
     mock_downloader.cancel_scheduled_download.return_value = True
-    result = download_service.cancel_download("http://url")
+    result = await download_service.cancel_download("http://url")
     assert "Successfully cancelled scheduled download" in result
 
-def test_cancel_download_not_found(download_service, mock_manager, mock_downloader):
+@pytest.mark.asyncio
+async def test_cancel_download_post_processing(download_service, mock_manager, mock_downloader):
+    mock_manager.cancel_download.return_value = False
+    mock_manager.get_download.return_value = DownloadTask(None, MagicMock(), "http://url", state=DownloadJobState.REMUXING)
+    result = await download_service.cancel_download("http://url")
+    assert "already post-processing" in result
+    mock_downloader.cancel_scheduled_download.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_cancel_download_not_found(download_service, mock_manager, mock_downloader):
     mock_manager.cancel_download.return_value = False
     mock_downloader.cancel_scheduled_download.return_value = False
-    result = download_service.cancel_download("http://url")
+    result = await download_service.cancel_download("http://url")
     assert "Could not find" in result
+
+def test_get_running_downloads_reports_queue(download_service, mock_manager):
+    running = DownloadTask(None, MagicMock(), "http://live", DownloadPriority.LIVE)
+    queued = DownloadTask(None, MagicMock(), "http://vod", DownloadPriority.VOD)
+    mock_manager.get_running_downloads.return_value = [running, queued]
+    mock_manager.get_queue_wait_time.side_effect = lambda d: 125 if d is queued else None
+    mock_manager.get_postprocess_queue_depth.return_value = 2
+
+    result = download_service.get_running_downloads()
+    assert "queue depth 1, post-processing queue 2" in result
+    assert "<http://live> (live)" in result
+    assert "<http://vod> (vod, queued for 2m5s)" in result
+
+def test_get_running_downloads_reports_progress(download_service, mock_manager):
+    running = DownloadTask(None, MagicMock(), "http://vod", DownloadPriority.VOD)
+    running.progress.update({'status': 'downloading', 'downloaded_bytes': 512, 'total_bytes': 1024,
+                             'speed': 2 * 1024 * 1024, 'eta': 90})
+    mock_manager.get_running_downloads.return_value = [running]
+    mock_manager.get_queue_wait_time.return_value = None
+
+    result = download_service.get_running_downloads()
+    assert "<http://vod> (vod, 50.0%, 2.0 MiB/s, ETA 1m30s)" in result
+
+def test_get_running_downloads_reports_remuxing(download_service, mock_manager):
+    remuxing = DownloadTask(None, MagicMock(), "http://live", DownloadPriority.LIVE)
+    remuxing.state = DownloadJobState.REMUXING
+    mock_manager.get_running_downloads.return_value = [remuxing]
+    mock_manager.get_queue_wait_time.return_value = None
+    mock_manager.get_postprocess_queue_depth.return_value = 0
+
+    result = download_service.get_running_downloads()
+    assert "<http://live> (live, remuxing)" in result
+
+def test_get_running_downloads_empty(download_service, mock_manager):
+    mock_manager.get_running_downloads.return_value = []
+    assert download_service.get_running_downloads() == "No downloads currently running."
+
+def test_get_download_history(download_service, mock_manager):
+    record = DownloadRecord("http://url", DownloadPriority.VOD, DownloadJobState.DONE, 1000.0, 1030.0, 1120.0, "done")
+    mock_manager.get_download_history.return_value = [record]
+    result = download_service.get_download_history()
+    assert "<http://url> done <t:1120:R> (waited 30s, ran 1m30s)" in result
+
+def test_get_download_history_empty(download_service, mock_manager):
+    mock_manager.get_download_history.return_value = []
+    assert download_service.get_download_history() == "No downloads have finished yet."
@@ -2,19 +2,25 @@ import pytest
 from unittest.mock import MagicMock, patch, AsyncMock
 import datetime
 from yt_dlp_bot.services.downloader import Downloader, AvailableNow, AvailableFuture, AvailabilityError
+from yt_dlp_bot.services.metadata_cache import MetadataCache
+from yt_dlp_bot.services.availability_probe import ProbeResult
+from yt_dlp_bot.services.schedule_timer import ScheduleTimer
+from yt_dlp_bot.services.ytdl_pool import YoutubeDLPool
+from yt_dlp_bot.repositories.metadata_repository import MetadataRepository
 
 @pytest.fixture
-def downloader():
-    repo = MagicMock()
+def downloader(db):
+    repo = AsyncMock()
     repo.get_completion_channel_for_url.return_value = None
-    sub_repo = MagicMock()
+    sub_repo = AsyncMock()
     notif = MagicMock()
-    return Downloader(repo, sub_repo, notif)
+    return Downloader(repo, sub_repo, notif, MetadataCache(db.repository(MetadataRepository)), ScheduleTimer(),
+                      YoutubeDLPool())
 
 @pytest.mark.asyncio
 async def test_get_availability_now(downloader):
     with patch('yt_dlp.YoutubeDL') as mock_ydl:
-        instance = mock_ydl.return_value.__enter__.return_value
+        instance = mock_ydl.return_value
         instance.extract_info.return_value = {'live_status': 'is_live'}
         
         result = await downloader.get_availability("http://url")
@@ -24,7 +30,7 @@ async def test_get_availability_now(downloader):
 async def test_get_availability_future(downloader):
     future_ts = int(datetime.datetime.now().timestamp() + 3600)
     with patch('yt_dlp.YoutubeDL') as mock_ydl:
-        instance = mock_ydl.return_value.__enter__.return_value
+        instance = mock_ydl.return_value
         instance.extract_info.return_value = {
             'live_status': 'is_upcoming',
             'release_timestamp': future_ts
@@ -37,29 +43,129 @@ async def test_get_availability_future(downloader):
 @pytest.mark.asyncio
 async def test_get_availability_error(downloader):
     with patch('yt_dlp.YoutubeDL') as mock_ydl:
-        instance = mock_ydl.return_value.__enter__.return_value
+        instance = mock_ydl.return_value
         instance.extract_info.side_effect = Exception("Some error")
         
         result = await downloader.get_availability("http://url")
         assert isinstance(result, AvailabilityError)
         assert "Some error" in result.errorstr
 
-def test_defer_download_until_time(downloader):
+@pytest.mark.asyncio
+async def test_get_availability_uses_cached_metadata(downloader):
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        instance = mock_ydl.return_value
+        instance.extract_info.return_value = {'id': 'dQw4w9WgXcQ', 'live_status': 'is_live', 'formats': [{}] * 100}
+
+        first = await downloader.get_availability("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+        second = await downloader.get_availability("https://youtu.be/dQw4w9WgXcQ")
+
+    assert first.is_live and second.is_live
+    assert instance.extract_info.call_count == 1
+    # Only the fresh extraction carries the full info dict the download can reuse
+    assert len(first.info['formats']) == 100
+    assert second.info is None
+
+@pytest.mark.asyncio
+async def test_check_video_availability_caches_unavailable_videos(downloader):
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        instance = mock_ydl.return_value
+        instance.extract_info.side_effect = Exception("ERROR: [youtube] abc: Private video")
+
+        assert await downloader.check_video_availability("http://url") is False
+        assert await downloader.check_video_availability("http://url") is False
+        result = await downloader.get_availability("http://url")
+
+    assert instance.extract_info.call_count == 1
+    assert "Private video" in result.errorstr
+
+@pytest.mark.asyncio
+async def test_transient_errors_are_not_cached(downloader):
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        instance = mock_ydl.return_value
+        instance.extract_info.side_effect = [Exception("HTTP Error 503"), {'live_status': 'not_live'}]
+
+        assert await downloader.check_video_availability("http://url") is False
+        assert await downloader.check_video_availability("http://url") is True
+
+@pytest.mark.asyncio
+async def test_check_video_availability_trusts_clear_probe_results(downloader):
+    downloader.probe.probe = AsyncMock(side_effect=[(ProbeResult.PUBLIC, 'https://www.youtube.com/@chan'),
+                                                    (ProbeResult.UNAVAILABLE, None)])
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        assert await downloader.check_video_availability("https://youtu.be/aaaaaaaaaaa") is True
+        assert await downloader.check_video_availability("https://youtu.be/bbbbbbbbbbb") is False
+        # The removed video is answered from the negative cache
+        assert await downloader.check_video_availability("https://youtu.be/bbbbbbbbbbb") is False
+
+    mock_ydl.return_value.extract_info.assert_not_called()
+    assert downloader.probe.probe.call_count == 2
+    assert await downloader.metadata_cache.get_channels(["https://youtu.be/aaaaaaaaaaa"]) == {
+        "https://youtu.be/aaaaaaaaaaa": 'https://www.youtube.com/@chan'}
+
+@pytest.mark.asyncio
+async def test_check_video_availability_does_not_trust_cached_restricted_videos(downloader):
+    await downloader.metadata_cache.put("https://youtu.be/aaaaaaaaaaa", {'id': 'aaaaaaaaaaa', 'availability': 'subscriber_only'})
+    await downloader.metadata_cache.put("https://youtu.be/bbbbbbbbbbb", {'id': 'bbbbbbbbbbb', 'availability': 'public'})
+    downloader.probe.probe = AsyncMock(return_value=(ProbeResult.AMBIGUOUS, None))
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        mock_ydl.return_value.extract_info.side_effect = Exception("Join this channel to get access to members-only content")
+        assert await downloader.check_video_availability("https://youtu.be/aaaaaaaaaaa") is False
+        assert await downloader.check_video_availability("https://youtu.be/bbbbbbbbbbb") is True
+
+    downloader.probe.probe.assert_called_once_with("https://youtu.be/aaaaaaaaaaa")
+    # The signed-in metadata is still there for downloads
+    assert (await downloader.metadata_cache.get("https://youtu.be/aaaaaaaaaaa"))['availability'] == 'subscriber_only'
+
+@pytest.mark.asyncio
+async def test_check_video_availability_extracts_when_ambiguous(downloader):
+    downloader.probe.probe = AsyncMock(return_value=(ProbeResult.AMBIGUOUS, None))
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        mock_ydl.return_value.extract_info.side_effect = Exception("Private video")
+        assert await downloader.check_video_availability("https://youtu.be/aaaaaaaaaaa") is False
+
+    mock_ydl.return_value.extract_info.assert_called_once()
+
+def test_list_channel_video_ids(downloader):
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        mock_ydl.return_value.extract_info.side_effect = [
+            {'entries': [{'id': 'a'}, {'id': 'b', 'availability': 'subscriber_only'}]},
+            Exception("This channel does not have a streams tab"),
+            {'entries': [{'id': 'c'}, None]},
+        ]
+        assert downloader.list_channel_video_ids("https://www.youtube.com/@chan/") == {'a', 'c'}
+
+    urls = [c.args[0] for c in mock_ydl.return_value.extract_info.call_args_list]
+    assert urls == ["https://www.youtube.com/@chan/videos", "https://www.youtube.com/@chan/streams",
+                    "https://www.youtube.com/@chan/shorts"]
+
+def test_list_channel_video_ids_unreachable(downloader):
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        mock_ydl.return_value.extract_info.side_effect = Exception("404")
+        assert downloader.list_channel_video_ids("https://www.youtube.com/@gone") is None
+
+@pytest.mark.asyncio
+async def test_defer_download_until_time(downloader):
     time = datetime.datetime.now(datetime.timezone.utc)
-    downloader.defer_download_until_time("http://url", time, 123, 456)
+    await downloader.defer_download_until_time("http://url", time, 123, 456)
     
     downloader.download_repository.add_future_download.assert_called_once_with("http://url", int(time.timestamp()))
     downloader.download_repository.add_completion_for_url.assert_called_once_with(123, 456, "http://url")
+    assert downloader.schedule_timer.next_time() == int(time.timestamp())
 
-def test_cancel_scheduled_download(downloader):
+@pytest.mark.asyncio
+async def test_cancel_scheduled_download(downloader):
     downloader.download_repository.get_all_scheduled_downloads.return_value = [("http://url", 1000)]
     
-    result = downloader.cancel_scheduled_download("http://url")
+    downloader.schedule_timer.add("http://url", 1000)
+    
+    result = await downloader.cancel_scheduled_download("http://url")
     assert result is True
     downloader.download_repository.disable_future_download.assert_called_once_with("http://url")
+    assert "http://url" not in downloader.schedule_timer
 
-def test_cancel_scheduled_download_not_found(downloader):
+@pytest.mark.asyncio
+async def test_cancel_scheduled_download_not_found(downloader):
     downloader.download_repository.get_all_scheduled_downloads.return_value = [("http://other", 1000)]
     
-    result = downloader.cancel_scheduled_download("http://url")
+    result = await downloader.cancel_scheduled_download("http://url")
     assert result is False
@@ -0,0 +1,73 @@
+import pytest
+from unittest.mock import patch
+
+from yt_dlp_bot.repositories.metadata_repository import MetadataRepository
+from yt_dlp_bot.services.metadata_cache import MetadataCache, VideoUnavailableError
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+@pytest.fixture
+def cache(db):
+    return MetadataCache(db.repository(MetadataRepository))
+
+@pytest.mark.asyncio
+async def test_put_stores_slim_projection(cache):
+    stored = await cache.put(URL, {'id': 'dQw4w9WgXcQ', 'title': 'video', 'live_status': 'not_live',
+                                   'formats': [{'url': 'x'}], 'thumbnails': []})
+    assert stored == {'id': 'dQw4w9WgXcQ', 'title': 'video', 'live_status': 'not_live'}
+    assert await cache.get("https://youtu.be/dQw4w9WgXcQ") == stored
+
+@pytest.mark.asyncio
+async def test_ttl_depends_on_live_status(cache):
+    with patch('time.time', return_value=1000.0):
+        await cache.put(URL, {'live_status': 'is_live'})
+    with patch('time.time', return_value=1000.0 + 61):
+        assert await cache.get(URL) is None
+
+    with patch('time.time', return_value=1000.0):
+        await cache.put(URL, {'live_status': 'was_live'})
+    with patch('time.time', return_value=1000.0 + 3600):
+        assert await cache.get(URL) == {'live_status': 'was_live'}
+
+@pytest.mark.asyncio
+async def test_put_error_caches_unavailable_videos_only(cache):
+    await cache.put_error(URL, "ERROR: [youtube] dQw4w9WgXcQ: Video unavailable")
+    with pytest.raises(VideoUnavailableError, match="Video unavailable"):
+        await cache.get(URL)
+
+    await cache.invalidate(URL)
+    await cache.put_error(URL, "HTTP Error 429: Too Many Requests")
+    assert await cache.get(URL) is None
+
+@pytest.mark.asyncio
+async def test_entries_survive_restart(db):
+    await MetadataCache(db.repository(MetadataRepository)).put(URL, {'title': 'video', 'live_status': 'not_live'})
+    restarted = MetadataCache(db.repository(MetadataRepository))
+    assert await restarted.get(URL) == {'title': 'video', 'live_status': 'not_live'}
+    assert restarted.hits == 1
+
+@pytest.mark.asyncio
+async def test_memory_is_bounded(db):
+    cache = MetadataCache(db.repository(MetadataRepository), max_entries=1)
+    await cache.put("https://youtu.be/aaaaaaaaaaa", {'title': 'a'})
+    await cache.put("https://youtu.be/bbbbbbbbbbb", {'title': 'b'})
+    assert list(cache._entries) == ['bbbbbbbbbbb']
+    # Evicted entries are still read back from the database
+    assert await cache.get("https://youtu.be/aaaaaaaaaaa") == {'title': 'a'}
+
+@pytest.mark.asyncio
+async def test_put_records_channel(cache):
+    await cache.put(URL, {'live_status': 'not_live', 'channel_url': 'https://www.youtube.com/channel/UC1'})
+    await cache.invalidate(URL)
+    assert await cache.get_channels([URL, "https://youtu.be/aaaaaaaaaaa"]) == {URL: 'https://www.youtube.com/channel/UC1'}
+
+@pytest.mark.asyncio
+async def test_probed_handles_group_with_extracted_channels(cache):
+    other = "https://youtu.be/aaaaaaaaaaa"
+    # oEmbed reports the handle, extraction reports the channel ID
+    await cache.record_channel(other, "https://www.youtube.com/@Chan")
+    await cache.put(URL, {'live_status': 'not_live', 'channel_id': 'UCabc',
+                          'channel_url': 'https://www.youtube.com/channel/UCabc',
+                          'uploader_url': 'https://www.youtube.com/@chan'})
+    assert await cache.get_channels([URL, other]) == {URL: 'https://www.youtube.com/channel/UCabc',
+                                                      other: 'https://www.youtube.com/channel/UCabc'}
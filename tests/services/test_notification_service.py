@@ -0,0 +1,32 @@
+import pytest
+import discord
+from unittest.mock import AsyncMock, MagicMock, patch
+from yt_dlp_bot.services.notification_service import DiscordNotificationService
+
+@pytest.mark.asyncio
+async def test_notify_returns_sent_message():
+    channel = AsyncMock()
+    channel.send.return_value = "message handle"
+    with patch('yt_dlp_bot.services.notification_service.fetch_guild', new_callable=AsyncMock) as mock_guild, \
+         patch('yt_dlp_bot.services.notification_service.fetch_channel', new_callable=AsyncMock) as mock_channel:
+        mock_channel.return_value = channel
+        service = DiscordNotificationService(MagicMock())
+        handle = await service.notify(1, 2, "hello")
+
+    channel.send.assert_called_once_with("hello")
+    assert handle == "message handle"
+
+@pytest.mark.asyncio
+async def test_notify_missing_channel_returns_none():
+    with patch('yt_dlp_bot.services.notification_service.fetch_guild', new_callable=AsyncMock) as mock_guild:
+        mock_guild.return_value = None
+        service = DiscordNotificationService(MagicMock())
+        assert await service.notify(1, 2, "hello") is None
+
+@pytest.mark.asyncio
+async def test_edit_ignores_http_errors():
+    handle = AsyncMock()
+    handle.edit.side_effect = discord.HTTPException(MagicMock(status=429), "rate limited")
+    service = DiscordNotificationService(MagicMock())
+    await service.edit(handle, "updated")
+    handle.edit.assert_called_once_with(content="updated")
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from yt_dlp_bot.services.postprocess_pool import PostProcessPool
+
+def _blocking_process(release: asyncio.Event, returncode: int = 0):
+    proc = MagicMock()
+    async def _wait():
+        await release.wait()
+        return returncode
+    proc.wait = _wait
+    return proc
+
+@pytest.mark.asyncio
+async def test_run_limits_commands_per_device(tmp_path):
+    pool = PostProcessPool(per_device=1)
+    release = asyncio.Event()
+    with patch('asyncio.create_subprocess_exec', new_callable=AsyncMock) as mock_exec:
+        mock_exec.side_effect = lambda *args: _blocking_process(release)
+        first = asyncio.create_task(pool.run(['ffmpeg', 'a'], str(tmp_path / 'a.mp4')))
+        second = asyncio.create_task(pool.run(['ffmpeg', 'b'], str(tmp_path / 'b.mp4')))
+        await asyncio.sleep(0.01)
+
+        assert pool.running == 1
+        assert pool.depth == 1
+        assert mock_exec.call_count == 1
+
+        release.set()
+        assert await asyncio.gather(first, second) == [0, 0]
+
+    assert mock_exec.call_count == 2
+    assert pool.running == 0 and pool.depth == 0
+
+@pytest.mark.asyncio
+async def test_run_lowers_priority(tmp_path):
+    pool = PostProcessPool(per_device=1, niceness=15)
+    release = asyncio.Event()
+    release.set()
+    with patch('asyncio.create_subprocess_exec', new_callable=AsyncMock) as mock_exec, \
+         patch('shutil.which', return_value='/usr/bin/tool'):
+        mock_exec.side_effect = lambda *args: _blocking_process(release, returncode=1)
+        assert await pool.run(['ffmpeg', '-i', 'in.ts', 'out.mp4'], str(tmp_path / 'out.mp4')) == 1
+
+    assert mock_exec.call_args.args == ('ionice', '-c', '2', '-n', '7', 'nice', '-n', '15', 'ffmpeg', '-i', 'in.ts', 'out.mp4')
+
+@pytest.mark.asyncio
+async def test_run_kills_process_when_cancelled(tmp_path):
+    pool = PostProcessPool(per_device=1)
+    proc = _blocking_process(asyncio.Event())
+    with patch('asyncio.create_subprocess_exec', new_callable=AsyncMock, return_value=proc):
+        task = asyncio.create_task(pool.run(['ffmpeg'], str(tmp_path / 'out.mp4')))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    proc.kill.assert_called_once()
+    assert pool.running == 0
@@ -0,0 +1,194 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from yt_dlp_bot.database import ScanJobState
+from yt_dlp_bot.repositories.download_repository import DownloadRepository
+from yt_dlp_bot.services.scan_service import ScanService, ScanJob, HostPacer, host_of
+
+@pytest.fixture
+def repo(db):
+    return db.repository(DownloadRepository)
+
+@pytest.fixture
+def downloader():
+    downloader = MagicMock()
+    downloader.metadata_cache.get_channels = AsyncMock(return_value={})
+    return downloader
+
+async def _add_files(repo, urls):
+    for url in urls:
+        await repo.add_downloaded_file(url, "/path")
+    return await repo.get_downloaded_files_for_scan(None)
+
+def _service(downloader, repo, notification_service=None, **kwargs):
+    options = dict(concurrency=2, host_interval=0, progress_interval=60)
+    return ScanService(downloader, repo, notification_service or AsyncMock(), **(options | kwargs))
+
+def test_host_of():
+    assert host_of("https://www.youtube.com/watch?v=abc") == "youtube.com"
+    assert host_of("https://m.youtube.com/watch?v=abc") == "youtube.com"
+    assert host_of("https://youtu.be/abc") == "youtu.be"
+
+@pytest.mark.asyncio
+async def test_host_pacer_spaces_requests_per_host():
+    pacer = HostPacer(10)
+    with patch('time.monotonic', return_value=100.0), \
+         patch('asyncio.sleep', new_callable=AsyncMock) as mock_sleep:
+        await pacer.wait("a")
+        await pacer.wait("b")
+        await pacer.wait("a")
+        await pacer.wait("a")
+
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [10.0, 20.0]
+
+def test_advance_cursor_stops_at_first_unwritten_file():
+    job = ScanJob(1, 4, [1, 2, 3, 4])
+    job.advance_cursor([(2, 1), (1, 1), (4, 0)])
+    assert job.cursor == 2
+    job.advance_cursor([(3, 1)])
+    assert job.cursor == 4
+    assert job.file_ids == []
+
+@pytest.mark.asyncio
+async def test_scan_limits_concurrency(repo, downloader):
+    in_flight = 0
+    peak = 0
+    async def check(url):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return url != "http://gone"
+    downloader.check_video_availability = check
+    notification_service = AsyncMock()
+    service = _service(downloader, repo, notification_service, concurrency=3)
+    files = await _add_files(repo, [f"http://video{i}" for i in range(10)] + ["http://gone"])
+
+    job = await service.start_scan(files, guild_id=1, channel_id=2)
+    assert await service.start_scan(files) is None
+    await job.task
+
+    assert peak == 3
+    assert (job.scanned, job.public, job.unavailable) == (11, 10, 1)
+    assert await repo.get_downloaded_files_for_scan(None) == []
+    notification_service.notify.assert_called_with(1, 2, "Scan complete. Scanned: 11, Still Public: 10, Now Private/Unavailable: 1")
+
+@pytest.mark.asyncio
+async def test_scan_reports_progress_periodically(repo, downloader):
+    release = asyncio.Event()
+    async def check(url):
+        await release.wait()
+        return True
+    downloader.check_video_availability = check
+    notification_service = AsyncMock()
+    service = _service(downloader, repo, notification_service, progress_interval=0.01)
+
+    job = await service.start_scan(await _add_files(repo, ["http://video"]), guild_id=1, channel_id=2)
+    await asyncio.sleep(0.05)
+    release.set()
+    await job.task
+
+    handle = notification_service.notify.return_value
+    edits = [c.args[1] for c in notification_service.edit.call_args_list if c.args[0] is handle]
+    assert edits[0].startswith("Scanning... Scanned: 0/1")
+    assert edits[-1].startswith("Scan complete.")
+
+@pytest.mark.asyncio
+async def test_scan_batches_status_writes(repo, downloader):
+    downloader.check_video_availability = AsyncMock(return_value=True)
+    service = _service(downloader, repo, concurrency=1, flush_rows=3, flush_interval=3600)
+    files = await _add_files(repo, [f"http://video{i}" for i in range(7)])
+
+    with patch.object(repo.repository, 'flush_scan_progress', wraps=repo.repository.flush_scan_progress) as mock_flush, \
+         patch.object(repo.repository, 'update_downloaded_file_status') as mock_update:
+        await (await service.start_scan(files)).task
+
+    assert [len(c.args[1]) for c in mock_flush.call_args_list] == [3, 3, 1]
+    mock_update.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_interrupted_scan_resumes_from_checkpoint(repo, downloader):
+    release = asyncio.Event()
+    async def check(url):
+        if url == "http://video3":
+            await release.wait()
+        return True
+    downloader.check_video_availability = check
+    files = await _add_files(repo, [f"http://video{i}" for i in range(1, 6)])
+    service = _service(downloader, repo, concurrency=1, flush_rows=1)
+
+    job = await service.start_scan(files, guild_id=1, channel_id=2)
+    await asyncio.sleep(0.01)
+    # A shutdown cancels the task without going through cancel_scan
+    job.task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await job.task
+
+    interrupted = await repo.get_interrupted_scan_job()
+    assert (interrupted.cursor, interrupted.scanned, interrupted.state) == (2, 2, ScanJobState.RUNNING)
+
+    checked = []
+    async def check_after_restart(url):
+        checked.append(url)
+        return True
+    downloader.check_video_availability = check_after_restart
+    restarted = _service(downloader, repo)
+    resumed = await restarted.resume_interrupted_scan()
+    await resumed.task
+
+    assert checked == ["http://video3", "http://video4", "http://video5"]
+    assert (resumed.id, resumed.scanned, resumed.total) == (job.id, 5, 5)
+    assert await repo.get_interrupted_scan_job() is None
+    assert await restarted.resume_interrupted_scan() is None
+
+@pytest.mark.asyncio
+async def test_cancelled_scan_is_not_resumed(repo, downloader):
+    release = asyncio.Event()
+    async def check(url):
+        await release.wait()
+        return True
+    downloader.check_video_availability = check
+    service = _service(downloader, repo)
+    job = await service.start_scan(await _add_files(repo, ["http://video"]))
+    await asyncio.sleep(0)
+
+    assert service.cancel_scan()
+    with pytest.raises(asyncio.CancelledError):
+        await job.task
+    assert await repo.get_interrupted_scan_job() is None
+
+@pytest.mark.asyncio
+async def test_scan_lists_channels_and_probes_leftovers(repo, downloader):
+    channel = "https://www.youtube.com/@chan"
+    files = await _add_files(repo, [f"https://youtu.be/video{i:06d}" for i in range(5)] + ["https://youtu.be/loner000001"])
+    downloader.metadata_cache.get_channels.return_value = {url: channel for _, url in files[:5]}
+    downloader.list_channel_video_ids.return_value = {f"video{i:06d}" for i in range(4)}
+    downloader.check_video_availability = AsyncMock(return_value=False)
+    service = _service(downloader, repo, channel_min_files=5)
+
+    job = await service.start_scan(files)
+    await job.task
+
+    downloader.list_channel_video_ids.assert_called_once_with(channel)
+    probed = sorted(c.args[0] for c in downloader.check_video_availability.call_args_list)
+    assert probed == ["https://youtu.be/loner000001", "https://youtu.be/video000004"]
+    assert (job.scanned, job.public, job.unavailable) == (6, 4, 2)
+
+@pytest.mark.asyncio
+async def test_scan_probes_small_or_unlistable_channels(repo, downloader):
+    urls = ["https://youtu.be/aaaaaaaaaaa", "https://youtu.be/bbbbbbbbbbb"]
+    files = await _add_files(repo, urls)
+    downloader.metadata_cache.get_channels.return_value = {url: "https://www.youtube.com/@chan" for url in urls}
+    downloader.list_channel_video_ids.return_value = None
+    downloader.check_video_availability = AsyncMock(return_value=True)
+
+    await (await _service(downloader, repo, channel_min_files=3).start_scan(files)).task
+    downloader.list_channel_video_ids.assert_not_called()
+
+    job = await _service(downloader, repo, channel_min_files=2).start_scan(files)
+    await job.task
+    downloader.list_channel_video_ids.assert_called_once()
+    assert downloader.check_video_availability.call_count == 4
+    assert job.public == 2
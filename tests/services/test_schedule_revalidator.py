@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from yt_dlp_bot.services.schedule_revalidator import ScheduleRevalidator, revalidate_interval
+from yt_dlp_bot.services.schedule_timer import ScheduleTimer
+
+@pytest.fixture
+def mock_downloader():
+    return MagicMock()
+
+@pytest.fixture
+def mock_repo():
+    m = AsyncMock()
+    m.reschedule_future_downloads.side_effect = lambda rescheduled, dropped: [r[0] for r in rescheduled] + [d[0] for d in dropped]
+    return m
+
+@pytest.fixture
+def revalidator(mock_downloader, mock_repo):
+    return ScheduleRevalidator(mock_downloader, mock_repo, ScheduleTimer(), (300, 3600, 86400), concurrency=2)
+
+def test_revalidate_interval_tightens_towards_the_start():
+    intervals = (300, 3600, 86400)
+    assert revalidate_interval(3 * 86400, intervals) == 86400
+    assert revalidate_interval(5 * 3600, intervals) == 3600
+    assert revalidate_interval(1800, intervals) == 300
+
+@pytest.mark.asyncio
+async def test_start_times_are_updated_in_one_batch(revalidator, mock_downloader, mock_repo):
+    now = int(time.time())
+    infos = {
+        "http://moved": {'live_status': 'is_upcoming', 'release_timestamp': now + 7200},
+        "http://same": {'live_status': 'is_upcoming', 'release_timestamp': now + 600},
+        "http://live": {'live_status': 'is_live'},
+    }
+    errors = {
+        "http://gone": Exception("ERROR: [youtube] gone: Private video. Sign in if you've been granted access"),
+        "http://flaky": Exception("ERROR: Unable to download webpage: timed out"),
+    }
+    def get_info(url):
+        if url in errors:
+            raise errors[url]
+        return infos[url]
+    mock_downloader.get_info.side_effect = get_info
+    for url in [*infos, *errors]:
+        revalidator.schedule_timer.add(url, now + 600)
+        revalidator.checked_at[url] = now - 3600
+
+    await revalidator.revalidate()
+
+    mock_repo.reschedule_future_downloads.assert_called_once()
+    rescheduled, dropped = mock_repo.reschedule_future_downloads.call_args.args
+    assert sorted(url for url, _, _ in rescheduled) == ["http://live", "http://moved"]
+    assert dropped == [("http://gone", now + 600)]
+    times = dict(revalidator.schedule_timer.items())
+    assert times["http://moved"] == now + 7200
+    assert times["http://live"] <= time.time()
+    assert times["http://same"] == times["http://flaky"] == now + 600
+    assert "http://gone" not in revalidator.schedule_timer
+
+@pytest.mark.asyncio
+async def test_only_due_start_times_are_checked(revalidator, mock_downloader, mock_repo):
+    now = time.time()
+    revalidator.schedule_timer.add("http://soon", now + 1800)
+    revalidator.schedule_timer.add("http://tomorrow", now + 2 * 86400)
+    revalidator.schedule_timer.add("http://new", now + 1800)
+    revalidator.checked_at["http://soon"] = now - 600
+    revalidator.checked_at["http://tomorrow"] = now - 7200
+    mock_downloader.get_info.return_value = None
+
+    await revalidator.revalidate()
+
+    assert [call.args[0] for call in mock_downloader.get_info.call_args_list] == ["http://soon"]
+    mock_repo.reschedule_future_downloads.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_checks_are_bounded(revalidator, mock_downloader):
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+    def get_info(url):
+        nonlocal in_flight, max_in_flight
+        with lock:
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+        time.sleep(0.02)
+        with lock:
+            in_flight -= 1
+        return None
+    mock_downloader.get_info.side_effect = get_info
+    for i in range(8):
+        revalidator.schedule_timer.add(f"http://url{i}", time.time() + 600)
+        revalidator.checked_at[f"http://url{i}"] = 0
+
+    await revalidator.revalidate()
+
+    assert mock_downloader.get_info.call_count == 8
+    assert max_in_flight == 2
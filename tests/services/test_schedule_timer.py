@@ -0,0 +1,67 @@
+import asyncio
+import time
+import pytest
+from yt_dlp_bot.services.schedule_timer import ScheduleTimer
+
+def test_pop_due_returns_due_urls_in_order():
+    timer = ScheduleTimer()
+    timer.load([("c", 300), ("a", 100), ("b", 200)])
+
+    assert timer.pop_due(250) == [("a", 100), ("b", 200)]
+    assert timer.next_time() == 300
+    assert len(timer) == 1
+
+def test_reschedule_and_remove():
+    timer = ScheduleTimer()
+    timer.load([("a", 100), ("b", 200)])
+    timer.add("a", 400) # Replaces the earlier time
+    assert timer.remove("b")
+    assert not timer.remove("b")
+
+    assert timer.next_time() == 400
+    assert timer.items() == [("a", 400)]
+    assert timer.pop_due(300) == []
+    assert timer.pop_due(400) == [("a", 400)]
+    assert timer.next_time() is None
+
+@pytest.mark.asyncio
+async def test_wait_until_due_sleeps_until_start_time():
+    timer = ScheduleTimer()
+    due = time.time() + 0.1
+    timer.add("a", due)
+
+    await asyncio.wait_for(timer.wait_until_due(), 1)
+    assert 0 <= time.time() - due < 0.05
+
+@pytest.mark.asyncio
+async def test_earlier_add_wakes_the_waiter():
+    timer = ScheduleTimer()
+    timer.add("later", time.time() + 3600)
+    waiter = asyncio.create_task(timer.wait_until_due())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+
+    timer.add("now", time.time())
+    await asyncio.wait_for(waiter, 1)
+    assert [url for url, _ in timer.pop_due(time.time())] == ["now"]
+
+@pytest.mark.asyncio
+async def test_removed_start_time_is_skipped():
+    timer = ScheduleTimer()
+    timer.add("cancelled", time.time() + 0.05)
+    timer.add("kept", time.time() + 0.15)
+    timer.remove("cancelled")
+
+    start = time.time()
+    await asyncio.wait_for(timer.wait_until_due(), 1)
+    assert time.time() - start >= 0.1
+    assert [url for url, _ in timer.pop_due(time.time())] == ["kept"]
+
+@pytest.mark.asyncio
+async def test_wait_until_due_with_lead():
+    timer = ScheduleTimer()
+    timer.add("a", time.time() + 3600.1)
+
+    start = time.time()
+    await asyncio.wait_for(timer.wait_until_due(lead_s=3600), 1)
+    assert 0.05 <= time.time() - start < 0.2
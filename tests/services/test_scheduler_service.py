@@ -1,40 +1,219 @@
+import asyncio
+import time
 import pytest
-from unittest.mock import MagicMock, AsyncMock, patch
-from yt_dlp_bot.services.scheduler_service import SchedulerService
+from unittest.mock import AsyncMock, MagicMock, patch
+from yt_dlp_bot.services.scheduler_service import SchedulerService, wait_for_live_interval
+from yt_dlp_bot.services.schedule_timer import ScheduleTimer
+from yt_dlp_bot.services.download_manager import DownloadManager
+from yt_dlp_bot.services.ytdl_pool import YoutubeDLPool
+
+LIVE_INFO = {'id': 'video', 'live_status': 'is_live', 'formats': []}
+UPCOMING_INFO = {'id': 'video', 'live_status': 'is_upcoming'}
 
 @pytest.fixture
 def mock_repo():
-    return MagicMock()
+    m = AsyncMock()
+    m.claim_future_download.return_value = True
+    return m
 
 @pytest.fixture
 def mock_manager():
-    return AsyncMock()
+    m = AsyncMock()
+    m.get_download = MagicMock(return_value=None)
+    m.prewarm_download.return_value = LIVE_INFO
+    return m
 
 @pytest.fixture
 def scheduler_service(mock_repo, mock_manager):
-    # We need to mock config to avoid issues with polling_interval_s
-    with patch('yt_dlp_bot.services.scheduler_service.config') as mock_config:
-        mock_config.polling_interval_s = 60
-        return SchedulerService(mock_repo, mock_manager)
-
-@pytest.mark.asyncio
-async def test_check_scheduled_downloads_no_urls(scheduler_service, mock_repo, mock_manager):
-    mock_repo.get_downloads_now.return_value = []
-    
-    await scheduler_service._check_scheduled_downloads()
-    
-    mock_repo.get_downloads_now.assert_called_once()
-    mock_manager.start_download.assert_not_called()
+    return SchedulerService(mock_repo, mock_manager, ScheduleTimer())
+
+def waiting_scheduler(mock_repo, mock_manager, **kwargs):
+    # Every download stays scheduled unless the test says otherwise
+    mock_repo.get_future_download.side_effect = lambda url: (mock_repo.scheduled_at[url], 1)
+    mock_repo.scheduled_at = {}
+    scheduler_service = SchedulerService(mock_repo, mock_manager, ScheduleTimer(), wait_interval_s=(0.01, 0.05), **kwargs)
+    def schedule(url, utcepoch):
+        mock_repo.scheduled_at[url] = utcepoch
+        scheduler_service.schedule_timer.add(url, utcepoch)
+    return scheduler_service, schedule
+
+async def _run_due(scheduler_service):
+    scheduler_service._dispatch_due()
+    await asyncio.gather(*scheduler_service.scheduled_tasks)
+
+def test_wait_for_live_interval():
+    assert wait_for_live_interval(3600, 15, 60) == 60
+    assert wait_for_live_interval(50, 15, 60) == 25
+    assert wait_for_live_interval(20, 15, 60) == 15
+    assert wait_for_live_interval(5, 15, 60) == 5 # Checks again right at the start time
+    assert wait_for_live_interval(-10, 15, 60) == 15
+    assert wait_for_live_interval(-3600, 15, 60) == 60
+
+@pytest.mark.asyncio
+async def test_load_reads_scheduled_downloads_once(scheduler_service, mock_repo):
+    mock_repo.get_all_scheduled_downloads.return_value = [("http://url1", 1000), ("http://url2", 2000)]
+
+    await scheduler_service.load()
+
     mock_repo.cleanup_future_downloads.assert_called_once()
+    assert scheduler_service.schedule_timer.next_time() == 1000
+    assert len(scheduler_service.schedule_timer) == 2
+
+@pytest.mark.asyncio
+async def test_nothing_due(scheduler_service, mock_repo, mock_manager):
+    scheduler_service.schedule_timer.add("http://later", time.time() + 3600)
+
+    await _run_due(scheduler_service)
+
+    mock_manager.start_download.assert_not_called()
+    mock_repo.claim_future_download.assert_not_called()
 
 @pytest.mark.asyncio
-async def test_check_scheduled_downloads_with_urls(scheduler_service, mock_repo, mock_manager):
-    mock_repo.get_downloads_now.return_value = ["http://url1", "http://url2"]
-    
-    await scheduler_service._check_scheduled_downloads()
-    
-    mock_repo.get_downloads_now.assert_called_once()
+async def test_due_downloads_are_started(scheduler_service, mock_repo, mock_manager):
+    scheduler_service.schedule_timer.load([("http://url1", 1000), ("http://url2", 2000), ("http://later", time.time() + 3600)])
+
+    await _run_due(scheduler_service)
+
     assert mock_manager.start_download.call_count == 2
-    mock_repo.delete_future_download.assert_any_call("http://url1")
-    mock_repo.delete_future_download.assert_any_call("http://url2")
-    mock_repo.cleanup_future_downloads.assert_called_once()
+    mock_repo.claim_future_download.assert_any_call("http://url1", 1000)
+    mock_repo.claim_future_download.assert_any_call("http://url2", 2000)
+    assert mock_manager.start_download.call_args.kwargs['info'] is LIVE_INFO
+    assert 'extra_args' not in mock_manager.start_download.call_args.kwargs
+    assert len(scheduler_service.schedule_timer) == 1 and "http://later" in scheduler_service.schedule_timer
+
+@pytest.mark.asyncio
+async def test_cancelled_download_is_not_started(scheduler_service, mock_repo, mock_manager):
+    mock_repo.claim_future_download.return_value = False
+    scheduler_service.schedule_timer.add("http://url", 1000)
+
+    await _run_due(scheduler_service)
+
+    mock_manager.start_download.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_download_waits_for_the_video_to_go_live(mock_repo, mock_manager):
+    scheduler_service, schedule = waiting_scheduler(mock_repo, mock_manager, prewarm_s=60)
+    start_time = time.time() + 0.2
+    mock_manager.prewarm_download.side_effect = lambda url: LIVE_INFO if time.time() >= start_time else UPCOMING_INFO
+    schedule("http://url", start_time)
+    schedule("http://later", time.time() + 3600)
+
+    await _run_due(scheduler_service)
+
+    # Pre-warmed when dispatched, then checked until live
+    assert mock_manager.prewarm_download.call_count > 2
+    mock_manager.start_download.assert_called_once()
+    assert mock_manager.start_download.call_args.kwargs['info'] is LIVE_INFO
+    assert 0 <= time.time() - start_time < 0.1
+
+@pytest.mark.asyncio
+async def test_live_video_starts_when_prewarmed(mock_repo, mock_manager):
+    scheduler_service = SchedulerService(mock_repo, mock_manager, ScheduleTimer(), prewarm_s=60)
+    scheduler_service.schedule_timer.add("http://url", time.time() + 30)
+
+    await asyncio.wait_for(_run_due(scheduler_service), 1)
+
+    assert mock_manager.start_download.call_args.kwargs['info'] is LIVE_INFO
+
+@pytest.mark.asyncio
+async def test_download_cancelled_while_waiting(mock_repo, mock_manager):
+    scheduler_service, schedule = waiting_scheduler(mock_repo, mock_manager)
+    mock_manager.prewarm_download.return_value = UPCOMING_INFO
+    mock_repo.claim_future_download.return_value = False
+    schedule("http://url", time.time())
+    mock_repo.get_future_download.side_effect = lambda url: (mock_repo.scheduled_at[url], 0)
+
+    await asyncio.wait_for(_run_due(scheduler_service), 1)
+
+    mock_manager.start_download.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_download_moved_while_waiting_goes_back_on_the_timer(mock_repo, mock_manager):
+    scheduler_service, schedule = waiting_scheduler(mock_repo, mock_manager, prewarm_s=60)
+    scheduled_at = int(time.time()) + 30
+    moved_to = scheduled_at + 3600
+    mock_manager.prewarm_download.return_value = UPCOMING_INFO | {'release_timestamp': moved_to}
+    mock_repo.reschedule_future_downloads.return_value = ["http://url"]
+    mock_repo.claim_future_download.return_value = False
+    schedule("http://url", scheduled_at)
+
+    await asyncio.wait_for(_run_due(scheduler_service), 1)
+
+    mock_repo.reschedule_future_downloads.assert_called_once_with([("http://url", scheduled_at, moved_to)], [])
+    assert scheduler_service.schedule_timer.items() == [("http://url", moved_to)]
+    mock_manager.start_download.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_video_not_live_in_time_is_dropped(mock_repo, mock_manager):
+    scheduler_service, schedule = waiting_scheduler(mock_repo, mock_manager, wait_timeout_s=0.1)
+    mock_manager.prewarm_download.side_effect = Exception("network")
+    schedule("http://url", time.time())
+
+    await asyncio.wait_for(_run_due(scheduler_service), 1)
+
+    mock_manager.start_download.assert_not_called()
+    mock_repo.claim_future_download.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_unavailable_video_is_dropped_without_polling(mock_repo, mock_manager):
+    scheduler_service, schedule = waiting_scheduler(mock_repo, mock_manager)
+    mock_manager.prewarm_download.side_effect = Exception("ERROR: [youtube] vid: Private video")
+    schedule("http://url", time.time())
+
+    await asyncio.wait_for(_run_due(scheduler_service), 1)
+
+    mock_manager.prewarm_download.assert_called_once_with("http://url")
+    mock_repo.claim_future_download.assert_called_once()
+    mock_manager.start_download.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_waiting_downloads_do_not_hold_threads(mock_repo):
+    download_manager = DownloadManager(MagicMock(), mock_repo, AsyncMock(), YoutubeDLPool())
+    scheduler_service, schedule = waiting_scheduler(mock_repo, download_manager, wait_timeout_s=0.3)
+    for i in range(40):
+        schedule(f"http://url{i}", time.time())
+
+    with patch('yt_dlp.YoutubeDL') as mock_ydl:
+        mock_ydl.return_value.params = {}
+        mock_ydl.return_value.extract_info.return_value = UPCOMING_INFO
+        mock_ydl.return_value.prepare_filename.return_value = "video.mp4"
+        scheduler_service._dispatch_due()
+        await asyncio.sleep(0.05)
+        # Unrelated blocking calls still get an executor thread right away
+        start = time.monotonic()
+        await asyncio.to_thread(lambda: None)
+        assert time.monotonic() - start < 0.05
+        await asyncio.gather(*scheduler_service.scheduled_tasks)
+
+    assert download_manager.current_downloads == {}
+
+@pytest.mark.asyncio
+async def test_start_lag_is_logged(scheduler_service, mock_manager, caplog):
+    download_task = MagicMock()
+    download_task.started_at = 1001.0
+    download_task.progress.started_at = 1003.5
+    mock_manager.get_download.return_value = download_task
+    scheduler_service.schedule_timer.add("http://url", 1000)
+
+    with caplog.at_level("INFO"):
+        await _run_due(scheduler_service)
+
+    assert "started 1.0s after its start time, first data after 3.5s" in caplog.text
+
+@pytest.mark.asyncio
+async def test_download_added_while_sleeping_starts_on_time(scheduler_service, mock_repo, mock_manager):
+    scheduler_service.schedule_timer.add("http://later", time.time() + 3600)
+    scheduler_service.start()
+    await asyncio.sleep(0.01)
+
+    due = time.time() + 0.2
+    scheduler_service.schedule_timer.add("http://soon", due)
+    started = asyncio.Event()
+    mock_manager.start_download.side_effect = lambda *args, **kwargs: started.set()
+    await asyncio.wait_for(started.wait(), 2)
+    scheduler_service.stop()
+
+    assert 0 <= time.time() - due < 0.1
+    mock_manager.start_download.assert_called_once()
+    assert mock_manager.start_download.call_args.args[0] == "http://soon"
+    mock_repo.get_all_scheduled_downloads.assert_not_called()
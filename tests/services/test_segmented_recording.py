@@ -0,0 +1,67 @@
+import os
+
+from yt_dlp_bot.services import segmented_recording
+
+def _write_segments(work_dir, listed, unlisted=()):
+    (work_dir / 'init.mp4').write_bytes(b'INIT')
+    for name in [*listed, *unlisted]:
+        (work_dir / name).write_bytes(name.encode())
+    playlist = ['#EXTM3U'] + [line for name in listed for line in ('#EXTINF:60.0,', name)]
+    (work_dir / 'index.m3u8').write_text('\n'.join(playlist) + '\n')
+
+def test_append_completed_segments_skips_unlisted(tmp_path):
+    part = tmp_path / 'out.mp4.part'
+    _write_segments(tmp_path, ['segment_000000.m4s', 'segment_000001.m4s'], unlisted=['segment_000002.m4s'])
+
+    assert segmented_recording.append_completed_segments(str(tmp_path), str(part)) == 2
+
+    assert part.read_bytes() == b'INITsegment_000000.m4ssegment_000001.m4s'
+    assert not (tmp_path / 'segment_000000.m4s').exists()
+    assert (tmp_path / 'segment_000002.m4s').exists()
+
+def test_append_completed_segments_is_incremental(tmp_path):
+    part = tmp_path / 'out.mp4.part'
+    _write_segments(tmp_path, ['segment_000000.m4s'])
+    segmented_recording.append_completed_segments(str(tmp_path), str(part))
+    _write_segments(tmp_path, ['segment_000000.m4s', 'segment_000001.m4s'])
+    os.remove(tmp_path / 'segment_000000.m4s')
+
+    assert segmented_recording.append_completed_segments(str(tmp_path), str(part)) == 1
+    assert part.read_bytes() == b'INITsegment_000000.m4ssegment_000001.m4s'
+
+def test_append_completed_segments_recovers_interrupted_append(tmp_path):
+    part = tmp_path / 'out.mp4.part'
+    _write_segments(tmp_path, ['segment_000000.m4s'])
+    segmented_recording.append_completed_segments(str(tmp_path), str(part))
+    # Interrupted after copying segment 0 again without deleting it, and partway through segment 1
+    _write_segments(tmp_path, ['segment_000000.m4s', 'segment_000001.m4s'])
+    with open(part, 'ab') as f:
+        f.write(b'segment_0')
+
+    assert segmented_recording.append_completed_segments(str(tmp_path), str(part)) == 1
+    assert part.read_bytes() == b'INITsegment_000000.m4ssegment_000001.m4s'
+    assert not (tmp_path / 'segment_000000.m4s').exists()
+
+def test_append_completed_segments_restarts_part_without_progress(tmp_path):
+    part = tmp_path / 'out.mp4.part'
+    # Interrupted during the first append, before any progress was recorded
+    part.write_bytes(b'INITseg')
+    _write_segments(tmp_path, ['segment_000000.m4s'])
+
+    assert segmented_recording.append_completed_segments(str(tmp_path), str(part)) == 1
+    assert part.read_bytes() == b'INITsegment_000000.m4s'
+
+def test_finalize_segments(tmp_path):
+    work_dir = tmp_path / 'out.mp4.segments'
+    work_dir.mkdir()
+    _write_segments(work_dir, ['segment_000000.m4s'])
+    output = tmp_path / 'out.mp4'
+
+    assert segmented_recording.finalize_segments(str(work_dir), str(output) + '.part', str(output))
+
+    assert output.read_bytes() == b'INITsegment_000000.m4s'
+    assert not work_dir.exists()
+
+def test_finalize_segments_without_segments(tmp_path):
+    output = tmp_path / 'out.mp4'
+    assert not segmented_recording.finalize_segments(str(tmp_path / 'missing'), str(output) + '.part', str(output))
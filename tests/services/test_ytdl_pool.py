@@ -0,0 +1,84 @@
+from unittest.mock import MagicMock, patch
+
+from yt_dlp_bot.services.ytdl_pool import YoutubeDLPool
+
+def _fake_ydl(options):
+    ydl = MagicMock()
+    ydl.params = dict(options)
+    ydl._progress_hooks = []
+    ydl.add_progress_hook.side_effect = ydl._progress_hooks.append
+    return ydl
+
+def test_checkout_reuses_instances_per_option_set():
+    pool = YoutubeDLPool()
+    with patch('yt_dlp.YoutubeDL', side_effect=_fake_ydl) as mock_ydl:
+        with pool.checkout({'quiet': True}) as first:
+            pass
+        with pool.checkout({'quiet': True}) as second:
+            pass
+        with pool.checkout({'quiet': False}) as other:
+            pass
+
+    assert first is second
+    assert other is not first
+    assert mock_ydl.call_count == 2
+
+def test_checkout_gives_concurrent_callers_separate_instances():
+    pool = YoutubeDLPool()
+    with patch('yt_dlp.YoutubeDL', side_effect=_fake_ydl):
+        with pool.checkout({}) as first, pool.checkout({}) as second:
+            assert first is not second
+
+def test_checkin_resets_per_use_state():
+    pool = YoutubeDLPool()
+    hook = MagicMock()
+    with patch('yt_dlp.YoutubeDL', side_effect=_fake_ydl):
+        with pool.checkout({'ratelimit': 100}, [hook]) as ydl:
+            assert ydl._progress_hooks == [hook]
+            ydl.params['ratelimit'] = 5
+            ydl._num_downloads = 3
+        with pool.checkout({'ratelimit': 100}) as reused:
+            pass
+
+    assert reused is ydl
+    assert ydl._progress_hooks == []
+    assert ydl.params == {'ratelimit': 100}
+    assert ydl._num_downloads == 0
+
+def test_cookies_are_saved_on_close_not_checkin():
+    pool = YoutubeDLPool()
+    with patch('yt_dlp.YoutubeDL', side_effect=_fake_ydl):
+        with pool.checkout({'cookiefile': 'cookies.txt'}) as ydl:
+            pass
+
+    ydl.save_cookies.assert_not_called()
+    ydl.close.assert_not_called()
+    pool.close()
+    ydl.close.assert_called_once()
+
+def test_instance_without_removable_hooks_is_discarded():
+    def _ydl_without_hook_list(options):
+        ydl = _fake_ydl(options)
+        del ydl._progress_hooks
+        return ydl
+    pool = YoutubeDLPool()
+    with patch('yt_dlp.YoutubeDL', side_effect=_ydl_without_hook_list):
+        with pool.checkout({}, [MagicMock()]) as ydl:
+            pass
+        with pool.checkout({}) as other:
+            pass
+
+    ydl.close.assert_called_once()
+    assert other is not ydl
+
+def test_idle_instances_are_bounded():
+    pool = YoutubeDLPool(max_idle_per_key=1)
+    with patch('yt_dlp.YoutubeDL', side_effect=_fake_ydl):
+        with pool.checkout({}) as first, pool.checkout({}) as second:
+            pass
+
+    # The inner checkout is returned first and fills the only idle slot
+    second.close.assert_not_called()
+    first.close.assert_called_once()
+    pool.close()
+    second.close.assert_called_once()
@@ -0,0 +1,95 @@
+import sqlite3
+import pytest
+from yt_dlp_bot import database
+from yt_dlp_bot.database import MIGRATIONS, init_database, migrate, open_read_connection, schema_version
+from yt_dlp_bot.helpers import DatabaseConfig
+
+def test_init_database_applies_profile(tmp_path):
+    profile = DatabaseConfig(busy_timeout_ms=1234, cache_size_kib=2048)
+    con = init_database(str(tmp_path / "bot.db"), profile)
+    assert con.execute("PRAGMA journal_mode").fetchone() == ('wal',)
+    assert con.execute("PRAGMA synchronous").fetchone() == (1,) # NORMAL
+    assert con.execute("PRAGMA busy_timeout").fetchone() == (1234,)
+    assert con.execute("PRAGMA cache_size").fetchone() == (-2048,)
+    con.close()
+
+def test_init_database_without_profile_keeps_defaults():
+    con = init_database(":memory:")
+    assert con.execute("PRAGMA synchronous").fetchone() == (2,) # FULL
+    con.close()
+
+def test_read_connection_is_read_only(tmp_path):
+    path = str(tmp_path / "bot.db")
+    profile = DatabaseConfig()
+    writer = init_database(path, profile)
+    with writer:
+        writer.execute("INSERT INTO downloaded_files(url, filepath) VALUES ('http://url', '/path')")
+
+    reader = open_read_connection(path, profile)
+    assert reader.execute("SELECT url FROM downloaded_files").fetchall() == [('http://url',)]
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute("DELETE FROM downloaded_files")
+    reader.close()
+    writer.close()
+
+def _query_plan(con, query, params=()):
+    return " ".join(row[-1] for row in con.execute("EXPLAIN QUERY PLAN " + query, params))
+
+def test_new_database_is_at_latest_version():
+    con = init_database(":memory:")
+    assert schema_version(con) == len(MIGRATIONS)
+    migrate(con) # Already up to date, nothing to apply
+    assert schema_version(con) == len(MIGRATIONS)
+
+def test_unversioned_database_is_migrated_in_place():
+    con = sqlite3.connect(":memory:")
+    # Databases from before versioning have their tables but user_version 0
+    MIGRATIONS[0](con)
+    con.execute("INSERT INTO completion_channels VALUES (1, 2, 'http://url')")
+    con.commit()
+
+    migrate(con)
+    assert schema_version(con) == len(MIGRATIONS)
+    assert con.execute("SELECT * FROM completion_channels").fetchall() == [(1, 2, 'http://url')]
+
+def test_channel_handles_are_normalized_by_migration():
+    con = sqlite3.connect(":memory:")
+    migrate(con, 2)
+    con.execute("INSERT INTO video_channels VALUES ('vid1', 'https://www.youtube.com/@Chan/')")
+    con.execute("INSERT INTO video_channels VALUES ('vid2', 'https://www.youtube.com/channel/UCabc')")
+    con.commit()
+
+    migrate(con)
+    assert con.execute("SELECT * FROM video_channels ORDER BY video_id").fetchall() == [
+        ('vid1', 'https://www.youtube.com/@chan'), ('vid2', 'https://www.youtube.com/channel/UCabc')]
+
+def test_failed_migration_is_rolled_back(monkeypatch):
+    con = init_database(":memory:")
+    def _broken(con):
+        con.execute("CREATE INDEX broken_index ON downloaded_files (url)")
+        raise RuntimeError("broken")
+    monkeypatch.setattr(database, 'MIGRATIONS', MIGRATIONS + [_broken])
+
+    with pytest.raises(RuntimeError):
+        migrate(con, len(MIGRATIONS) + 1)
+    assert schema_version(con) == len(MIGRATIONS)
+    assert con.execute("SELECT name FROM sqlite_master WHERE name = 'broken_index'").fetchone() is None
+
+@pytest.mark.parametrize("query, params, index", [
+    ("SELECT guild_id, channel_id FROM completion_channels WHERE url = ?", ("u",), "COVERING INDEX completion_channels_url"),
+    ("SELECT guild_id, channel_id FROM subscribed_channels WHERE youtube_channel = ? AND room_kind = ?", ("c", "streams"),
+     "COVERING INDEX subscribed_channels_lookup"),
+    ("DELETE FROM future_downloads WHERE utcepoch < unixepoch() - 86400", (), "INDEX future_downloads_utcepoch"),
+    ("SELECT id FROM downloaded_files WHERE filepath = ?", ("/path",), "INDEX downloaded_files_filepath"),
+])
+def test_lookups_use_indexes(query, params, index):
+    con = init_database(":memory:")
+    plan = _query_plan(con, query, params)
+    assert index in plan
+    assert "SCAN" not in plan
+
+def test_scheduled_listing_is_read_in_index_order():
+    con = init_database(":memory:")
+    plan = _query_plan(con, "SELECT url, utcepoch FROM future_downloads WHERE valid <> 0 ORDER BY utcepoch ASC")
+    assert "COVERING INDEX future_downloads_utcepoch" in plan
+    assert "TEMP B-TREE" not in plan
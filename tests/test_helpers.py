@@ -2,6 +2,7 @@ import pytest
 from datetime import timedelta, datetime, timezone
 from yt_dlp_bot.services.download_service import parse_text_duration_timedelta, DownloadService
 from unittest.mock import MagicMock
+from yt_dlp_bot.helpers import video_key, normalize_channel_url
 
 def test_parse_text_duration_timedelta():
     assert parse_text_duration_timedelta("1d") == timedelta(days=1)
@@ -17,3 +18,16 @@ def test_parse_text_as_datetime_discord_format():
     ts = 123456789
     result = ds.parse_text_as_datetime(f"<t:{ts}:F>")
     assert result.timestamp() == pytest.approx(ts)
+
+def test_video_key():
+    assert video_key("https://www.youtube.com/watch?v=dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    assert video_key("https://youtube.com/watch?feature=share&v=dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    assert video_key("https://youtu.be/dQw4w9WgXcQ?t=10") == "dQw4w9WgXcQ"
+    assert video_key("https://www.youtube.com/live/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    assert video_key("https://www.youtube.com/shorts/dQw4w9WgXcQ") == "dQw4w9WgXcQ"
+    assert video_key("https://example.com/video") == "https://example.com/video"
+
+def test_normalize_channel_url():
+    assert normalize_channel_url("https://youtube.com/channel/UCabc/videos") == "https://www.youtube.com/channel/UCabc"
+    assert normalize_channel_url("https://www.youtube.com/@Chan/") == "https://www.youtube.com/@chan"
+    assert normalize_channel_url("https://example.com/user") == "https://example.com/user"
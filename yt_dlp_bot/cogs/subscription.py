@@ -35,7 +35,7 @@ class Subscription(commands.Cog):
     async def subscribe(self, ctx: commands.Context, youtube_channel: str, kind: RoomKind):
         channel_id = ctx.channel.id
         guild_id = ctx.guild.id
-        self.subscription_service.subscribe_to_channel(youtube_channel, kind, guild_id, channel_id)
+        await self.subscription_service.subscribe_to_channel(youtube_channel, kind, guild_id, channel_id)
         await self.http_client.subscribe_to_channel(guild_id, youtube_channel)
         await ctx.send(f"Subscribed to automatic {kind.value} downloads from {youtube_channel}")
 
@@ -47,7 +47,7 @@ class Subscription(commands.Cog):
     )
     async def unsubscribe(self, ctx: commands.Context, youtube_channel: str, kind: RoomKind | None = None):
         guild_id = ctx.guild.id
-        self.subscription_service.unsubscribe_from_channel(youtube_channel, kind, guild_id)
+        await self.subscription_service.unsubscribe_from_channel(youtube_channel, kind, guild_id)
         await self.http_client.unsubscribe_from_channel(guild_id, youtube_channel)
         if kind:
             await ctx.send(f"Unsubscribed to automatic {kind.value} downloads from {youtube_channel}")
@@ -62,7 +62,7 @@ class Subscription(commands.Cog):
     )
     async def list_subscriptions(self, ctx: commands.Context):
         guild_id = ctx.guild.id
-        subscriptions = self.subscription_service.get_subscriptions(guild_id=guild_id)
+        subscriptions = await self.subscription_service.get_subscriptions(guild_id=guild_id)
         if not subscriptions:
             await ctx.send("No channels currently subscribed.")
             return
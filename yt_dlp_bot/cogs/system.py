@@ -4,10 +4,12 @@ from discord.ext import commands
 import shutil
 import os
 from yt_dlp_bot.repositories.download_repository import DownloadRepository
+from yt_dlp_bot.repositories.async_repository import AsyncRepository
 from yt_dlp_bot.helpers import Config
 from yt_dlp_bot.views import PaginatedView
 from yt_dlp_bot.services.downloader import Downloader
 from yt_dlp_bot.services.download_service import DownloadService, parse_text_duration_timedelta
+from yt_dlp_bot.services.scan_service import ScanService
 import datetime
 
 logger = logging.getLogger(__name__)
@@ -43,13 +45,18 @@ class DownloadedFileListView(PaginatedView):
         return embed
 
 class System(commands.Cog):
-    def __init__(self, bot, download_repository: DownloadRepository, downloader: Downloader, download_service: DownloadService, config: Config) -> None:
+    def __init__(self, bot, download_repository: AsyncRepository[DownloadRepository], downloader: Downloader, download_service: DownloadService, scan_service: ScanService, config: Config) -> None:
         self.bot = bot
         self.download_repository = download_repository
         self.downloader = downloader
         self.download_service = download_service
+        self.scan_service = scan_service
         self.config = config
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        await self.scan_service.resume_interrupted_scan()
+
     @commands.is_owner()
     @commands.hybrid_group(name="system", brief="System management commands")
     async def system(self, ctx: commands.Context):
@@ -81,7 +88,7 @@ class System(commands.Cog):
     @commands.is_owner()
     @system.command(name="list", brief="List all tracked downloaded files")
     async def list_files(self, ctx: commands.Context):
-        files = self.download_repository.get_downloaded_files()
+        files = await self.download_repository.get_downloaded_files()
         if not files:
             await ctx.send("No tracked downloaded files.")
             return
@@ -108,7 +115,7 @@ class System(commands.Cog):
 
         results = []
         for file_id in file_ids:
-            file_info = self.download_repository.get_downloaded_file_by_id(file_id)
+            file_info = await self.download_repository.get_downloaded_file_by_id(file_id)
             if not file_info:
                 results.append(f"ID {file_id}: No file found.")
                 continue
@@ -121,7 +128,7 @@ class System(commands.Cog):
                 else:
                     status = f"ID {file_id}: Not on disk, record removed from DB."
                 
-                self.download_repository.delete_downloaded_file(file_id)
+                await self.download_repository.delete_downloaded_file(file_id)
                 results.append(status)
             except Exception as e:
                 logger.error(f"Error deleting file {filepath}: {e}")
@@ -132,11 +139,11 @@ class System(commands.Cog):
     @commands.is_owner()
     @system.command(name="purge", brief="Purges database records for missing files")
     async def purge_files(self, ctx: commands.Context):
-        files = self.download_repository.get_downloaded_files()
+        files = await self.download_repository.get_downloaded_files()
         purged_count = 0
         for file_id, url, filepath, download_time, is_public, last_check in files:
             if not os.path.exists(filepath):
-                self.download_repository.delete_downloaded_file(file_id)
+                await self.download_repository.delete_downloaded_file(file_id)
                 purged_count += 1
         
         await ctx.send(f"Purged {purged_count} records from the database for missing files.")
@@ -155,27 +162,37 @@ class System(commands.Cog):
         if older_than:
             delta = parse_text_duration_timedelta(older_than)
 
-        files = self.download_repository.get_downloaded_files_for_scan(delta)
+        files = await self.download_repository.get_downloaded_files_for_scan(delta)
 
         if not files:
             await ctx.send("No files match the scan criteria.")
             return
 
-        await ctx.send(f"Starting availability scan for {len(files)} files...")
-        
-        scanned_count = 0
-        public_count = 0
-        private_count = 0
-        
-        for file_id, url in files:
-            is_available = await self.downloader.check_video_availability(url)
-            status_int = 1 if is_available else 0
-            self.download_repository.update_downloaded_file_status(file_id, status_int)
-            
-            scanned_count += 1
-            if is_available:
-                public_count += 1
-            else:
-                private_count += 1
-                
-        await ctx.send(f"Scan complete. Scanned: {scanned_count}, Still Public: {public_count}, Now Private/Unavailable: {private_count}")
+        if not await self.scan_service.start_scan(files, delta, ctx.guild.id if ctx.guild else None, ctx.channel.id):
+            await ctx.send("A scan is already running, check it with `system scan-status`.")
+            return
+        if ctx.guild is None:
+            # Progress is only posted to guild channels
+            await ctx.send(f"Scan of {len(files)} files started, check its progress with `system scan-status`.")
+            return
+        await ctx.send(f"Scan of {len(files)} files started, progress is posted in this channel.")
+
+    @commands.is_owner()
+    @system.command(name="scan-status", brief="Shows the progress of the running scan")
+    async def scan_status(self, ctx: commands.Context):
+        job = self.scan_service.current
+        if not job:
+            await ctx.send("No scan has been started.")
+            return
+        if job.running:
+            await ctx.send(job.progress())
+        else:
+            await ctx.send(f"Last scan finished. {job.summary()}")
+
+    @commands.is_owner()
+    @system.command(name="scan-cancel", brief="Cancels the running scan")
+    async def scan_cancel(self, ctx: commands.Context):
+        if self.scan_service.cancel_scan():
+            await ctx.send("Cancelling scan.")
+        else:
+            await ctx.send("No scan is running.")
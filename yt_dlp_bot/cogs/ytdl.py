@@ -4,6 +4,7 @@ from discord.ext import commands, tasks
 from yt_dlp_bot.helpers import Config
 
 from yt_dlp_bot.repositories.download_repository import DownloadRepository
+from yt_dlp_bot.repositories.async_repository import AsyncRepository
 from yt_dlp_bot.pikl_api.http_client import AsyncHttpClient
 from yt_dlp_bot.services.download_service import DownloadService
 from yt_dlp_bot.services.scheduler_service import SchedulerService
@@ -12,7 +13,7 @@ from typing import Optional
 logger = logging.getLogger(__name__)
 
 class YtDl(commands.Cog):
-    def __init__(self, bot, http_client: AsyncHttpClient, download_repository: DownloadRepository, download_service: DownloadService, scheduler_service: SchedulerService, config: Config) -> None:
+    def __init__(self, bot, http_client: AsyncHttpClient, download_repository: AsyncRepository[DownloadRepository], download_service: DownloadService, scheduler_service: SchedulerService, config: Config) -> None:
         self.bot = bot
         self.http_client : Optional[AsyncHttpClient] = http_client # Keep this for direct http_client calls in cog
         self.download_repository = download_repository
@@ -24,6 +25,7 @@ class YtDl(commands.Cog):
     async def on_ready(self):
         logger.info("Starting scheduler service")
         self.scheduler_service.start()
+        await self.download_service.resume_interrupted_downloads()
 
     @commands.is_owner()
     @commands.hybrid_command(
@@ -51,7 +53,7 @@ class YtDl(commands.Cog):
     async def scheduled_download(self, ctx: commands.Context, url: str, timestamp:str):
         channel_id = ctx.channel.id
         guild_id = ctx.guild.id
-        response_message = self.download_service.schedule_download(url, timestamp, guild_id, channel_id)
+        response_message = await self.download_service.schedule_download(url, timestamp, guild_id, channel_id)
         await ctx.send(response_message)
 
     @commands.is_owner()
@@ -78,6 +80,17 @@ class YtDl(commands.Cog):
         response_message = self.download_service.get_running_downloads()
         await ctx.send(response_message)
     
+    @commands.is_owner()
+    @commands.hybrid_command(
+        name="get-download-history",
+        brief="Gets recently finished downloads",
+        description="Gets recently finished downloads with their outcome and timings",
+        usage="",
+    )
+    async def download_history(self, ctx: commands.Context):
+        response_message = self.download_service.get_download_history()
+        await ctx.send(response_message)
+
     @commands.is_owner()
     @commands.hybrid_command(
         name="get-scheduled-downloads",
@@ -86,7 +99,7 @@ class YtDl(commands.Cog):
         usage="",
     )
     async def scheduled_downloads(self, ctx: commands.Context):
-        response_message = self.download_service.get_scheduled_downloads()
+        response_message = await self.download_service.get_scheduled_downloads()
         await ctx.send(response_message)
 
     @commands.is_owner()
@@ -97,7 +110,7 @@ class YtDl(commands.Cog):
         usage="",
     )
     async def cancel_download(self, ctx: commands.Context, url: str):
-        response_message = self.download_service.cancel_download(url)
+        response_message = await self.download_service.cancel_download(url)
         await ctx.send(response_message)
 
 
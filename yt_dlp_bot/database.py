@@ -1,12 +1,54 @@
 import sqlite3
+import pathlib
 from pydantic import BaseModel
 import datetime
 from enum import Enum
 
+from yt_dlp_bot.helpers import DatabaseConfig
+
 class RoomKind(Enum):
     STREAM = 'streams'
     PREMIERE = 'videos'
 
+class DownloadJobState(Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    REMUXING = 'remuxing'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+    @property
+    def is_terminal(self) -> bool:
+        return self in (DownloadJobState.DONE, DownloadJobState.FAILED, DownloadJobState.CANCELLED)
+
+class DownloadJobModel(BaseModel):
+    url: str
+    state: DownloadJobState
+    streamlink: bool
+    priority: int
+    extra_args: dict
+    attempts: int
+    partial_path: str | None
+
+class ScanJobState(Enum):
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+
+class ScanJobModel(BaseModel):
+    id: int
+    state: ScanJobState
+    older_than_s: float | None
+    cursor: int
+    total: int
+    scanned: int
+    public: int
+    unavailable: int
+    guild_id: int | None
+    channel_id: int | None
+
 class SubscriptionModel(BaseModel):
     guild_id: int
     channel_id: int
@@ -29,27 +71,119 @@ class YoutubeWaitingRoom(YoutubeVideo):
     def utcdatetime(self):
         return datetime.datetime.fromtimestamp(self.utcepoch).astimezone(datetime.timezone.utc)
 
-def init_database(db_name: str) -> sqlite3.Connection:
+def _apply_profile(con: sqlite3.Connection, profile: DatabaseConfig):
+    # PRAGMA values cannot be bound as parameters, the config only allows known keywords and ints
+    con.execute(f"PRAGMA busy_timeout = {int(profile.busy_timeout_ms)}")
+    con.execute(f"PRAGMA cache_size = -{int(profile.cache_size_kib)}")
+    con.execute(f"PRAGMA mmap_size = {int(profile.mmap_size)}")
+
+def init_database(db_name: str, profile: DatabaseConfig | None = None) -> sqlite3.Connection:
+    """Opens the read-write connection, tuned by profile, and migrates the schema to the latest version"""
     con = sqlite3.connect(db_name)
-    _setup_tables(con)
+    if profile:
+        _apply_profile(con, profile)
+        con.execute(f"PRAGMA journal_mode = {profile.journal_mode}")
+        con.execute(f"PRAGMA synchronous = {profile.synchronous}")
+    migrate(con)
+    return con
+
+def open_read_connection(db_name: str, profile: DatabaseConfig) -> sqlite3.Connection:
+    """Opens a read-only connection to db_name. The journal mode is a property of the
+    database file, so readers only need the per-connection settings."""
+    con = sqlite3.connect(pathlib.Path(db_name).absolute().as_uri() + '?mode=ro', uri=True, check_same_thread=False)
+    _apply_profile(con, profile)
+    con.execute("PRAGMA query_only = ON")
     return con
 
-def _setup_tables(con: sqlite3.Connection):
-    with con:
-        con.execute("""CREATE TABLE IF NOT EXISTS completion_channels (
-        guild_id integer, channel_id integer, url text,
-        UNIQUE(guild_id, channel_id, url));""")
-        con.execute("""CREATE TABLE IF NOT EXISTS future_downloads (
-        url text, utcepoch int, valid int DEFAULT 1, UNIQUE(url)
-        );""")
-        con.execute("""CREATE TABLE IF NOT EXISTS subscribed_channels (
-            guild_id integer, channel_id integer, youtube_channel text, room_kind text, UNIQUE(guild_id, youtube_channel, room_kind));""")
-        con.execute("""CREATE TABLE IF NOT EXISTS downloaded_files (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            url TEXT,
-            filepath TEXT,
-            download_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_public INTEGER,
-            last_check TIMESTAMP
-        );""")
+def _create_tables(con: sqlite3.Connection):
+    con.execute("""CREATE TABLE IF NOT EXISTS completion_channels (
+    guild_id integer, channel_id integer, url text,
+    UNIQUE(guild_id, channel_id, url));""")
+    con.execute("""CREATE TABLE IF NOT EXISTS future_downloads (
+    url text, utcepoch int, valid int DEFAULT 1, UNIQUE(url)
+    );""")
+    con.execute("""CREATE TABLE IF NOT EXISTS subscribed_channels (
+        guild_id integer, channel_id integer, youtube_channel text, room_kind text, UNIQUE(guild_id, youtube_channel, room_kind));""")
+    con.execute("""CREATE TABLE IF NOT EXISTS downloaded_files (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        url TEXT,
+        filepath TEXT,
+        download_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_public INTEGER,
+        last_check TIMESTAMP
+    );""")
+    con.execute("""CREATE TABLE IF NOT EXISTS download_jobs (
+        url TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        streamlink INTEGER DEFAULT 0,
+        priority INTEGER,
+        extra_args TEXT,
+        attempts INTEGER DEFAULT 0,
+        partial_path TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );""")
+    con.execute("""CREATE TABLE IF NOT EXISTS video_metadata (
+        video_id TEXT PRIMARY KEY,
+        info TEXT,
+        error TEXT,
+        expires_at REAL
+    );""")
+    con.execute("""CREATE TABLE IF NOT EXISTS video_channels (
+        video_id TEXT PRIMARY KEY,
+        channel_url TEXT NOT NULL
+    );""")
+    con.execute("""CREATE TABLE IF NOT EXISTS scan_jobs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        state TEXT NOT NULL,
+        older_than_s REAL,
+        cursor INTEGER DEFAULT 0,
+        total INTEGER,
+        scanned INTEGER DEFAULT 0,
+        public INTEGER DEFAULT 0,
+        unavailable INTEGER DEFAULT 0,
+        guild_id INTEGER,
+        channel_id INTEGER,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );""")
+
+def _add_lookup_indexes(con: sqlite3.Connection):
+    # Covering indexes, the lookups by url and by subscription are answered from the index alone
+    con.execute("""CREATE INDEX IF NOT EXISTS completion_channels_url
+        ON completion_channels (url, guild_id, channel_id);""")
+    con.execute("""CREATE INDEX IF NOT EXISTS subscribed_channels_lookup
+        ON subscribed_channels (youtube_channel, room_kind, guild_id, channel_id);""")
+    # Orders the scheduled downloads list and bounds the cleanup of old entries
+    con.execute("""CREATE INDEX IF NOT EXISTS future_downloads_utcepoch
+        ON future_downloads (utcepoch, valid, url);""")
+    con.execute("""CREATE INDEX IF NOT EXISTS downloaded_files_filepath
+        ON downloaded_files (filepath);""")
+
+def _add_channel_handles(con: sqlite3.Connection):
+    # Maps channel handle URLs to /channel/ URLs, so videos recorded by either form group together
+    con.execute("""CREATE TABLE IF NOT EXISTS channel_handles (
+        handle_url TEXT PRIMARY KEY,
+        channel_url TEXT NOT NULL
+    );""")
+    con.execute("""UPDATE video_channels SET channel_url = lower(rtrim(channel_url, '/'))
+        WHERE channel_url LIKE '%/@%';""")
+
+# Migration n moves the schema from version n to n + 1, PRAGMA user_version holds the current version.
+# Databases from before versioning are at version 0 with their tables already there, so the first
+# migration only creates missing tables. Append new migrations, never edit applied ones.
+MIGRATIONS = [
+    _create_tables,
+    _add_lookup_indexes,
+    _add_channel_handles,
+]
+
+def schema_version(con: sqlite3.Connection) -> int:
+    return con.execute("PRAGMA user_version").fetchone()[0]
 
+def migrate(con: sqlite3.Connection, target_version: int = len(MIGRATIONS)):
+    """Applies the migrations up to target_version, each in its own transaction"""
+    version = schema_version(con)
+    for number in range(version, target_version):
+        with con:
+            con.execute("BEGIN")
+            MIGRATIONS[number](con)
+            con.execute(f"PRAGMA user_version = {number + 1}")
@@ -1,7 +1,10 @@
 import argparse
 import json
+import re
+from urllib.parse import urlparse
 import discord
 import logging
+from typing import Literal
 from pydantic import BaseModel
 
 def CLI():
@@ -18,12 +21,51 @@ class StreamlinkConfig(BaseModel):
     resolution: str = "best"
     executable: str = "streamlink"
     extra_args: list = []
+    pipe_to_ffmpeg: bool = False
+    segment_duration_s: int | None = None
+
+class DatabaseConfig(BaseModel):
+    journal_mode: Literal['wal', 'delete', 'truncate', 'persist'] = 'wal' # readers never block the writer
+    synchronous: Literal['off', 'normal', 'full', 'extra'] = 'normal' # in WAL mode only checkpoints fsync, a crash can lose the last commits but not corrupt
+    mmap_size: int = 256 * 1024 * 1024 # bytes of the database file read through a memory map
+    cache_size_kib: int = 16 * 1024 # page cache per connection
+    busy_timeout_ms: int = 5000
+    read_connections: int = 2 # read-only connections serving get_ queries next to the writer, 0 to disable
     
 
 class Config(BaseModel):
     discord_key: str = ""
     database_file: str = ":memory:"
-    polling_interval_s: int = 60
+    database_config: DatabaseConfig = DatabaseConfig()
+    max_concurrent_downloads: int = 4
+    max_concurrent_postprocessing_per_disk: int = 1
+    download_backend: Literal['thread', 'process'] = 'thread'
+    max_download_attempts: int = 3
+    ytdl_pool_size: int = 4 # idle YoutubeDL instances kept per option set
+    metadata_cache_size: int = 1024 # video metadata entries kept in memory
+    # Seconds cached metadata stays valid by live status, upcoming and live videos change quickly
+    metadata_cache_ttl_s: dict[str, int] = {'is_upcoming': 300, 'is_live': 60, 'post_live': 600,
+                                            'was_live': 86400, 'not_live': 86400}
+    metadata_default_ttl_s: int = 300
+    metadata_negative_ttl_s: int = 3600 # seconds a private or removed video is remembered as unavailable
+    scan_concurrency: int = 8 # availability checks in flight during system scan
+    scan_host_interval_s: float = 0.5 # minimum seconds between scan requests to the same host
+    scan_progress_interval_s: float = 15.0
+    scan_channel_min_files: int = 5 # tracked files from one channel before scans list the channel instead
+    scan_flush_rows: int = 100 # scan results buffered before they are written with a checkpoint
+    scan_flush_interval_s: float = 5.0
+    download_history_size: int = 50
+    schedule_prewarm_s: float = 300.0 # scheduled downloads are readied this long before their start time, 0 to disable, the process backend only checks whether they are live
+    wait_for_live_interval_s: tuple[float, float] = (15.0, 60.0) # min and max seconds between checks of a video not live yet
+    wait_for_live_timeout_s: float = 12 * 3600 # scheduled downloads not live this long after their start time are dropped
+    # Seconds between checks of a scheduled start time when the start is within an hour, within a day and further away
+    schedule_revalidate_s: tuple[float, float, float] = (300.0, 3600.0, 86400.0)
+    schedule_revalidate_concurrency: int = 4 # start time checks in flight at once
+    progress_interval_s: float = 1.0
+    progress_message_interval_s: float = 15.0
+    bandwidth_limit: int | None = None # bytes/s shared by all downloads, None for unlimited
+    live_bandwidth_reserve: int = 2 * 1024 * 1024 # bytes/s kept free for each live download
+    min_vod_bandwidth: int = 256 * 1024 # bytes/s floor for each VOD download
     yt_dlp_config: dict = {}
     pikl_url: str | None = None
     streamlink_config : StreamlinkConfig = StreamlinkConfig()
@@ -56,3 +98,35 @@ async def fetch_channel(guild, channel_id):
     except discord.errors.NotFound:
         channel = None
     return channel
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}h{minutes}m"
+    if minutes:
+        return f"{minutes}m{seconds}s"
+    return f"{seconds}s"
+
+youtube_id_regex = re.compile(r"(?:[?&]v=|youtu\.be/|/live/|/shorts/|/embed/)([a-zA-Z0-9_-]{11})(?![a-zA-Z0-9_-])")
+
+def video_key(url: str) -> str:
+    """Canonical key for a video URL, the YouTube video ID when one can be found.
+    Different URL forms of the same video map to the same key."""
+    if (match := youtube_id_regex.search(url)):
+        return match.group(1)
+    return url
+
+def channel_url_for(channel_id: str) -> str:
+    return f"https://www.youtube.com/channel/{channel_id}"
+
+def normalize_channel_url(channel_url: str) -> str:
+    """Canonical form of a YouTube channel URL, the /channel/ URL when it carries the channel ID.
+    Handle URLs are lowercased, YouTube handles are case-insensitive."""
+    path = urlparse(channel_url).path.rstrip('/')
+    if path.startswith('/channel/'):
+        return channel_url_for(path.split('/')[2])
+    if path.startswith('/@'):
+        return f"https://www.youtube.com/{path.split('/')[1].lower()}"
+    return channel_url
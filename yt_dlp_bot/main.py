@@ -5,17 +5,24 @@ from discord.ext import commands
 
 
 from yt_dlp_bot import helpers
-from yt_dlp_bot.database import init_database
+from yt_dlp_bot.database import init_database, open_read_connection
 from yt_dlp_bot.services.downloader import Downloader
 from yt_dlp_bot.bot import YtDlpBot
 from yt_dlp_bot.cogs import (sync, ytdl, subscription, system)
 from yt_dlp_bot.repositories.download_repository import DownloadRepository
 from yt_dlp_bot.repositories.subscription_repository import SubscriptionRepository
+from yt_dlp_bot.repositories.metadata_repository import MetadataRepository
+from yt_dlp_bot.repositories.async_repository import DatabaseThread
+from yt_dlp_bot.services.metadata_cache import MetadataCache
 from yt_dlp_bot.services.notification_service import DiscordNotificationService
 from yt_dlp_bot.services.download_manager import DownloadManager
 from yt_dlp_bot.services.download_service import DownloadService
 from yt_dlp_bot.services.scheduler_service import SchedulerService
+from yt_dlp_bot.services.schedule_timer import ScheduleTimer
+from yt_dlp_bot.services.schedule_revalidator import ScheduleRevalidator
+from yt_dlp_bot.services.scan_service import ScanService
 from yt_dlp_bot.services.subscription_service import SubscriptionService
+from yt_dlp_bot.services.ytdl_pool import YoutubeDLPool
 
 
 from yt_dlp_bot.pikl_api import waiting_room_client, http_client
@@ -38,22 +45,43 @@ async def main():
     bot = YtDlpBot(
         intents)
         
-    con = init_database(helpers.config.database_file)
-    download_repository = DownloadRepository(con)
-    subscription_repository = SubscriptionRepository(con)
+    # All writes run on one thread so SQLite never blocks the event loop, reads use their own connections
+    database_file = helpers.config.database_file
+    database_config = helpers.config.database_config
+    # Every connection to :memory: opens a separate empty database
+    readers = database_config.read_connections if database_file != ':memory:' else 0
+    db = DatabaseThread(lambda: init_database(database_file, database_config),
+                        lambda: open_read_connection(database_file, database_config), readers)
+    download_repository = db.repository(DownloadRepository)
+    subscription_repository = db.repository(SubscriptionRepository)
     notification_service = DiscordNotificationService(bot)
+    metadata_cache = MetadataCache(db.repository(MetadataRepository), helpers.config.metadata_cache_size)
+    await metadata_cache.cleanup()
 
-    downloader = Downloader(download_repository, subscription_repository, notification_service)
-    download_manager = DownloadManager(downloader, download_repository, notification_service)
+    schedule_timer = ScheduleTimer()
+    # Lookups and threaded downloads check their YoutubeDL instances out of one pool
+    ytdl_pool = YoutubeDLPool(helpers.config.ytdl_pool_size)
+    downloader = Downloader(download_repository, subscription_repository, notification_service, metadata_cache, schedule_timer, ytdl_pool)
+    download_manager = DownloadManager(downloader, download_repository, notification_service, ytdl_pool)
     download_service = DownloadService(downloader, download_repository, download_manager)
-    scheduler_service = SchedulerService(download_repository, download_manager)
+    schedule_revalidator = ScheduleRevalidator(downloader, download_repository, schedule_timer, helpers.config.schedule_revalidate_s,
+                                               helpers.config.schedule_revalidate_concurrency)
+    scheduler_service = SchedulerService(download_repository, download_manager, schedule_timer, helpers.config.schedule_prewarm_s,
+                                         helpers.config.wait_for_live_interval_s, helpers.config.wait_for_live_timeout_s,
+                                         schedule_revalidator)
+    await scheduler_service.load()
+    scan_service = ScanService(downloader, download_repository, notification_service, helpers.config.scan_concurrency,
+                               helpers.config.scan_host_interval_s, helpers.config.scan_progress_interval_s,
+                               helpers.config.scan_channel_min_files, helpers.config.scan_flush_rows,
+                               helpers.config.scan_flush_interval_s)
 
     http_client_instance = None
     if helpers.config.pikl_url:
         http_client_instance = http_client.AsyncHttpClient(helpers.config.pikl_url)
 
     # SubscriptionService needs to be initialized regardless of pikl_url presence
-    subscription_service = SubscriptionService(subscription_repository, http_client_instance, download_service, download_repository, helpers.config)
+    subscription_service = SubscriptionService(subscription_repository, http_client_instance, download_service, download_repository, schedule_timer,
+                                               metadata_cache, helpers.config)
 
     await bot.add_cog(sync.Sync(bot))
     # Pass all required dependencies to YtDl cog
@@ -61,14 +89,25 @@ async def main():
     # Add the new Subscription cog
     await bot.add_cog(subscription.Subscription(bot, http_client_instance, subscription_service, helpers.config))
     # Add the new System cog
-    await bot.add_cog(system.System(bot, download_repository, downloader, download_service, helpers.config))
-    async with bot:
-        tasks = []
-        tasks.append(bot.start(helpers.config.discord_key))
-        if helpers.config.pikl_url:
-            tasks.append(waiting_room_client.run_api_client(helpers.config.pikl_url, subscription_service))
+    await bot.add_cog(system.System(bot, download_repository, downloader, download_service, scan_service, helpers.config))
+    try:
+        async with bot:
+            tasks = []
+            tasks.append(bot.start(helpers.config.discord_key))
+            if helpers.config.pikl_url:
+                tasks.append(waiting_room_client.run_api_client(helpers.config.pikl_url, subscription_service))
 
-        await asyncio.gather(*tasks)
+            await asyncio.gather(*tasks)
+    finally:
+        scheduler_service.stop()
+        # Cancelled downloads and scans write their last state, so they finish before the database closes
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await downloader.aclose()
+        ytdl_pool.close()
+        db.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
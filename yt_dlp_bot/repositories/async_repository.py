@@ -0,0 +1,95 @@
+import asyncio
+import functools
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Generic, Optional, TypeVar
+
+R = TypeVar('R')
+
+def read_only(method):
+    """Marks a repository method that only reads, AsyncRepository may run it on a read connection"""
+    method.read_only = True
+    return method
+
+class DatabaseThread:
+    """Owns the SQLite connection and runs every database call on one dedicated thread.
+
+    Calls run one at a time in the order they were made, so the transactions of
+    different coroutines never interleave and the event loop never waits on SQLite.
+    A call that was made runs to completion even if the awaiting task is cancelled,
+    just like a synchronous call would have.
+
+    With connect_reader and readers set, reads run on a pool of that many threads
+    with a read-only connection each, next to the writer instead of behind it.
+    A read sees every write that was awaited before it was made."""
+    def __init__(self, connect: Callable[[], sqlite3.Connection],
+                 connect_reader: Optional[Callable[[], sqlite3.Connection]] = None, readers: int = 0):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+        # The connection is created on the thread that uses it
+        self.con = self._executor.submit(connect).result()
+        self._readers = None
+        self._reader_cons = []
+        self._local = threading.local()
+        if connect_reader and readers > 0:
+            self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='database-reader',
+                                               initializer=self._open_reader, initargs=(connect_reader,))
+
+    @property
+    def has_readers(self) -> bool:
+        return self._readers is not None
+
+    def _open_reader(self, connect_reader):
+        self._local.con = connect_reader()
+        self._local.repositories = {}
+        self._reader_cons.append(self._local.con)
+
+    def _read_impl(self, repository_class, name: str, args, kwargs):
+        repositories = self._local.repositories
+        if repository_class not in repositories:
+            repositories[repository_class] = repository_class(self._local.con)
+        return getattr(repositories[repository_class], name)(*args, **kwargs)
+
+    async def run(self, func, *args, **kwargs):
+        future = self._executor.submit(functools.partial(func, *args, **kwargs))
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def read(self, repository_class, name: str, *args, **kwargs):
+        """Runs the read method name of repository_class on a read connection"""
+        return await asyncio.wrap_future(self._readers.submit(self._read_impl, repository_class, name, args, kwargs))
+
+    def repository(self, repository_class: Callable[[sqlite3.Connection], R]) -> 'AsyncRepository[R]':
+        return AsyncRepository(repository_class(self.con), self)
+
+    def _close_writer(self):
+        # Moves the write-ahead log into the database file, so it is complete without the -wal file
+        self.con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.con.close()
+
+    def close(self):
+        """Waits for the calls already made and closes every connection, call on shutdown"""
+        if self._readers:
+            self._readers.shutdown()
+            for con in self._reader_cons:
+                con.close()
+        self._executor.submit(self._close_writer).result()
+        self._executor.shutdown()
+
+class AsyncRepository(Generic[R]):
+    """Awaitable view of a repository. Every method of the wrapped repository is a
+    coroutine function here that runs the method on the database thread, or on a
+    read connection for methods marked read_only when the database has readers."""
+    def __init__(self, repository: R, db: DatabaseThread):
+        self.repository = repository
+        self.db = db
+
+    def __getattr__(self, name: str):
+        # Unknown names raise AttributeError here rather than when called
+        reads = getattr(getattr(self.repository, name), 'read_only', False)
+        async def _call(*args, **kwargs):
+            if reads and self.db.has_readers:
+                return await self.db.read(type(self.repository), name, *args, **kwargs)
+            return await self.db.run(getattr(self.repository, name), *args, **kwargs)
+        _call.__name__ = name
+        self.__dict__[name] = _call
+        return _call
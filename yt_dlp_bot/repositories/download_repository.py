@@ -1,5 +1,7 @@
 import sqlite3
-from ..database import YoutubeWaitingRoom
+import json
+from ..database import YoutubeWaitingRoom, DownloadJobState, DownloadJobModel, ScanJobState, ScanJobModel
+from .async_repository import read_only
 
 class DownloadRepository:
     def __init__(self, con: sqlite3.Connection):
@@ -10,10 +12,16 @@ class DownloadRepository:
             self.con.execute("""INSERT OR IGNORE INTO completion_channels(guild_id, channel_id, url)
             VALUES (?, ?, ?)""", (guild_id, channel_id, url))
 
+    @read_only
     def get_completion_channel_for_url(self, url: str):
         return self.con.execute("""SELECT guild_id, channel_id FROM completion_channels
             WHERE url = ?;""", (url, )).fetchone()
 
+    @read_only
+    def get_completion_channels_for_url(self, url: str):
+        return self.con.execute("""SELECT guild_id, channel_id FROM completion_channels
+            WHERE url = ?;""", (url, )).fetchall()
+
     def delete_completion_for_url(self, url: str):
         with self.con:
             return self.con.execute("""DELETE FROM completion_channels
@@ -30,40 +38,58 @@ class DownloadRepository:
     def cleanup_future_downloads(self):
         with self.con:
             self.con.execute("""DELETE FROM future_downloads WHERE
-            (utcepoch - unixepoch()) < -86400;""")
-
+            utcepoch < unixepoch() - 86400;""")
 
-    def get_downloads_now(self, time_offset: int):
-        result = self.con.execute("""SELECT url FROM future_downloads WHERE utcepoch < (unixepoch() + ?) AND valid <> 0;""",
-                         (time_offset, )).fetchall()
-        return [r[0] for r in result]
 
-    def delete_future_download(self, url: str):
+    def claim_future_download(self, url: str, utcepoch: int) -> bool:
+        """Deletes the scheduled download of url if it is still valid and due at utcepoch"""
         with self.con:
-            self.con.execute("""DELETE FROM future_downloads WHERE url=?""",
-                             (url,))
+            cursor = self.con.execute("""DELETE FROM future_downloads WHERE url=? AND utcepoch=? AND valid <> 0""",
+                                      (url, utcepoch))
+            return cursor.rowcount == 1
+
+    def reschedule_future_downloads(self, rescheduled: list, dropped: list) -> list:
+        """Moves the (url, utcepoch, new_utcepoch) scheduled downloads to their new time and deletes
+        the (url, utcepoch) ones in one transaction. Rows changed since utcepoch was read are left
+        alone, returns the urls that were changed."""
+        changed = []
+        with self.con:
+            for url, utcepoch, new_utcepoch in rescheduled:
+                if self.con.execute("""UPDATE future_downloads SET utcepoch=? WHERE url=? AND utcepoch=? AND valid <> 0""",
+                                    (new_utcepoch, url, utcepoch)).rowcount:
+                    changed.append(url)
+            for url, utcepoch in dropped:
+                if self.con.execute("""DELETE FROM future_downloads WHERE url=? AND utcepoch=? AND valid <> 0""",
+                                    (url, utcepoch)).rowcount:
+                    changed.append(url)
+        return changed
 
     def add_downloaded_file(self, url: str, filepath: str):
         with self.con:
             self.con.execute("""INSERT INTO downloaded_files(url, filepath)
             VALUES (?, ?)""", (url, filepath))
 
+    @read_only
     def get_downloaded_files(self):
         results = self.con.execute("""SELECT id, url, filepath, download_time, is_public, last_check FROM downloaded_files ORDER BY download_time DESC;""").fetchall()
         return results
 
-    def get_downloaded_files_for_scan(self, time_delta):
+    @read_only
+    def get_downloaded_files_for_scan(self, time_delta, after_id: int = 0):
         if time_delta:
             # We expect time_delta to be a timedelta object; convert to total seconds for SQLite.
             seconds = time_delta.total_seconds()
             return self.con.execute("""SELECT id, url FROM downloaded_files
-                                       WHERE (is_public IS NULL)
-                                       OR (is_public = 1 AND last_check < (unixepoch() - ?))""",
-                                    (seconds,)).fetchall()
+                                       WHERE ((is_public IS NULL)
+                                       OR (is_public = 1 AND last_check < (unixepoch() - ?)))
+                                       AND id > ? ORDER BY id""",
+                                    (seconds, after_id)).fetchall()
         else:
-            return self.con.execute("""SELECT id, url FROM downloaded_files WHERE is_public IS NULL""").fetchall()
+            return self.con.execute("""SELECT id, url FROM downloaded_files WHERE is_public IS NULL AND id > ? ORDER BY id""",
+                                    (after_id,)).fetchall()
 
 
+    @read_only
     def get_downloaded_file_by_id(self, file_id: int):
         return self.con.execute("""SELECT filepath FROM downloaded_files
             WHERE id = ?;""", (file_id, )).fetchone()
@@ -85,6 +111,12 @@ class DownloadRepository:
             self.con.execute("""UPDATE future_downloads SET valid=0 WHERE url=?""",
                              (url,))
 
+    @read_only
+    def get_future_download(self, url: str):
+        """Returns the (utcepoch, valid) row of the scheduled download of url or None"""
+        return self.con.execute("""SELECT utcepoch, valid FROM future_downloads WHERE url=?""", (url,)).fetchone()
+
+    @read_only
     def get_all_scheduled_downloads(self):
         results = self.con.execute("""SELECT url, utcepoch FROM future_downloads WHERE valid <> 0 ORDER BY utcepoch ASC;""").fetchall()
         return results
@@ -97,4 +129,73 @@ class DownloadRepository:
                 WHERE EXISTS (
                     SELECT 1 FROM subscribed_channels WHERE youtube_channel = ? AND room_kind = ?
             );""", (url, room.utcepoch, room.channel_id.lower(), room.kind.value))
-            return cursor.lastrowid != 0
+            # lastrowid keeps the last insert of the connection when the row is ignored
+            return cursor.rowcount == 1
+
+    def add_download_job(self, url: str, streamlink: bool, priority: int, extra_args: dict):
+        with self.con:
+            self.con.execute("""INSERT INTO download_jobs(url, state, streamlink, priority, extra_args, attempts, partial_path)
+            VALUES (?, ?, ?, ?, ?, 0, NULL)
+            ON CONFLICT(url)
+            DO UPDATE SET state=excluded.state, streamlink=excluded.streamlink, priority=excluded.priority,
+            extra_args=excluded.extra_args, attempts=0, partial_path=NULL, updated_at=CURRENT_TIMESTAMP""",
+            (url, DownloadJobState.QUEUED.value, int(streamlink), int(priority), json.dumps(extra_args)))
+
+    def start_download_job(self, url: str):
+        with self.con:
+            self.con.execute("""UPDATE download_jobs SET state = ?, attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE url = ?""", (DownloadJobState.RUNNING.value, url))
+
+    def update_download_job_state(self, url: str, state: DownloadJobState):
+        with self.con:
+            self.con.execute("""UPDATE download_jobs SET state = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE url = ?""", (state.value, url))
+
+    def set_download_job_partial_path(self, url: str, partial_path: str):
+        with self.con:
+            self.con.execute("""UPDATE download_jobs SET partial_path = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE url = ?""", (partial_path, url))
+
+    @read_only
+    def get_unfinished_download_jobs(self) -> list[DownloadJobModel]:
+        results = self.con.execute("""SELECT url, state, streamlink, priority, extra_args, attempts, partial_path
+            FROM download_jobs WHERE state IN (?, ?, ?) ORDER BY priority ASC, updated_at ASC""",
+            (DownloadJobState.QUEUED.value, DownloadJobState.RUNNING.value, DownloadJobState.REMUXING.value)).fetchall()
+        return [DownloadJobModel(url=url, state=DownloadJobState(state), streamlink=bool(streamlink), priority=priority,
+                                 extra_args=json.loads(extra_args or '{}'), attempts=attempts, partial_path=partial_path)
+                for url, state, streamlink, priority, extra_args, attempts, partial_path in results]
+
+    def cleanup_download_jobs(self):
+        with self.con:
+            self.con.execute("""DELETE FROM download_jobs WHERE state IN (?, ?, ?)
+            AND updated_at < datetime('now', '-7 days')""",
+            (DownloadJobState.DONE.value, DownloadJobState.FAILED.value, DownloadJobState.CANCELLED.value))
+
+    def create_scan_job(self, older_than_s: float | None, total: int, guild_id: int | None, channel_id: int | None) -> int:
+        with self.con:
+            cursor = self.con.execute("""INSERT INTO scan_jobs(state, older_than_s, total, guild_id, channel_id)
+            VALUES (?, ?, ?, ?, ?)""", (ScanJobState.RUNNING.value, older_than_s, total, guild_id, channel_id))
+            return cursor.lastrowid
+
+    def flush_scan_progress(self, job_id: int, statuses: list, cursor: int, scanned: int, public: int, unavailable: int):
+        """Writes a batch of (file_id, is_public) statuses and the job checkpoint in one transaction"""
+        with self.con:
+            self.con.executemany("""UPDATE downloaded_files
+                                SET is_public = ?, last_check = unixepoch()
+                                WHERE id = ?""", ((is_public, file_id) for file_id, is_public in statuses))
+            self.con.execute("""UPDATE scan_jobs SET cursor = ?, scanned = ?, public = ?, unavailable = ?,
+                updated_at = CURRENT_TIMESTAMP WHERE id = ?""", (cursor, scanned, public, unavailable, job_id))
+
+    def finish_scan_job(self, job_id: int, state: ScanJobState):
+        with self.con:
+            self.con.execute("""UPDATE scan_jobs SET state = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?""", (state.value, job_id))
+
+    @read_only
+    def get_interrupted_scan_job(self) -> ScanJobModel | None:
+        row = self.con.execute("""SELECT id, state, older_than_s, cursor, total, scanned, public, unavailable, guild_id, channel_id
+            FROM scan_jobs WHERE state = ? ORDER BY id DESC LIMIT 1""", (ScanJobState.RUNNING.value,)).fetchone()
+        if row is None:
+            return None
+        keys = ('id', 'state', 'older_than_s', 'cursor', 'total', 'scanned', 'public', 'unavailable', 'guild_id', 'channel_id')
+        return ScanJobModel(**dict(zip(keys, row)))
@@ -0,0 +1,66 @@
+import sqlite3
+import json
+from .async_repository import read_only
+
+# Video IDs per lookup query, well below SQLite's limit on bound parameters
+LOOKUP_CHUNK_SIZE = 500
+
+class MetadataRepository:
+    def __init__(self, con: sqlite3.Connection):
+        self.con = con
+
+    @read_only
+    def get_video_metadata(self, video_id: str):
+        """Returns (info, error, expires_at) for video_id, or None if nothing is stored"""
+        row = self.con.execute("""SELECT info, error, expires_at FROM video_metadata
+            WHERE video_id = ?;""", (video_id,)).fetchone()
+        if row is None:
+            return None
+        info, error, expires_at = row
+        return (json.loads(info) if info else None, error, expires_at)
+
+    def put_video_metadata(self, video_id: str, info: dict | None, error: str | None, expires_at: float):
+        with self.con:
+            self.con.execute("""INSERT INTO video_metadata(video_id, info, error, expires_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(video_id)
+            DO UPDATE SET info=excluded.info, error=excluded.error, expires_at=excluded.expires_at""",
+            (video_id, json.dumps(info) if info is not None else None, error, expires_at))
+
+    def delete_video_metadata(self, video_id: str):
+        with self.con:
+            self.con.execute("""DELETE FROM video_metadata WHERE video_id = ?""", (video_id,))
+
+    def cleanup_video_metadata(self):
+        with self.con:
+            self.con.execute("""DELETE FROM video_metadata WHERE expires_at < unixepoch();""")
+
+    def set_video_channel(self, video_id: str, channel_url: str):
+        with self.con:
+            # A handle URL never replaces a known /channel/ URL
+            self.con.execute("""INSERT INTO video_channels(video_id, channel_url)
+            VALUES (?, ?)
+            ON CONFLICT(video_id)
+            DO UPDATE SET channel_url=excluded.channel_url
+            WHERE excluded.channel_url LIKE '%/channel/%' OR video_channels.channel_url NOT LIKE '%/channel/%'""",
+            (video_id, channel_url))
+
+    def set_channel_handle(self, handle_url: str, channel_url: str):
+        with self.con:
+            self.con.execute("""INSERT INTO channel_handles(handle_url, channel_url)
+            VALUES (?, ?)
+            ON CONFLICT(handle_url)
+            DO UPDATE SET channel_url=excluded.channel_url""", (handle_url, channel_url))
+
+    @read_only
+    def get_video_channels(self, video_ids: list) -> dict:
+        """Returns {video_id: channel_url} for the video_ids whose channel is known.
+        Channels recorded by handle are resolved to their /channel/ URL when it is known."""
+        video_ids = list(dict.fromkeys(video_ids))
+        channels = {}
+        for start in range(0, len(video_ids), LOOKUP_CHUNK_SIZE):
+            chunk = video_ids[start:start + LOOKUP_CHUNK_SIZE]
+            channels.update(self.con.execute(f"""SELECT v.video_id, COALESCE(h.channel_url, v.channel_url)
+                FROM video_channels v LEFT JOIN channel_handles h ON h.handle_url = v.channel_url
+                WHERE v.video_id IN ({', '.join('?' * len(chunk))})""", chunk).fetchall())
+        return channels
@@ -1,5 +1,6 @@
 import sqlite3
 from ..database import RoomKind
+from .async_repository import read_only
 
 class SubscriptionRepository:
     def __init__(self, con: sqlite3.Connection):
@@ -20,11 +21,13 @@ class SubscriptionRepository:
                 self.con.execute("""DELETE FROM subscribed_channels
                 WHERE youtube_channel = ? AND guild_id = ?;""", (youtube_channel.lower(), guild_id))
 
+    @read_only
     def get_guild_info_for_subscription(self, youtube_channel: str, kind: RoomKind):
         return self.con.execute("""SELECT guild_id, channel_id FROM subscribed_channels
             WHERE youtube_channel = ? AND room_kind = ?""",
             (youtube_channel, kind.value)).fetchall()
 
+    @read_only
     def get_subscriptions(self, guild_id: int):
         return self.con.execute("""SELECT guild_id, channel_id, youtube_channel, room_kind FROM subscribed_channels
             WHERE guild_id = ?""", (guild_id,)).fetchall()
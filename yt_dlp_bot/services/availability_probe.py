@@ -0,0 +1,63 @@
+import logging
+from enum import Enum
+from typing import Optional
+
+import httpx
+
+from yt_dlp_bot.helpers import video_key
+
+logger = logging.getLogger(__name__)
+
+OEMBED_URL = 'https://www.youtube.com/oembed'
+
+class ProbeResult(Enum):
+    PUBLIC = 'public'
+    UNAVAILABLE = 'unavailable'
+    AMBIGUOUS = 'ambiguous'
+
+class OEmbedProbe:
+    """Classifies YouTube videos with one small oEmbed request instead of a full extraction.
+
+    oEmbed answers 200 for public and unlisted videos and 404 for removed ones.
+    A 401 or 403 can mean private, members-only or just embedding disabled, so
+    those and anything unexpected are left to a full extraction. Public videos also
+    report their channel URL, which channel-level scans group videos by.
+
+    Requests go through proxy, the one yt-dlp is configured with, so probes and
+    extractions leave through the same egress path. No cookies are sent: oEmbed
+    only answers for public videos, anything else falls through to yt-dlp."""
+    def __init__(self, timeout: float = 10.0, proxy: Optional[str] = None):
+        try:
+            self.client = httpx.AsyncClient(timeout=timeout, proxy=proxy or None)
+        except ImportError as e:
+            # SOCKS proxies need httpx's socks extra, every video is extracted through yt-dlp instead
+            logger.warning(f'oEmbed probes are disabled, they cannot use proxy {proxy}: {e}')
+            self.client = None
+
+    async def aclose(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def probe(self, url: str) -> tuple[ProbeResult, Optional[str]]:
+        """Returns the classification of url and its channel URL if it is public"""
+        video_id = video_key(url)
+        if self.client is None or video_id == url:
+            # Not a YouTube video URL
+            return ProbeResult.AMBIGUOUS, None
+        watch_url = f'https://www.youtube.com/watch?v={video_id}'
+        try:
+            response = await self.client.get(OEMBED_URL, params={'url': watch_url, 'format': 'json'})
+        except httpx.HTTPError as e:
+            logger.info(f'oEmbed probe failed for {url}: {e}')
+            return ProbeResult.AMBIGUOUS, None
+        match response.status_code:
+            case 200:
+                try:
+                    channel_url = response.json().get('author_url')
+                except ValueError:
+                    channel_url = None
+                return ProbeResult.PUBLIC, channel_url
+            case 404:
+                return ProbeResult.UNAVAILABLE, None
+            case _:
+                return ProbeResult.AMBIGUOUS, None
@@ -0,0 +1,66 @@
+from typing import Callable, Optional
+
+from yt_dlp_bot.services.download_queue import DownloadPriority
+
+class RateLimit:
+    """Per-download rate limit in bytes/s, None meaning unlimited.
+
+    The thread or process running the download binds a callback that copies new
+    values into yt-dlp's ``ratelimit`` parameter while the download runs."""
+    __slots__ = ('value', '_targets')
+
+    def __init__(self, value: Optional[int] = None):
+        self.value = value
+        self._targets = []
+
+    def set(self, value: Optional[int]):
+        if value == self.value:
+            return
+        self.value = value
+        for apply in list(self._targets):
+            apply(value)
+
+    def bind(self, apply: Callable[[Optional[int]], None]):
+        self._targets.append(apply)
+        apply(self.value)
+
+    def unbind(self, apply: Callable[[Optional[int]], None]):
+        if apply in self._targets:
+            self._targets.remove(apply)
+
+class BandwidthGovernor:
+    """Splits a global bandwidth budget across the downloads holding a queue slot.
+
+    Live downloads are never throttled, each one reserves live_reserve bytes/s of
+    the budget. Whatever is left is shared equally by the VOD downloads, but never
+    below min_vod per download. The split is recomputed whenever a download starts
+    or finishes."""
+    def __init__(self, total: Optional[int], live_reserve: int, min_vod: int):
+        self.total = total
+        self.live_reserve = live_reserve
+        self.min_vod = min_vod
+        self._jobs = {} # job -> (priority, RateLimit)
+
+    def register(self, job, priority: DownloadPriority, rate_limit: RateLimit):
+        self._jobs[job] = (priority, rate_limit)
+        self._rebalance()
+
+    def unregister(self, job):
+        if self._jobs.pop(job, None) is not None:
+            self._rebalance()
+
+    def vod_limit(self) -> Optional[int]:
+        """The current per-download limit for VOD downloads"""
+        if not self.total:
+            return None
+        live_count = sum(1 for priority, _ in self._jobs.values() if priority == DownloadPriority.LIVE)
+        vod_count = len(self._jobs) - live_count
+        if not vod_count:
+            return None
+        vod_budget = self.total - live_count * self.live_reserve
+        return max(vod_budget // vod_count, self.min_vod)
+
+    def _rebalance(self):
+        vod_limit = self.vod_limit()
+        for priority, rate_limit in self._jobs.values():
+            rate_limit.set(None if priority == DownloadPriority.LIVE else vod_limit)
@@ -2,67 +2,206 @@ import logging
 import asyncio
 import datetime
 import threading
+import time
 import os
-from dataclasses import dataclass
+import collections
+import weakref
+from dataclasses import dataclass, field
+from typing import Optional
 
 import yt_dlp
 
 from yt_dlp_bot.repositories.download_repository import DownloadRepository
+from yt_dlp_bot.repositories.async_repository import AsyncRepository
+from yt_dlp_bot.database import DownloadJobState, DownloadJobModel
 from yt_dlp_bot.services.notification_service import NotificationService
-from yt_dlp_bot.helpers import config
+from yt_dlp_bot.helpers import config, video_key
 from yt_dlp_bot.services.downloader import Downloader
+from yt_dlp_bot.services.download_queue import DownloadQueue, DownloadPriority
+from yt_dlp_bot.services.download_process import run_download_process
+from yt_dlp_bot.services.download_progress import DownloadProgress
+from yt_dlp_bot.services.bandwidth_governor import BandwidthGovernor, RateLimit
+from yt_dlp_bot.services import segmented_recording
+from yt_dlp_bot.services.postprocess_pool import PostProcessPool
+from yt_dlp_bot.services.ytdl_pool import YoutubeDLPool
 
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Probed info dicts older than this are extracted again, their format URLs may have expired
+PROBED_INFO_MAX_AGE_S = 30 * 60
+# How often a running streamlink recording checks whether it was cancelled or preempted
+STREAMLINK_CANCEL_POLL_S = 0.5
+
+# Allowed lifecycle transitions, terminal states have none
+DOWNLOAD_TRANSITIONS = {
+    DownloadJobState.QUEUED: {DownloadJobState.RUNNING, DownloadJobState.FAILED, DownloadJobState.CANCELLED},
+    DownloadJobState.RUNNING: {DownloadJobState.QUEUED, DownloadJobState.REMUXING, DownloadJobState.DONE,
+                               DownloadJobState.FAILED, DownloadJobState.CANCELLED},
+    DownloadJobState.REMUXING: {DownloadJobState.RUNNING, DownloadJobState.DONE,
+                                DownloadJobState.FAILED, DownloadJobState.CANCELLED},
+}
+
+class DownloadRecord:
+    """Compact summary of a finished download kept in the history ring"""
+    __slots__ = ('url', 'priority', 'state', 'queued_at', 'started_at', 'finished_at', 'outcome')
+
+    def __init__(self, url: str, priority: DownloadPriority, state: DownloadJobState, queued_at: float,
+                 started_at: Optional[float], finished_at: float, outcome: str):
+        self.url = url
+        self.priority = priority
+        self.state = state
+        self.queued_at = queued_at
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.outcome = outcome
+
+    @property
+    def wait_time(self) -> float:
+        return (self.started_at or self.finished_at) - self.queued_at
+
+    @property
+    def run_time(self) -> float:
+        return self.finished_at - self.started_at if self.started_at else 0.0
+
+@dataclass(eq=False)
 class DownloadTask:
-    task: asyncio.Task
+    task: Optional[asyncio.Task]
     event: threading.Event
+    url: str = ''
+    priority: DownloadPriority = DownloadPriority.VOD
+    started_at: Optional[float] = None
+    preempted: bool = False
+    state: DownloadJobState = DownloadJobState.QUEUED
+    queued_at: float = field(default_factory=time.time)
+    progress: DownloadProgress = field(default_factory=lambda: DownloadProgress(config.progress_interval_s))
+    rate_limit: RateLimit = field(default_factory=RateLimit)
+
+    def transition(self, state: DownloadJobState) -> bool:
+        """Moves the download to state, returns False if the transition is not allowed"""
+        if state not in DOWNLOAD_TRANSITIONS.get(self.state, ()):
+            logger.warning(f'Invalid download state transition {self.state.value} -> {state.value} for {self.url}')
+            return False
+        self.state = state
+        return True
+
+    def preempt(self):
+        """Stops the download so it can give up its slot, it is requeued afterwards"""
+        logger.info(f'Preempting download of {self.url}')
+        self.preempted = True
+        self.event.set()
 
 class DownloadManager:
-    def __init__(self, downloader: Downloader, download_repository: DownloadRepository, notification_service: NotificationService):
+    def __init__(self, downloader: Downloader, download_repository: AsyncRepository[DownloadRepository], notification_service: NotificationService, ytdl_pool: YoutubeDLPool):
         self.downloader = downloader
         self.download_repository = download_repository
         self.notification_service = notification_service
-        self.current_downloads = {} # Stores DownloadTask objects
+        self.current_downloads = {} # video_key -> active DownloadTask, finished ones are reaped into history
+        self._start_locks = weakref.WeakValueDictionary() # video_key -> asyncio.Lock held while its download is started
+        self.history = collections.deque(maxlen=config.download_history_size) # DownloadRecord ring, oldest first
+        self.queue = DownloadQueue(config.max_concurrent_downloads)
+        self.postprocess = PostProcessPool(config.max_concurrent_postprocessing_per_disk)
+        self.ytdl_pool = ytdl_pool
+        self.bandwidth = BandwidthGovernor(config.bandwidth_limit, config.live_bandwidth_reserve, config.min_vod_bandwidth)
+        self.jobs_resumed = False
 
-    async def _notify_for_download(self, url: str, message: str):
+    async def _notify_for_download(self, url: str, message: str) -> list:
+        """Sends message to every completion channel of url and returns the sent message handles"""
         logger.info("Post completion")
-        completion = self.download_repository.get_completion_channel_for_url(url)
-        if completion:
-            (guild_id, channel_id) = completion
-            await self.notification_service.notify(guild_id, channel_id, message)
+        handles = []
+        for (guild_id, channel_id) in await self.download_repository.get_completion_channels_for_url(url):
+            if (handle := await self.notification_service.notify(guild_id, channel_id, message)):
+                handles.append(handle)
+        return handles
+
+    async def _edit_progress_messages(self, url: str, handles: list, progress: DownloadProgress, final: bool = False):
+        verb = 'Downloaded' if final else 'Downloading'
+        text = f'{verb} <{url}>: {progress.summary()}'
+        for handle in handles:
+            await self.notification_service.edit(handle, text)
 
-    async def _download(self, url: str, notify: bool, extra_args: dict, event: threading.Event):
+    async def _update_progress_messages(self, url: str, handles: list, progress: DownloadProgress):
+        """Edits the progress messages of url in place. Progress samples are coalesced so each
+        message is edited at most once every progress_message_interval_s, whatever the progress rate."""
+        last_update = None
+        while True:
+            await asyncio.sleep(config.progress_message_interval_s)
+            if progress.has_data and progress.updated_at != last_update:
+                last_update = progress.updated_at
+                await self._edit_progress_messages(url, handles, progress)
+
+    async def _download(self, url: str, notify: bool, extra_args: dict, event: threading.Event, progress: Optional[DownloadProgress] = None, rate_limit: Optional[RateLimit] = None, info: Optional[dict] = None):
+        progress = progress or DownloadProgress(config.progress_interval_s)
+        rate_limit = rate_limit or RateLimit()
+        progress_updater = None
         if notify:
-            await self._notify_for_download(url, f'Started download of <{url}>')
+            handles = await self._notify_for_download(url, f'Started download of <{url}>')
+            if handles:
+                progress_updater = asyncio.create_task(self._update_progress_messages(url, handles, progress))
+        try:
+            await self._run_ytdlp(url, extra_args, event, progress, rate_limit, info)
+        finally:
+            if progress_updater:
+                progress_updater.cancel()
+        if progress_updater and progress.has_data:
+            await self._edit_progress_messages(url, handles, progress, final=True)
+        await self._notify_for_download(url, f'Finished download for {url}')
+        await self.download_repository.delete_completion_for_url(url)
+
+    async def _run_ytdlp(self, url: str, extra_args: dict, event: threading.Event, progress: DownloadProgress, rate_limit: RateLimit, info: Optional[dict] = None):
+        """Downloads url with yt-dlp. An info dict already extracted with process=False is
+        downloaded from directly instead of extracting the video a second time."""
+        # Without a bandwidth limit yt-dlp keeps any ratelimit from its own config
+        governed = bool(config.bandwidth_limit)
+        record_partial_path = self._make_partial_path_hook(url, asyncio.get_running_loop())
         def _download_hook(event, d):
-            logger.info(f'Checking event {event}')
+            progress.update(d)
+            record_partial_path(d)
             if event.is_set():
-                print('Attempting to cancel yt-dlp')
                 raise asyncio.CancelledError
-        hook_args = {'progress_hooks': [lambda d: _download_hook(event, d)]}
         def _download_impl():
-            with yt_dlp.YoutubeDL(config.yt_dlp_config | extra_args | hook_args) as ydl:
-                logger.info(f'Initiating download of {url}')
-                info = ydl.extract_info(url, download=True)
-                if not info:
-                    logger.error(f'Failed to extract info for {url}')
-                    return None
-                filename = ydl.prepare_filename(info)
-                logger.info(f'Finished download of {url} -> {filename}')
-                return filename
-        filename = await asyncio.to_thread(_download_impl)
+            with self.ytdl_pool.checkout(config.yt_dlp_config | extra_args, [lambda d: _download_hook(event, d)]) as ydl:
+                # Plain HTTP downloads read ratelimit from the shared params on every block, so updates apply
+                # mid-download. Fragment downloads (HLS/DASH) copy the params when they start, they only pick
+                # up updates at their next format or download.
+                def _apply_ratelimit(value):
+                    ydl.params['ratelimit'] = value
+                if governed:
+                    # Applies the current limit before the download starts
+                    rate_limit.bind(_apply_ratelimit)
+                try:
+                    if info is not None:
+                        logger.info(f'Initiating download of {url} from the probed info')
+                        result = ydl.process_ie_result(info, download=True)
+                    else:
+                        logger.info(f'Initiating download of {url}')
+                        result = ydl.extract_info(url, download=True)
+                    if not result:
+                        logger.error(f'Failed to extract info for {url}')
+                        return None
+                    filename = ydl.prepare_filename(result)
+                    logger.info(f'Finished download of {url} -> {filename}')
+                    return filename
+                finally:
+                    rate_limit.unbind(_apply_ratelimit)
+        if config.download_backend == 'process':
+            # The info dict may hold callables that cannot be sent to the worker, it extracts again
+            logger.info(f'Initiating download of {url} in a worker process')
+            def _process_hook(d):
+                progress.update(d)
+                record_partial_path(d)
+            filename = await run_download_process(url, config.yt_dlp_config | extra_args, event, _process_hook,
+                                                  rate_limit=rate_limit if governed else None)
+            logger.info(f'Finished download of {url} -> {filename}')
+        else:
+            filename = await asyncio.to_thread(_download_impl)
         if filename:
-            self.download_repository.add_downloaded_file(url, filename)
-        await self._notify_for_download(url, f'Finished download for {url}')
-        self.download_repository.delete_completion_for_url(url)
+            await self.download_repository.add_downloaded_file(url, filename)
 
     async def _download_streamlink(self, url: str, notify: bool, event: threading.Event):
         if notify:
             await self._notify_for_download(url, f'Started streamlink download of <{url}>')
-        video_info = await asyncio.to_thread(self.downloader.get_info, url) # Use downloader's get_info
+        video_info = await self.downloader.fetch_info(url)
         video_time = datetime.datetime.now(tz=datetime.timezone.utc).strftime("%Y%m%d-%H%M%S")
         video_title = yt_dlp.utils.sanitize_filename(video_info.get('title', ''))
         video_id = video_info.get('id', '')
@@ -70,8 +209,19 @@ class DownloadManager:
             return os.path.join(parentdir, f"{video_title}_{video_id}_{video_time}.{extension}")
         ytdlp_home_dir = config.yt_dlp_config.get("paths", {}).get("home", "./")
         ytdlp_tmp_dir = config.yt_dlp_config.get("paths", {}).get("temp", ytdlp_home_dir)
+        if config.streamlink_config.segment_duration_s:
+            await self._record_streamlink_segmented(url, get_filepath(ytdlp_home_dir, "mp4"), event)
+            await self._notify_for_download(url, f'Finished download for {url}')
+            await self.download_repository.delete_completion_for_url(url)
+            return
+        if config.streamlink_config.pipe_to_ffmpeg:
+            await self._record_streamlink_piped(url, get_filepath(ytdlp_home_dir, "mp4"), event)
+            await self._notify_for_download(url, f'Finished download for {url}')
+            await self.download_repository.delete_completion_for_url(url)
+            return
         streamlink_output = get_filepath(ytdlp_tmp_dir, "ts")
         logger.info(f"Downloading to {streamlink_output}")
+        await self.download_repository.set_download_job_partial_path(url, streamlink_output)
         args = [config.streamlink_config.executable,
                 url,
                 config.streamlink_config.resolution,
@@ -81,43 +231,334 @@ class DownloadManager:
 
         proc = await asyncio.create_subprocess_exec(
             *args)
-        result = await proc.wait()
+        result, = await self._wait_streamlink(url, event, proc)
         logger.info(f"Process returned result {result}")
+        await self._finish_streamlink(url, streamlink_output)
+
+    async def _wait_streamlink(self, url: str, event: threading.Event, *procs) -> list[int]:
+        """Waits for the recording processes of url to exit and returns their exit codes.
+        Once event is set they are terminated and asyncio.CancelledError is raised, like
+        the yt-dlp download hook does, what was recorded so far stays on disk."""
+        exited = asyncio.gather(*(proc.wait() for proc in procs))
+        while not event.is_set():
+            done, _ = await asyncio.wait({exited}, timeout=STREAMLINK_CANCEL_POLL_S)
+            if done:
+                return exited.result()
+        logger.info(f'Stopping streamlink recording of {url}')
+        for proc in procs:
+            if proc.returncode is None:
+                try:
+                    proc.terminate()
+                except ProcessLookupError:
+                    pass
+        await exited
+        raise asyncio.CancelledError
+
+    async def _start_streamlink_pipe(self, url: str, ffmpeg_output_args: list):
+        """Starts streamlink writing to stdout piped into ffmpeg, returns both processes"""
+        args = [config.streamlink_config.executable,
+                url,
+                config.streamlink_config.resolution,
+                "-O",
+                *config.streamlink_config.extra_args]
+        ffmpeg_args = ['ffmpeg', '-i', 'pipe:0', '-c:v', 'copy', '-c:a', 'copy', *ffmpeg_output_args]
+        logger.info(f"Streamlink cmd: {args} | {ffmpeg_args}")
+        read_fd, write_fd = os.pipe()
+        try:
+            streamlink_proc = await asyncio.create_subprocess_exec(*args, stdout=write_fd)
+            ffmpeg_proc = await asyncio.create_subprocess_exec(*ffmpeg_args, stdin=read_fd)
+        finally:
+            # The children hold their own copies, ffmpeg sees EOF once streamlink exits
+            os.close(read_fd)
+            os.close(write_fd)
+        return streamlink_proc, ffmpeg_proc
+
+    async def _record_streamlink_piped(self, url: str, output: str, event: threading.Event):
+        """Pipes streamlink's stdout into ffmpeg, which writes a fragmented MP4 as the stream arrives.
+        Every byte is written once and the file stays playable if the recording is interrupted."""
+        logger.info(f"Downloading to {output} through ffmpeg")
+        await self.download_repository.set_download_job_partial_path(url, output)
+        streamlink_proc, ffmpeg_proc = await self._start_streamlink_pipe(
+            url, ['-movflags', '+frag_keyframe+empty_moov+default_base_moof', '-f', 'mp4', output])
+        result, _ = await self._wait_streamlink(url, event, streamlink_proc, ffmpeg_proc)
+        logger.info(f"Process returned result {result}")
+        if ffmpeg_proc.returncode == 0:
+            await self.download_repository.add_downloaded_file(url, output)
+
+    async def _append_segments_while_recording(self, work_dir: str, part_path: str):
+        while True:
+            await asyncio.sleep(config.streamlink_config.segment_duration_s / 2)
+            await asyncio.to_thread(segmented_recording.append_completed_segments, work_dir, part_path)
 
-        ffmpeg_output = get_filepath(ytdlp_home_dir, "mp4")
+    async def _record_streamlink_segmented(self, url: str, output: str, event: threading.Event):
+        """Records the stream as fixed-duration segments that are joined into output while the
+        stream is still live, so only the last segment is left to join once it ends."""
+        work_dir = segmented_recording.segment_dir_for(output)
+        part_path = output + '.part'
+        os.makedirs(work_dir, exist_ok=True)
+        logger.info(f"Downloading to {output} in segments under {work_dir}")
+        await self.download_repository.set_download_job_partial_path(url, part_path)
+        streamlink_proc, ffmpeg_proc = await self._start_streamlink_pipe(
+            url, segmented_recording.hls_segment_args(work_dir, config.streamlink_config.segment_duration_s))
+        appender = asyncio.create_task(self._append_segments_while_recording(work_dir, part_path))
+        try:
+            result, _ = await self._wait_streamlink(url, event, streamlink_proc, ffmpeg_proc)
+            logger.info(f"Process returned result {result}")
+        finally:
+            appender.cancel()
+        if await asyncio.to_thread(segmented_recording.finalize_segments, work_dir, part_path, output):
+            await self.download_repository.add_downloaded_file(url, output)
+
+    async def _remux_streamlink_output(self, url: str, streamlink_output: str, leave_slot: bool = True):
+        """Remuxes a streamlink .ts recording into an mp4. With leave_slot the download moves to
+        REMUXING and gives up its slot, otherwise it stays running to record again afterwards."""
+        if leave_slot:
+            await self._set_state(url, DownloadJobState.REMUXING)
+        ytdlp_home_dir = config.yt_dlp_config.get("paths", {}).get("home", "./")
+        basename = os.path.splitext(os.path.basename(streamlink_output))[0]
+        ffmpeg_output = os.path.join(ytdlp_home_dir, f"{basename}.mp4")
 
         ffmpeg_convert_args = ['ffmpeg', '-i', streamlink_output, '-c:v', 'copy', '-c:a', 'copy', ffmpeg_output]
         logger.info(f'ffmpeg muxing ts: {ffmpeg_convert_args}')
-        proc = await asyncio.create_subprocess_exec(*ffmpeg_convert_args)
-        result = await proc.wait()
-        if proc.returncode == 0:
+        if leave_slot:
+            self._leave_download_slot(url)
+        result = await self.postprocess.run(ffmpeg_convert_args, ffmpeg_output)
+        if result == 0:
             logger.info(f'ffmpeg success, removing {streamlink_output}')
             os.remove(streamlink_output)
-            self.download_repository.add_downloaded_file(url, ffmpeg_output)
-            
+            await self.download_repository.add_downloaded_file(url, ffmpeg_output)
+
+    async def _finish_streamlink(self, url: str, streamlink_output: str):
+        await self._remux_streamlink_output(url, streamlink_output)
         await self._notify_for_download(url, f'Finished download for {url}')
-        self.download_repository.delete_completion_for_url(url)
+        await self.download_repository.delete_completion_for_url(url)
+
+    async def _resume_streamlink(self, url: str, event: threading.Event, partial_path: Optional[str]):
+        if partial_path and os.path.exists(partial_path):
+            # The stream may still be live, keep what was recorded before the restart and record again
+            if partial_path.endswith('.mp4.part'):
+                # Segmented recordings keep their joined part and any unjoined segments
+                logger.info(f'Finalizing interrupted recording {partial_path}')
+                output = partial_path.removesuffix('.part')
+                work_dir = segmented_recording.segment_dir_for(output)
+                if await asyncio.to_thread(segmented_recording.finalize_segments, work_dir, partial_path, output):
+                    await self.download_repository.add_downloaded_file(url, output)
+            elif partial_path.endswith('.mp4'):
+                # Piped recordings are fragmented MP4s that are playable as they are
+                logger.info(f'Keeping interrupted recording {partial_path}')
+                await self.download_repository.add_downloaded_file(url, partial_path)
+            else:
+                logger.info(f'Remuxing interrupted recording {partial_path}')
+                # The new recording needs the slot and the bandwidth share
+                await self._remux_streamlink_output(url, partial_path, leave_slot=False)
+        await self._download_streamlink(url, False, event)
+
+    def _leave_download_slot(self, url: str):
+        """Hands the download slot of url to the next queued download, the remux waits in the post-processing pool instead"""
+        download_task = self.current_downloads.get(video_key(url))
+        if download_task is None:
+            return
+        self.bandwidth.unregister(download_task)
+        self.queue.release(download_task)
+
+    def _make_partial_path_hook(self, url: str, loop: asyncio.AbstractEventLoop):
+        """Returns a progress hook that records each new partial output file of url.
+        The hook may be called from any thread, the writes are scheduled on loop."""
+        seen = set()
+        def _hook(d):
+            tmpfilename = d.get('tmpfilename')
+            if tmpfilename and tmpfilename not in seen:
+                seen.add(tmpfilename)
+                asyncio.run_coroutine_threadsafe(
+                    self.download_repository.set_download_job_partial_path(url, tmpfilename), loop)
+        return _hook
+
+    async def _run_queued(self, download_task: DownloadTask, notify: bool, start_download):
+        """Waits for a queue slot and runs the download, requeueing it whenever it is preempted.
+        yt-dlp keeps its .part files, so a preempted download picks up where it stopped."""
+        while True:
+            await self.queue.acquire(download_task, download_task.priority)
+            download_task.started_at = time.time()
+            download_task.transition(DownloadJobState.RUNNING)
+            self.bandwidth.register(download_task, download_task.priority, download_task.rate_limit)
+            await self.download_repository.start_download_job(download_task.url)
+            try:
+                result = await start_download(notify)
+                await self._set_state(download_task.url, DownloadJobState.DONE)
+                return result
+            except asyncio.CancelledError:
+                # A shutdown leaves the job running in the table so it is resumed on the next start
+                if not download_task.preempted or asyncio.current_task().cancelling():
+                    raise
+                logger.info(f'Requeueing preempted download of {download_task.url}')
+                await self._set_state(download_task.url, DownloadJobState.QUEUED)
+                download_task.preempted = False
+                download_task.started_at = None
+                download_task.event.clear()
+                notify = False
+            except Exception:
+                await self._set_state(download_task.url, DownloadJobState.FAILED)
+                raise
+            finally:
+                self.bandwidth.unregister(download_task)
+                self.queue.release(download_task)
+
+    def _queue_download_task(self, url: str, notify: bool, priority: DownloadPriority, make_start_download):
+        download_task = DownloadTask(None, threading.Event(), url, priority)
+        start_download = make_start_download(download_task)
+        download_task.task = asyncio.create_task(self._run_queued(download_task, notify, start_download))
+        download_task.task.add_done_callback(lambda task: self._reap_download(download_task, task))
+        return download_task
+
+    async def _set_state(self, url: str, state: DownloadJobState):
+        """Moves the download of url to state, both in memory and in the job table. A transition
+        the in-memory download rejects, like finishing a cancelled one, leaves the table as it is."""
+        if (download_task := self.current_downloads.get(video_key(url))) and not download_task.transition(state):
+            return
+        await self.download_repository.update_download_job_state(url, state)
+
+    def _reap_download(self, download_task: DownloadTask, task: asyncio.Task):
+        """Done callback moving a finished download out of current_downloads into the history ring"""
+        key = video_key(download_task.url)
+        if self.current_downloads.get(key) is download_task:
+            del self.current_downloads[key]
+        if task.cancelled():
+            outcome = 'cancelled'
+        elif (exception := task.exception()):
+            outcome = f'failed: {exception}'
+        else:
+            outcome = 'done'
+        if not download_task.state.is_terminal:
+            # Cancelled by shutdown or while queued, the job table keeps the state for resuming
+            download_task.transition(DownloadJobState.FAILED if outcome.startswith('failed') else DownloadJobState.CANCELLED)
+        self.history.append(DownloadRecord(download_task.url, download_task.priority, download_task.state,
+                                           download_task.queued_at, download_task.started_at, time.time(), outcome))
 
-    def create_download_task(self, url: str, notify: bool, extra_args: dict, streamlink: bool):
-        event = threading.Event()
+    def create_download_task(self, url: str, notify: bool, extra_args: dict, streamlink: bool, priority: DownloadPriority = DownloadPriority.VOD, info: Optional[dict] = None):
         if streamlink:
-            task = asyncio.create_task(self._download_streamlink(url, notify, event))
+            make_start_download = lambda d: lambda notify: self._download_streamlink(url, notify, d.event)
         else:
-            task = asyncio.create_task(self._download(url, notify, extra_args, event))
-        return DownloadTask(task, event)
+            probed = {'info': info}
+            def make_start_download(d):
+                def start_download(notify):
+                    # The probed format URLs expire, only the first attempt uses them and only if it started soon enough
+                    info = probed.pop('info', None)
+                    if info is not None and time.time() - d.queued_at > PROBED_INFO_MAX_AGE_S:
+                        info = None
+                    return self._download(url, notify, extra_args, d.event, d.progress, d.rate_limit, info)
+                return start_download
+        return self._queue_download_task(url, notify, priority, make_start_download)
 
-    async def start_download(self, url: str, guild_id=None, channel_id=None, notify=False, streamlink=False, extra_args: dict = None):
+    async def _attach_to_download(self, download_task: DownloadTask, url: str, guild_id=None, channel_id=None):
+        """Hands the completion channels of a duplicate request for url to the in-flight download"""
+        logger.info(f'{url} is already being downloaded as {download_task.url}, attaching to it')
+        completions = set(await self.download_repository.get_completion_channels_for_url(url))
         if guild_id and channel_id:
-            self.download_repository.add_completion_for_url(guild_id, channel_id, url)
-        task = self.create_download_task(url, notify, extra_args or {}, streamlink)
-        self.current_downloads[url] = task
+            completions.add((guild_id, channel_id))
+        for (completion_guild_id, completion_channel_id) in completions:
+            await self.download_repository.add_completion_for_url(completion_guild_id, completion_channel_id, download_task.url)
+        if url != download_task.url:
+            await self.download_repository.delete_completion_for_url(url)
+
+    async def start_download(self, url: str, guild_id=None, channel_id=None, notify=False, streamlink=False, extra_args: dict = None, priority: DownloadPriority = DownloadPriority.VOD, info: Optional[dict] = None) -> bool:
+        """Starts downloading url, returns False if the video was already being downloaded.
+        info is the result of an extraction with process=False that the download can reuse."""
+        key = video_key(url)
+        # The check and the insert are apart by database writes, a concurrent request for the video waits here
+        if (lock := self._start_locks.get(key)) is None:
+            lock = self._start_locks[key] = asyncio.Lock()
+        async with lock:
+            if (download_task := self.current_downloads.get(key)):
+                await self._attach_to_download(download_task, url, guild_id, channel_id)
+                return False
+            if guild_id and channel_id:
+                await self.download_repository.add_completion_for_url(guild_id, channel_id, url)
+            await self.download_repository.add_download_job(url, streamlink, priority, extra_args or {})
+            task = self.create_download_task(url, notify, extra_args or {}, streamlink, priority, info)
+            self.current_downloads[key] = task
+            return True
+
+    def _resume_download_job(self, job: DownloadJobModel) -> DownloadTask:
+        priority = DownloadPriority(job.priority)
+        if job.streamlink and job.state == DownloadJobState.REMUXING and job.partial_path and os.path.exists(job.partial_path):
+            # The recording itself finished, only the remux was interrupted
+            make_start_download = lambda d: lambda notify: self._finish_streamlink(job.url, job.partial_path)
+        elif job.streamlink:
+            make_start_download = lambda d: lambda notify: self._resume_streamlink(job.url, d.event, job.partial_path)
+        else:
+            # yt-dlp continues from the .part files left behind by the interrupted attempt
+            extra_args = job.extra_args | {'continuedl': True}
+            make_start_download = lambda d: lambda notify: self._download(job.url, notify, extra_args, d.event, d.progress, d.rate_limit)
+        return self._queue_download_task(job.url, False, priority, make_start_download)
+
+    async def resume_download_jobs(self):
+        """Re-adopts downloads that were queued or running when the bot last stopped"""
+        if self.jobs_resumed:
+            return
+        self.jobs_resumed = True
+        await self.download_repository.cleanup_download_jobs()
+        for job in await self.download_repository.get_unfinished_download_jobs():
+            if video_key(job.url) in self.current_downloads:
+                continue
+            if job.attempts >= config.max_download_attempts:
+                logger.warning(f'Giving up on {job.url} after {job.attempts} attempts')
+                await self.download_repository.update_download_job_state(job.url, DownloadJobState.FAILED)
+                continue
+            logger.info(f'Resuming {job.state.value} download of {job.url} (attempt {job.attempts + 1})')
+            self.current_downloads[video_key(job.url)] = self._resume_download_job(job)
+
+    async def prewarm_download(self, url: str) -> Optional[dict]:
+        """Readies a threaded yt-dlp download of url ahead of its start. The metadata is
+        extracted with a YoutubeDL of the download's options, which goes back to the pool
+        with its extractor state and open connections for the download to check out, and
+        the output directory is created. Returns the info dict extracted with process=False.
+
+        The process backend builds its YoutubeDL in the worker, so a pooled instance would
+        never be used. There the info is only looked up, for the scheduler's live check."""
+        if config.download_backend == 'process':
+            return await asyncio.to_thread(self.downloader.get_info, url)
+        def _prewarm_impl():
+            with self.ytdl_pool.checkout(config.yt_dlp_config) as ydl:
+                info = ydl.extract_info(url, download=False, process=False)
+                if info:
+                    os.makedirs(os.path.dirname(os.path.abspath(ydl.prepare_filename(info))), exist_ok=True)
+                return info
+        return await asyncio.to_thread(_prewarm_impl)
+
+    def get_download(self, url: str) -> Optional[DownloadTask]:
+        return self.current_downloads.get(video_key(url))
+
+    def get_running_downloads(self) -> list[DownloadTask]:
+        """Returns the downloads holding a slot followed by the ones still waiting in the queue"""
+        downloads = list(self.current_downloads.values())
+        return sorted(downloads, key=lambda d: (self.queue.is_queued(d), d.priority))
+
+    def get_download_history(self) -> list[DownloadRecord]:
+        """Returns the most recently finished downloads, newest first"""
+        return list(reversed(self.history))
+
+    def get_postprocess_queue_depth(self) -> int:
+        return self.postprocess.depth
 
-    def get_running_downloads(self):
-        return self.current_downloads.keys()
+    def get_queue_wait_time(self, download_task: DownloadTask) -> Optional[float]:
+        return self.queue.wait_time(download_task)
 
-    def cancel_download(self, url):
-        if url in self.current_downloads:
-            logger.info(f'Setting event {self.current_downloads[url].event}')
-            self.current_downloads[url].event.set()
+    async def cancel_download(self, url):
+        """Cancels the download of url, returns False if there is none or it is already post-processing"""
+        if (download_task := self.current_downloads.get(video_key(url))):
+            # The remux runs to completion and records the file, so it is not cancelled
+            if download_task.state == DownloadJobState.REMUXING:
+                logger.info(f'Not cancelling {url}, it is already post-processing')
+                return False
+            download_task.preempted = False
+            if not download_task.transition(DownloadJobState.CANCELLED):
+                return False
+            if self.queue.is_queued(download_task):
+                logger.info(f'Cancelling queued download of {url}')
+                download_task.task.cancel()
+            else:
+                logger.info(f'Setting event {download_task.event}')
+                download_task.event.set()
+            await self.download_repository.update_download_job_state(download_task.url, DownloadJobState.CANCELLED)
             return True
         return False
@@ -0,0 +1,135 @@
+import logging
+import asyncio
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+# Minimum time between progress messages sent by a worker, status changes are always sent
+PROGRESS_SEND_INTERVAL_S = 0.5
+# How long a worker that sent its result gets to leave YoutubeDL and exit before it is killed
+EXIT_TIMEOUT_S = 10.0
+# Progress hook keys that are cheap to pickle, the full dict carries the whole info_dict
+PROGRESS_KEYS = ('status', 'filename', 'tmpfilename', 'downloaded_bytes', 'total_bytes',
+                 'total_bytes_estimate', 'speed', 'eta', 'elapsed', 'fragment_index', 'fragment_count')
+
+class DownloadProcessError(Exception):
+    pass
+
+def _follow_ratelimit(params: dict, ratelimit):
+    """Copies the rate limit shared by the parent into yt-dlp's params. Plain HTTP downloads read them
+    per block, fragment downloads copy them when each format starts."""
+    while True:
+        params['ratelimit'] = ratelimit.value or None
+        time.sleep(1)
+
+def _download_worker(conn, url: str, ydl_opts: dict, ratelimit=None):
+    """Runs in the worker process, streams progress and the result back over conn"""
+    if hasattr(os, 'setpgrp'):
+        # Own process group so ffmpeg children die with the worker on cancellation
+        os.setpgrp()
+    last_sent = {'status': None, 'time': 0.0}
+    def _progress_hook(d):
+        now = time.monotonic()
+        if d.get('status') == last_sent['status'] and now - last_sent['time'] < PROGRESS_SEND_INTERVAL_S:
+            return
+        last_sent['status'], last_sent['time'] = d.get('status'), now
+        conn.send(('progress', {key: d.get(key) for key in PROGRESS_KEYS}))
+    if ratelimit is not None and ratelimit.value:
+        ydl_opts = ydl_opts | {'ratelimit': ratelimit.value}
+    try:
+        with yt_dlp.YoutubeDL(ydl_opts | {'progress_hooks': [_progress_hook]}) as ydl:
+            if ratelimit is not None:
+                threading.Thread(target=_follow_ratelimit, args=(ydl.params, ratelimit), daemon=True).start()
+            info = ydl.extract_info(url, download=True)
+            conn.send(('result', ydl.prepare_filename(info) if info else None))
+    except Exception as e:
+        conn.send(('error', str(e)))
+    finally:
+        conn.close()
+
+def _kill(process: multiprocessing.Process):
+    if hasattr(os, 'killpg'):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            # The worker has not set up its process group yet
+            pass
+    process.kill()
+
+async def run_download_process(url: str, ydl_opts: dict, event: threading.Event, progress_hook=None,
+                               poll_interval: float = 0.25, worker=_download_worker, rate_limit=None,
+                               exit_timeout: float = EXIT_TIMEOUT_S):
+    """Downloads url with yt-dlp in a separate process and returns the output filename.
+
+    Progress dicts are passed to progress_hook on the event loop. Setting event kills
+    the worker immediately and raises asyncio.CancelledError, like the thread backend.
+    A worker that sent its result or error is given exit_timeout seconds to finish
+    cleaning up, saving cookies among others, before it is killed.
+    Changes to rate_limit are forwarded to the worker while it runs."""
+    context = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    args = (child_conn, url, ydl_opts)
+    if rate_limit is not None:
+        shared_ratelimit = context.Value('q', rate_limit.value or 0, lock=False)
+        def _apply_ratelimit(value):
+            shared_ratelimit.value = value or 0
+        rate_limit.bind(_apply_ratelimit)
+        args += (shared_ratelimit,)
+    process = context.Process(target=worker, args=args, daemon=True)
+    process.start()
+    child_conn.close()
+    logger.info(f'Started download process {process.pid} for {url}')
+
+    loop = asyncio.get_running_loop()
+    messages = asyncio.Queue()
+    fd = parent_conn.fileno()
+    def _on_readable():
+        try:
+            while parent_conn.poll():
+                messages.put_nowait(parent_conn.recv())
+        except (EOFError, OSError):
+            loop.remove_reader(fd)
+            messages.put_nowait(('exit', None))
+    loop.add_reader(fd, _on_readable)
+
+    finished = False
+    try:
+        while True:
+            if event.is_set():
+                logger.info(f'Killing download process {process.pid} for {url}')
+                raise asyncio.CancelledError
+            try:
+                kind, payload = await asyncio.wait_for(messages.get(), poll_interval)
+            except TimeoutError:
+                continue
+            match kind:
+                case 'progress':
+                    if progress_hook:
+                        progress_hook(payload)
+                case 'result':
+                    finished = True
+                    return payload
+                case 'error':
+                    finished = True
+                    raise DownloadProcessError(payload)
+                case 'exit':
+                    finished = True
+                    raise DownloadProcessError(f'Download process for {url} exited without a result')
+    finally:
+        if rate_limit is not None:
+            rate_limit.unbind(_apply_ratelimit)
+        loop.remove_reader(fd)
+        parent_conn.close()
+        if finished:
+            await asyncio.to_thread(process.join, exit_timeout)
+        if process.is_alive():
+            if finished:
+                logger.warning(f'Download process {process.pid} for {url} did not exit, killing it')
+            _kill(process)
+        await asyncio.to_thread(process.join)
@@ -0,0 +1,65 @@
+import time
+from typing import Optional
+
+from yt_dlp_bot.helpers import format_duration
+
+class DownloadProgress:
+    """Latest sampled yt-dlp progress of one download.
+
+    ``update`` is used directly as a progress hook. It only copies a few fields, and
+    only when the status changes or ``interval`` seconds have passed since the last
+    sample, so it stays cheap even when yt-dlp calls it for every fragment.
+    ``started_at`` is the wall clock time of the first downloading sample."""
+    __slots__ = ('interval', 'status', 'downloaded_bytes', 'total_bytes', 'speed', 'eta',
+                 'fragment_index', 'fragment_count', 'updated_at', 'started_at')
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.status = None
+        self.downloaded_bytes = None
+        self.total_bytes = None
+        self.speed = None
+        self.eta = None
+        self.fragment_index = None
+        self.fragment_count = None
+        self.updated_at = 0.0
+        self.started_at = None
+
+    def update(self, d: dict):
+        now = time.monotonic()
+        status = d.get('status')
+        if status == self.status and now - self.updated_at < self.interval:
+            return
+        self.status = status
+        if status == 'downloading' and self.started_at is None:
+            self.started_at = time.time()
+        self.downloaded_bytes = d.get('downloaded_bytes')
+        self.total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+        self.speed = d.get('speed')
+        self.eta = d.get('eta')
+        self.fragment_index = d.get('fragment_index')
+        self.fragment_count = d.get('fragment_count')
+        self.updated_at = now
+
+    @property
+    def percent(self) -> Optional[float]:
+        if self.downloaded_bytes is not None and self.total_bytes:
+            return 100.0 * self.downloaded_bytes / self.total_bytes
+        if self.fragment_index is not None and self.fragment_count:
+            return 100.0 * self.fragment_index / self.fragment_count
+        return None
+
+    @property
+    def has_data(self) -> bool:
+        return self.status is not None
+
+    def summary(self) -> str:
+        """Human readable percent, speed and ETA, whichever are known"""
+        parts = []
+        if (percent := self.percent) is not None:
+            parts.append(f"{percent:.1f}%")
+        if self.speed:
+            parts.append(f"{self.speed / (1024 * 1024):.1f} MiB/s")
+        if self.eta is not None:
+            parts.append(f"ETA {format_duration(self.eta)}")
+        return ", ".join(parts)
@@ -0,0 +1,92 @@
+import asyncio
+import heapq
+import itertools
+import time
+from enum import IntEnum
+
+class DownloadPriority(IntEnum):
+    # Lower values are served first
+    LIVE = 0
+    VOD = 1
+
+class DownloadQueue:
+    """Bounded job queue that hands out download slots in priority order.
+
+    When a live job is waiting and every slot is taken, the lowest priority
+    running job is preempted through its ``preempt`` callback so it can release
+    its slot and requeue itself."""
+    def __init__(self, max_concurrent: int):
+        self.max_concurrent = max_concurrent
+        self._waiting = [] # heap of (priority, sequence, job, future)
+        self._running = {} # job -> priority
+        self._queued_at = {} # job -> time.monotonic() of enqueue
+        self._sequence = itertools.count()
+
+    @property
+    def depth(self) -> int:
+        return len(self._waiting)
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def wait_time(self, job) -> float | None:
+        """Seconds the job has spent waiting for a slot, or None if it is not queued."""
+        queued_at = self._queued_at.get(job)
+        if queued_at is None:
+            return None
+        return time.monotonic() - queued_at
+
+    def is_queued(self, job) -> bool:
+        return job in self._queued_at
+
+    async def acquire(self, job, priority: DownloadPriority):
+        if len(self._running) < self.max_concurrent and not self._waiting:
+            self._running[job] = priority
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), job, future))
+        self._queued_at[job] = time.monotonic()
+        self._preempt_for(priority)
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._remove_waiting(job)
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled, hand it on
+                self.release(job)
+            raise
+        finally:
+            self._queued_at.pop(job, None)
+
+    def release(self, job):
+        if self._running.pop(job, None) is None:
+            return
+        self._wake_next()
+
+    def _wake_next(self):
+        while self._waiting and len(self._running) < self.max_concurrent:
+            priority, _, job, future = heapq.heappop(self._waiting)
+            if future.done():
+                continue
+            self._running[job] = priority
+            future.set_result(None)
+
+    def _remove_waiting(self, job):
+        self._waiting = [entry for entry in self._waiting if entry[2] is not job]
+        heapq.heapify(self._waiting)
+
+    def _preempt_for(self, priority: DownloadPriority):
+        if priority != DownloadPriority.LIVE or len(self._running) < self.max_concurrent:
+            return
+        waiting_live = sum(1 for entry in self._waiting if entry[0] == DownloadPriority.LIVE)
+        preempting = sum(1 for job in self._running if getattr(job, 'preempted', False))
+        if waiting_live <= preempting:
+            # Enough slots are already being freed for the waiting live jobs
+            return
+        victims = [job for job, p in self._running.items()
+                   if p > priority and not getattr(job, 'preempted', False)]
+        if not victims:
+            return
+        # Preempt the most recently started job, it has the least progress to lose
+        victims[-1].preempt()
@@ -5,8 +5,12 @@ import re
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 from yt_dlp_bot.services.download_manager import DownloadManager
+from yt_dlp_bot.services.download_queue import DownloadPriority
+from yt_dlp_bot.database import DownloadJobState
+from yt_dlp_bot.helpers import format_duration
 from yt_dlp_bot.services.downloader import Downloader, AvailabilityError, AvailableFuture, AvailableNow
 from yt_dlp_bot.repositories.download_repository import DownloadRepository
+from yt_dlp_bot.repositories.async_repository import AsyncRepository
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +29,7 @@ def parse_text_duration_timedelta(time_str):
     return timedelta(**time_params) if time_params else None
 
 class DownloadService:
-    def __init__(self, downloader: Downloader, download_repository: DownloadRepository, download_manager: DownloadManager):
+    def __init__(self, downloader: Downloader, download_repository: AsyncRepository[DownloadRepository], download_manager: DownloadManager):
         self.downloader = downloader
         self.download_repository = download_repository
         self.download_manager = download_manager
@@ -41,48 +45,84 @@ class DownloadService:
             return None
         return datetime.now().astimezone(timezone.utc) + timedelta_obj
 
-    async def initiate_download(self, url: str, guild_id: int, channel_id: int, streamlink: bool = False, notify: bool = True):
+    async def initiate_download(self, url: str, guild_id: int, channel_id: int, streamlink: bool = False, notify: bool = True, priority: Optional[DownloadPriority] = None):
+        """Starts or schedules a download. Without an explicit priority, streamlink and
+        currently live videos are queued as live downloads and everything else as VOD."""
         if streamlink:
-            await self.download_manager.start_download(url, guild_id, channel_id, streamlink=True, notify=notify)
+            await self.download_manager.start_download(url, guild_id, channel_id, streamlink=True, notify=notify, priority=priority or DownloadPriority.LIVE)
             return "Starting streamlink download"
 
         availability = await self.downloader.get_availability(url)
         match availability:
             case AvailabilityError(errstr):
                 return f"Error: {errstr}"
-            case AvailableNow():
-                await self.download_manager.start_download(url, guild_id, channel_id, notify=notify)
+            case AvailableNow(is_live):
+                if priority is None:
+                    priority = DownloadPriority.LIVE if is_live else DownloadPriority.VOD
+                if not await self.download_manager.start_download(url, guild_id, channel_id, notify=notify, priority=priority, info=availability.info):
+                    return "Video is already being downloaded, you will be notified when it finishes"
                 return "Downloading video now"
             case AvailableFuture(time):
-                self.downloader.defer_download_until_time(url, time, guild_id, channel_id)
+                await self.downloader.defer_download_until_time(url, time, guild_id, channel_id)
                 formatted_dt = discord.utils.format_dt(time, style='F')
                 return f"Scheduling download for {formatted_dt}"
     
-    def schedule_download(self, url: str, timestamp_str: str, guild_id: int, channel_id: int):
+    async def resume_interrupted_downloads(self):
+        await self.download_manager.resume_download_jobs()
+
+    async def schedule_download(self, url: str, timestamp_str: str, guild_id: int, channel_id: int):
         time = self.parse_text_as_datetime(timestamp_str)
         if not time:
             return "Invalid timestamp format. Please use <t:unixepoch:F> or a human readable string like 2d1h5m0s."
-        self.downloader.defer_download_until_time(url, time, guild_id, channel_id)
+        await self.downloader.defer_download_until_time(url, time, guild_id, channel_id)
         formatted_dt = discord.utils.format_dt(time, style='F')
         return f"Scheduling download for {formatted_dt}"
 
-    def cancel_download(self, url: str):
-        if self.download_manager.cancel_download(url):
+    async def cancel_download(self, url: str):
+        if await self.download_manager.cancel_download(url):
             return f"Successfully cancelled running download of <{url}>"
+        if (download := self.download_manager.get_download(url)) and download.state == DownloadJobState.REMUXING:
+            return f"<{url}> is already post-processing and can no longer be cancelled"
         # If not a running download, try to cancel a scheduled download
-        if self.downloader.cancel_scheduled_download(url):
+        if await self.downloader.cancel_scheduled_download(url):
             return f"Successfully cancelled scheduled download of <{url}>"
         return f"Could not find <{url}> in running or future downloads"
     
     def get_running_downloads(self):
-        urls = self.download_manager.get_running_downloads()
-        if not urls:
+        downloads = self.download_manager.get_running_downloads()
+        if not downloads:
             return "No downloads currently running."
-        msg = "\n".join([f'<{url}>' for url in urls])
-        return "Running downloads:\n" + msg
+        lines = []
+        queue_depth = 0
+        for download in downloads:
+            kind = download.priority.name.lower()
+            wait_time = self.download_manager.get_queue_wait_time(download)
+            if wait_time is not None:
+                queue_depth += 1
+                lines.append(f'<{download.url}> ({kind}, queued for {format_duration(wait_time)})')
+            elif download.state == DownloadJobState.REMUXING:
+                lines.append(f'<{download.url}> ({kind}, remuxing)')
+            elif download.progress.has_data and (progress := download.progress.summary()):
+                lines.append(f'<{download.url}> ({kind}, {progress})')
+            else:
+                lines.append(f'<{download.url}> ({kind})')
+        msg = "\n".join(lines)
+        postprocess_depth = self.download_manager.get_postprocess_queue_depth()
+        return f"Running downloads (queue depth {queue_depth}, post-processing queue {postprocess_depth}):\n" + msg
+
+    def get_download_history(self):
+        records = self.download_manager.get_download_history()
+        if not records:
+            return "No downloads have finished yet."
+        lines = []
+        for record in records:
+            lines.append(f"<{record.url}> {record.outcome} <t:{int(record.finished_at)}:R> "
+                         f"(waited {format_duration(record.wait_time)}, ran {format_duration(record.run_time)})")
+        msg = "\n".join(lines)
+        return "Recent downloads:\n" + msg
 
-    def get_scheduled_downloads(self):
-        results = self.downloader.get_scheduled_downloads()
+    async def get_scheduled_downloads(self):
+        results = await self.downloader.get_scheduled_downloads()
         if not results:
             return "No downloads currently scheduled."
         lines = []
@@ -1,4 +1,3 @@
-import yt_dlp
 import logging
 import asyncio
 from dataclasses import dataclass
@@ -8,13 +7,22 @@ from yt_dlp_bot.database import YoutubeWaitingRoom, YoutubeVideo, RoomKind
 from yt_dlp_bot.helpers import config
 from yt_dlp_bot.repositories.download_repository import DownloadRepository
 from yt_dlp_bot.repositories.subscription_repository import SubscriptionRepository
+from yt_dlp_bot.repositories.async_repository import AsyncRepository
 from yt_dlp_bot.services.notification_service import NotificationService
+from yt_dlp_bot.services.ytdl_pool import YoutubeDLPool
+from yt_dlp_bot.services.metadata_cache import MetadataCache, VideoUnavailableError
+from yt_dlp_bot.services.availability_probe import OEmbedProbe, ProbeResult
+from yt_dlp_bot.services.schedule_timer import ScheduleTimer
 import datetime
 import threading
 import os
 
 logger = logging.getLogger(__name__)
 
+CHANNEL_TABS = ('/videos', '/streams', '/shorts')
+# Listed videos that are not publicly watchable
+RESTRICTED_AVAILABILITY = ('private', 'premium_only', 'subscriber_only', 'needs_auth')
+
 # Algebraic data type for video availability
 @dataclass
 class AvailableFuture:
@@ -22,7 +30,8 @@ class AvailableFuture:
 
 @dataclass
 class AvailableNow:
-    pass
+    is_live: bool = False
+    info: dict | None = None # Unprocessed info dict the download can start from, None if it came from the cache
 
 @dataclass
 class AvailabilityError:
@@ -31,21 +40,42 @@ class AvailabilityError:
 Availability = AvailableFuture | AvailableNow | AvailabilityError
 
 class Downloader:
-    def __init__(self, download_repository: DownloadRepository, subscription_repository: SubscriptionRepository, notification_service: NotificationService):
+    def __init__(self, download_repository: AsyncRepository[DownloadRepository], subscription_repository: AsyncRepository[SubscriptionRepository], notification_service: NotificationService, metadata_cache: MetadataCache, schedule_timer: ScheduleTimer, ytdl_pool: YoutubeDLPool):
         self.executor = futures.ThreadPoolExecutor(max_workers=None)
         self.download_repository = download_repository
         self.subscription_repository = subscription_repository
         self.notification_service = notification_service
+        self.ytdl_pool = ytdl_pool
+        self.metadata_cache = metadata_cache
+        self.probe = OEmbedProbe(proxy=config.yt_dlp_config.get('proxy'))
+        self.schedule_timer = schedule_timer
+
+    async def aclose(self):
+        """Closes the availability probe's HTTP client, call on shutdown"""
+        await self.probe.aclose()
 
     def get_info(self, url: str):
         extra_opts = {'ignore_no_formats_error': True}
-        with yt_dlp.YoutubeDL(config.yt_dlp_config | extra_opts) as ydl:
+        with self.ytdl_pool.checkout(config.yt_dlp_config | extra_opts) as ydl:
             info = ydl.extract_info(url, download=False, process=False)
             return info
 
+    async def fetch_info(self, url: str) -> dict:
+        """Returns the cached metadata for url, extracting it on a miss"""
+        info = await self.metadata_cache.get(url)
+        if info is not None:
+            return info
+        try:
+            info = await asyncio.to_thread(self.get_info, url)
+        except Exception as e:
+            await self.metadata_cache.put_error(url, str(e))
+            raise
+        await self.metadata_cache.put(url, info)
+        return info
+
     async def get_availability(self, url: str) -> Availability:
         try:
-            video_info = await asyncio.to_thread(self.get_info, url)
+            video_info = await self.fetch_info(url)
             if not 'live_status' in video_info:
                 return AvailabilityError('No live status found in video info')
             if video_info['live_status'] == 'is_upcoming':
@@ -60,39 +90,80 @@ class Downloader:
                 else:
                     return AvailableFuture(datetime.datetime.now())
             else:
-                return AvailableNow()
+                # Cached metadata is slimmed and has no formats to download from
+                info = video_info if 'formats' in video_info else None
+                return AvailableNow(video_info['live_status'] == 'is_live', info)
         except Exception as e:
             return AvailabilityError(str(e))
 
     async def check_video_availability(self, url: str) -> bool:
-        """Returns True if the video is public and accessible, False otherwise."""
+        """Returns True if the video is public and accessible, False otherwise.
+        A cheap oEmbed probe decides most videos, only ambiguous ones are fully extracted."""
+        cached = None
         try:
-            def _check_impl():
-                # Setting extract_flat=True might be faster but might not accurately report availability 
-                # if the video is private or deleted. extract_info with download=False is more reliable.
-                with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'simulate': True}) as ydl:
-                    ydl.extract_info(url, download=False)
+            # Cached metadata comes from the lookup config, which may be signed in to see restricted videos
+            cached = await self.metadata_cache.get(url)
+            if cached is not None and cached.get('availability') not in RESTRICTED_AVAILABILITY:
+                return True
+            match await self.probe.probe(url):
+                case (ProbeResult.PUBLIC, channel_url):
+                    if channel_url:
+                        await self.metadata_cache.record_channel(url, channel_url)
                     return True
-            return await asyncio.to_thread(_check_impl)
+                case (ProbeResult.UNAVAILABLE, _):
+                    await self.metadata_cache.put_error(url, 'Video unavailable, oEmbed reports it as removed')
+                    return False
+            def _check_impl():
+                # The probe can't tell private from embedding disabled, extract_info with download=False can
+                with self.ytdl_pool.checkout({'quiet': True, 'no_warnings': True, 'simulate': True}) as ydl:
+                    return ydl.extract_info(url, download=False)
+            info = await asyncio.to_thread(_check_impl)
+            await self.metadata_cache.put(url, info)
+            return True
         except Exception as e:
             logger.info(f"Availability check failed for {url}: {e}")
+            # A restricted video's signed-in metadata stays cached for downloading it
+            if not isinstance(e, VideoUnavailableError) and cached is None:
+                await self.metadata_cache.put_error(url, str(e))
             return False
 
-    def defer_download_until_time(self, url: str, time: datetime, guild_id=None, channel_id=None):
+    def list_channel_video_ids(self, channel_url: str) -> set | None:
+        """Returns the IDs of every public video listed on the channel's video, stream and short tabs
+        with one flat extraction per tab, or None if no tab could be listed"""
+        opts = {'quiet': True, 'no_warnings': True, 'extract_flat': 'in_playlist'}
+        video_ids = set()
+        listed = False
+        for tab in CHANNEL_TABS:
+            try:
+                with self.ytdl_pool.checkout(opts) as ydl:
+                    info = ydl.extract_info(channel_url.rstrip('/') + tab, download=False)
+            except Exception as e:
+                # Channels without streams or shorts have no such tab
+                logger.info(f'Could not list {channel_url}{tab}: {e}')
+                continue
+            listed = True
+            for entry in info.get('entries') or []:
+                if entry and entry.get('id') and entry.get('availability') not in RESTRICTED_AVAILABILITY:
+                    video_ids.add(entry['id'])
+        return video_ids if listed else None
+
+    async def defer_download_until_time(self, url: str, time: datetime, guild_id=None, channel_id=None):
         utctimestamp = time.timestamp()
         logger.info(f'Deferring download of {url} until {utctimestamp}')
-        self.download_repository.add_future_download(url, int(utctimestamp))
+        await self.download_repository.add_future_download(url, int(utctimestamp))
+        self.schedule_timer.add(url, int(utctimestamp))
         if guild_id and channel_id:
-            self.download_repository.add_completion_for_url(guild_id, channel_id, url)
+            await self.download_repository.add_completion_for_url(guild_id, channel_id, url)
 
-    def get_scheduled_downloads(self):
-        return self.download_repository.get_all_scheduled_downloads()
+    async def get_scheduled_downloads(self):
+        return await self.download_repository.get_all_scheduled_downloads()
 
-    def cancel_scheduled_download(self, url):
-        scheduled_downloads = self.download_repository.get_all_scheduled_downloads()
+    async def cancel_scheduled_download(self, url):
+        scheduled_downloads = await self.download_repository.get_all_scheduled_downloads()
         urls = {r[0] for r in scheduled_downloads}
         if url in urls:
             # Disable here because we want it to reject nuisance updates from the pikl api if we delete a waiting room
-            self.download_repository.disable_future_download(url)
+            await self.download_repository.disable_future_download(url)
+            self.schedule_timer.remove(url)
             return True
         return False
@@ -0,0 +1,114 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from yt_dlp_bot.helpers import config, video_key, channel_url_for, normalize_channel_url
+from yt_dlp_bot.repositories.metadata_repository import MetadataRepository
+from yt_dlp_bot.repositories.async_repository import AsyncRepository
+
+logger = logging.getLogger(__name__)
+
+# The only info dict fields the bot reads, the formats list alone can be megabytes
+METADATA_KEYS = ('id', 'title', 'channel', 'channel_id', 'channel_url', 'uploader', 'uploader_url', 'live_status', 'was_live',
+                 'release_timestamp', 'timestamp', 'duration', 'availability', 'webpage_url')
+# Error messages from yt-dlp meaning the video will stay unavailable for a while
+UNAVAILABLE_MARKERS = ('private video', 'video unavailable', 'has been removed', 'account associated',
+                       'members-only', 'join this channel', 'sign in to confirm your age',
+                       'this video is not available')
+
+class VideoUnavailableError(Exception):
+    pass
+
+def slim_info(info: dict) -> dict:
+    return {key: info[key] for key in METADATA_KEYS if info.get(key) is not None}
+
+def is_unavailable_error(error: str) -> bool:
+    error = error.lower()
+    return any(marker in error for marker in UNAVAILABLE_MARKERS)
+
+class MetadataCache:
+    """Slimmed video metadata keyed by video ID, backed by SQLite.
+
+    Entries expire after a TTL picked by the video's live status, so upcoming and
+    live videos are re-extracted much sooner than finished ones. Videos that are
+    private or removed are cached as errors for metadata_negative_ttl_s. Recently
+    used entries are kept in memory, the rest are read back from the database."""
+    def __init__(self, repository: AsyncRepository[MetadataRepository], max_entries: int = 1024):
+        self.repository = repository
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # video_id -> (info, error, expires_at)
+        self.hits = 0
+        self.misses = 0
+
+    async def cleanup(self):
+        """Deletes the expired entries from the database"""
+        await self.repository.cleanup_video_metadata()
+
+    def _ttl_for(self, info: dict) -> float:
+        return config.metadata_cache_ttl_s.get(info.get('live_status'), config.metadata_default_ttl_s)
+
+    def _remember(self, video_id: str, entry: tuple):
+        self._entries[video_id] = entry
+        self._entries.move_to_end(video_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, url: str) -> Optional[dict]:
+        """Returns the cached info for url, None on a miss.
+        Raises VideoUnavailableError if the video is cached as unavailable."""
+        video_id = video_key(url)
+        entry = self._entries.get(video_id)
+        if entry is None:
+            entry = await self.repository.get_video_metadata(video_id)
+        if entry is None or entry[2] < time.time():
+            self._entries.pop(video_id, None)
+            self.misses += 1
+            return None
+        self._remember(video_id, entry)
+        self.hits += 1
+        info, error, _ = entry
+        if error is not None:
+            raise VideoUnavailableError(error)
+        return info
+
+    async def put(self, url: str, info: dict) -> dict:
+        """Caches the slimmed projection of info and returns it"""
+        video_id = video_key(url)
+        info = slim_info(info)
+        entry = (info, None, time.time() + self._ttl_for(info))
+        self._remember(video_id, entry)
+        await self.repository.put_video_metadata(video_id, *entry)
+        channel_url = channel_url_for(info['channel_id']) if info.get('channel_id') else info.get('channel_url')
+        if channel_url:
+            channel_url = normalize_channel_url(channel_url)
+            await self.repository.set_video_channel(video_id, channel_url)
+            # oEmbed only reports the handle, this lets those videos group with the channel
+            handle_url = normalize_channel_url(info.get('uploader_url') or '')
+            if '/@' in handle_url and '/channel/' in channel_url:
+                await self.repository.set_channel_handle(handle_url, channel_url)
+        return info
+
+    async def record_channel(self, url: str, channel_url: str):
+        """Remembers which channel uploaded url, kept after the metadata itself expires.
+        channel_url is stored in its canonical form so every URL form of a channel groups together."""
+        await self.repository.set_video_channel(video_key(url), normalize_channel_url(channel_url))
+
+    async def get_channels(self, urls: list) -> dict:
+        """Returns {url: channel_url} for the urls whose channel is known"""
+        channels = await self.repository.get_video_channels([video_key(url) for url in urls])
+        return {url: channels[video_key(url)] for url in urls if video_key(url) in channels}
+
+    async def put_error(self, url: str, error: str):
+        """Caches error for url if it means the video is unavailable, other errors may be transient"""
+        if not is_unavailable_error(error):
+            return
+        video_id = video_key(url)
+        entry = (None, error, time.time() + config.metadata_negative_ttl_s)
+        self._remember(video_id, entry)
+        await self.repository.put_video_metadata(video_id, *entry)
+
+    async def invalidate(self, url: str):
+        video_id = video_key(url)
+        self._entries.pop(video_id, None)
+        await self.repository.delete_video_metadata(video_id)
@@ -1,10 +1,18 @@
+import logging
 from abc import ABC, abstractmethod
 import discord
 from ..helpers import fetch_guild, fetch_channel
 
+logger = logging.getLogger(__name__)
+
 class NotificationService(ABC):
     @abstractmethod
     async def notify(self, guild_id: int, channel_id: int, message: str):
+        """Sends message, returns a handle that can be passed to edit or None if nothing was sent"""
+        pass
+
+    @abstractmethod
+    async def edit(self, handle, message: str):
         pass
 
 class DiscordNotificationService(NotificationService):
@@ -20,4 +28,10 @@ class DiscordNotificationService(NotificationService):
         if not channel:
             return
             
-        await channel.send(message)
+        return await channel.send(message)
+
+    async def edit(self, handle: discord.Message, message: str):
+        try:
+            await handle.edit(content=message)
+        except discord.HTTPException as e:
+            logger.warning(f"Failed to edit message {handle.id}: {e}")
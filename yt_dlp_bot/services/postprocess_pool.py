@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+class PostProcessPool:
+    """Bounded worker pool for post-processing commands such as ffmpeg remuxes.
+
+    Remuxes are limited by disk throughput rather than CPU, so at most
+    ``per_device`` commands run at once against each filesystem device, and
+    every command runs under nice and the lowest priority of ionice's best-effort
+    class, so active recordings come first without starving the remuxes. The idle
+    class would never let a remux through while recordings keep the disk busy."""
+    def __init__(self, per_device: int, niceness: int = 10):
+        self.per_device = per_device
+        self.niceness = niceness
+        self._slots = {} # st_dev -> asyncio.Semaphore
+        self._waiting = 0
+        self._running = 0
+
+    @property
+    def depth(self) -> int:
+        return self._waiting
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    def _device_of(self, path: str) -> int:
+        directory = os.path.dirname(os.path.abspath(path))
+        while not os.path.exists(directory):
+            directory = os.path.dirname(directory)
+        return os.stat(directory).st_dev
+
+    def _low_priority_prefix(self) -> list:
+        prefix = []
+        if shutil.which('ionice'):
+            prefix += ['ionice', '-c', '2', '-n', '7']
+        if shutil.which('nice'):
+            prefix += ['nice', '-n', str(self.niceness)]
+        return prefix
+
+    async def run(self, args: list, path: str) -> int:
+        """Runs args once a slot on the device holding path is free, returns the exit code"""
+        device = self._device_of(path)
+        slots = self._slots.setdefault(device, asyncio.Semaphore(self.per_device))
+        self._waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            command = self._low_priority_prefix() + args
+            logger.info(f'Post-processing: {command}')
+            proc = await asyncio.create_subprocess_exec(*command)
+            try:
+                return await proc.wait()
+            except asyncio.CancelledError:
+                proc.kill()
+                raise
+        finally:
+            self._running -= 1
+            slots.release()
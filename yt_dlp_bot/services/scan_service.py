@@ -0,0 +1,245 @@
+import asyncio
+import datetime
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+from urllib.parse import urlparse
+
+from yt_dlp_bot.database import ScanJobState
+from yt_dlp_bot.helpers import format_duration, video_key
+from yt_dlp_bot.repositories.download_repository import DownloadRepository
+from yt_dlp_bot.repositories.async_repository import AsyncRepository
+from yt_dlp_bot.services.downloader import Downloader
+from yt_dlp_bot.services.notification_service import NotificationService
+
+logger = logging.getLogger(__name__)
+
+def host_of(url: str) -> str:
+    host = urlparse(url).netloc.lower()
+    return host.removeprefix('www.').removeprefix('m.')
+
+class HostPacer:
+    """Spaces out requests to the same host by at least interval seconds"""
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_slot = {} # host -> time.monotonic() of the next free slot
+
+    async def wait(self, host: str):
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, 0.0))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+@dataclass(eq=False)
+class ScanJob:
+    id: int
+    total: int
+    file_ids: list # sorted ids of the files left to scan in this run
+    guild_id: Optional[int] = None
+    channel_id: Optional[int] = None
+    scanned: int = 0
+    public: int = 0
+    unavailable: int = 0
+    cursor: int = 0
+    started_at: float = field(default_factory=time.time)
+    task: Optional[asyncio.Task] = None
+    cancelled: bool = False
+    pending: list = field(default_factory=list) # (file_id, is_public) not written yet
+    written: set = field(default_factory=set) # written ids that the cursor has not passed yet
+    last_flush: float = field(default_factory=time.monotonic)
+
+    def record(self, file_id: int, is_available: bool):
+        self.pending.append((file_id, 1 if is_available else 0))
+        self.scanned += 1
+        if is_available:
+            self.public += 1
+        else:
+            self.unavailable += 1
+
+    def advance_cursor(self, statuses: list):
+        """Moves the cursor past every file id whose status is written, in id order"""
+        self.written.update(file_id for file_id, _ in statuses)
+        position = 0
+        while position < len(self.file_ids) and self.file_ids[position] in self.written:
+            self.written.discard(self.file_ids[position])
+            self.cursor = self.file_ids[position]
+            position += 1
+        del self.file_ids[:position]
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def summary(self) -> str:
+        return f"Scanned: {self.scanned}/{self.total}, Still Public: {self.public}, Now Private/Unavailable: {self.unavailable}"
+
+    def progress(self) -> str:
+        elapsed = time.time() - self.started_at
+        return f"Scanning... {self.summary()} ({format_duration(elapsed)} elapsed)"
+
+class ScanService:
+    """Runs availability scans of tracked files as a background job.
+
+    Files from channels with at least channel_min_files tracked files are checked
+    against one flat listing of the channel, videos missing from it are probed one
+    by one like all other files. Up to concurrency listings or probes run at once,
+    requests to the same host are spaced host_interval seconds apart, and progress
+    is shown in one message edited every progress_interval seconds.
+
+    Results are written in batches of flush_rows or every flush_interval seconds
+    together with a checkpoint of the scan job, so a scan interrupted by a restart
+    resumes after its last checkpoint. Only one scan runs at a time."""
+    def __init__(self, downloader: Downloader, download_repository: AsyncRepository[DownloadRepository],
+                 notification_service: NotificationService, concurrency: int, host_interval: float,
+                 progress_interval: float, channel_min_files: int = 5, flush_rows: int = 100,
+                 flush_interval: float = 5.0):
+        self.downloader = downloader
+        self.download_repository = download_repository
+        self.notification_service = notification_service
+        self.concurrency = concurrency
+        self.channel_min_files = channel_min_files
+        self.pacer = HostPacer(host_interval)
+        self.progress_interval = progress_interval
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.current: Optional[ScanJob] = None
+        self.starting = False
+        self.scan_resumed = False
+
+    async def start_scan(self, files: list, older_than: Optional[datetime.timedelta] = None,
+                   guild_id=None, channel_id=None) -> Optional[ScanJob]:
+        """Starts scanning files, the (file_id, url) rows matching older_than. Progress is
+        posted to channel_id. Returns None if a scan is already running."""
+        if self.starting or (self.current and self.current.running):
+            return None
+        older_than_s = older_than.total_seconds() if older_than else None
+        self.starting = True
+        try:
+            job_id = await self.download_repository.create_scan_job(older_than_s, len(files), guild_id, channel_id)
+        finally:
+            self.starting = False
+        job = ScanJob(job_id, len(files), sorted(file_id for file_id, _ in files), guild_id, channel_id)
+        self._run_job(job, files, f"Starting availability scan for {len(files)} files...")
+        return job
+
+    async def resume_interrupted_scan(self) -> Optional[ScanJob]:
+        """Continues the scan that was running when the bot last stopped from its checkpoint"""
+        if self.scan_resumed:
+            return None
+        self.scan_resumed = True
+        model = await self.download_repository.get_interrupted_scan_job()
+        if model is None:
+            return None
+        older_than = datetime.timedelta(seconds=model.older_than_s) if model.older_than_s is not None else None
+        # Files written after the cursor no longer match the scan criteria
+        files = await self.download_repository.get_downloaded_files_for_scan(older_than, after_id=model.cursor)
+        job = ScanJob(model.id, model.total, [file_id for file_id, _ in files], model.guild_id, model.channel_id,
+                      model.scanned, model.public, model.unavailable, model.cursor)
+        logger.info(f'Resuming scan {job.id} after file {job.cursor}, {len(files)} files left')
+        self._run_job(job, files, f"Resuming interrupted availability scan, {len(files)} files left...")
+        return job
+
+    def _run_job(self, job: ScanJob, files: list, first_message: str):
+        job.task = asyncio.create_task(self._run(job, files, first_message))
+        self.current = job
+
+    def cancel_scan(self) -> bool:
+        if not self.current or not self.current.running:
+            return False
+        self.current.cancelled = True
+        self.current.task.cancel()
+        return True
+
+    async def _flush(self, job: ScanJob):
+        statuses, job.pending = job.pending, []
+        job.advance_cursor(statuses)
+        await self.download_repository.flush_scan_progress(job.id, statuses, job.cursor, job.scanned, job.public, job.unavailable)
+        job.last_flush = time.monotonic()
+
+    async def _record(self, job: ScanJob, file_id: int, is_available: bool):
+        job.record(file_id, is_available)
+        if len(job.pending) >= self.flush_rows or time.monotonic() - job.last_flush >= self.flush_interval:
+            await self._flush(job)
+
+    async def _scan_file(self, job: ScanJob, file_id: int, url: str):
+        await self.pacer.wait(host_of(url))
+        await self._record(job, file_id, await self.downloader.check_video_availability(url))
+
+    async def _scan_channel(self, job: ScanJob, channel_url: str, files: list, leftovers: list):
+        await self.pacer.wait(host_of(channel_url))
+        public_ids = await asyncio.to_thread(self.downloader.list_channel_video_ids, channel_url)
+        if public_ids is None:
+            leftovers.extend(files)
+            return
+        for file_id, url in files:
+            if video_key(url) in public_ids:
+                await self._record(job, file_id, True)
+            else:
+                # Unlisted, private or removed, only a probe can tell
+                leftovers.append((file_id, url))
+
+    async def _group_by_channel(self, files: list) -> tuple[dict, list]:
+        """Splits files into {channel_url: files} for channels worth listing and the remaining files"""
+        channels = await self.downloader.metadata_cache.get_channels([url for _, url in files])
+        groups = {}
+        for file_id, url in files:
+            if url in channels:
+                groups.setdefault(channels[url], []).append((file_id, url))
+        singles = [(file_id, url) for file_id, url in files if url not in channels]
+        for channel_url in [c for c, group in groups.items() if len(group) < self.channel_min_files]:
+            singles.extend(groups.pop(channel_url))
+        return groups, singles
+
+    async def _run_workers(self, items, handler):
+        items = iter(items)
+        async def _worker():
+            # Workers share the iterator so only concurrency requests are in flight at once
+            for item in items:
+                await handler(*item)
+        async with asyncio.TaskGroup() as workers:
+            for _ in range(self.concurrency):
+                workers.create_task(_worker())
+
+    async def _report_progress(self, job: ScanJob, handle):
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            await self.notification_service.edit(handle, job.progress())
+
+    async def _finish(self, job: ScanJob, handle, state: ScanJobState, message: str):
+        await self._flush(job)
+        await self.download_repository.finish_scan_job(job.id, state)
+        if handle is not None:
+            await self.notification_service.edit(handle, message)
+        if job.guild_id and job.channel_id:
+            await self.notification_service.notify(job.guild_id, job.channel_id, message)
+
+    async def _run(self, job: ScanJob, files: list, first_message: str):
+        handle = None
+        if job.guild_id and job.channel_id:
+            handle = await self.notification_service.notify(job.guild_id, job.channel_id, first_message)
+        reporter = asyncio.create_task(self._report_progress(job, handle)) if handle is not None else None
+        try:
+            groups, singles = await self._group_by_channel(files)
+            logger.info(f'Scanning {len(files)} files, {len(files) - len(singles)} of them through {len(groups)} channel listings')
+            await self._run_workers(((job, channel_url, group, singles) for channel_url, group in groups.items()),
+                                    self._scan_channel)
+            await self._run_workers(((job, file_id, url) for file_id, url in singles), self._scan_file)
+        except asyncio.CancelledError:
+            if not job.cancelled:
+                # Shutting down, the job stays running in the table and resumes on the next start
+                await self._flush(job)
+                raise
+            logger.info(f'Scan cancelled after {job.scanned} files')
+            await self._finish(job, handle, ScanJobState.CANCELLED, f"Scan cancelled. {job.summary()}")
+            raise
+        except Exception as e:
+            logger.error(f'Scan failed: {e}')
+            await self._finish(job, handle, ScanJobState.FAILED, f"Scan failed: {e}. {job.summary()}")
+            raise
+        finally:
+            if reporter:
+                reporter.cancel()
+        await self._finish(job, handle, ScanJobState.DONE,
+                           f"Scan complete. Scanned: {job.scanned}, Still Public: {job.public}, Now Private/Unavailable: {job.unavailable}")
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from yt_dlp_bot.repositories.download_repository import DownloadRepository
+from yt_dlp_bot.repositories.async_repository import AsyncRepository
+from yt_dlp_bot.services.downloader import Downloader
+from yt_dlp_bot.services.metadata_cache import is_unavailable_error
+from yt_dlp_bot.services.schedule_timer import ScheduleTimer
+
+logger = logging.getLogger(__name__)
+
+HOUR_S = 3600
+DAY_S = 24 * HOUR_S
+
+def revalidate_interval(seconds_to_start: float, intervals: tuple[float, float, float]) -> float:
+    """Seconds between checks of a start time, intervals are for starts within an hour, a day and later"""
+    within_hour, within_day, later = intervals
+    if seconds_to_start <= HOUR_S:
+        return within_hour
+    if seconds_to_start <= DAY_S:
+        return within_day
+    return later
+
+class ScheduleRevalidator:
+    """Keeps the start times of scheduled downloads current.
+
+    Premieres and streams are often moved after their download was scheduled. Every
+    pass extracts the scheduled videos whose last check is older than the interval
+    for their start time, up to concurrency at once. Moved start times are updated
+    in future_downloads and in schedule_timer, videos that are live already are
+    moved to now, and videos that were made private or removed are dropped, all in
+    one transaction per pass. Passes run intervals[0] seconds apart and only read
+    the schedule from schedule_timer."""
+    def __init__(self, downloader: Downloader, download_repository: AsyncRepository[DownloadRepository],
+                 schedule_timer: ScheduleTimer, intervals: tuple[float, float, float] = (300.0, 3600.0, 86400.0),
+                 concurrency: int = 4):
+        self.downloader = downloader
+        self.download_repository = download_repository
+        self.schedule_timer = schedule_timer
+        self.intervals = intervals
+        self.concurrency = concurrency
+        self.checked_at = {} # url -> time.time() of its last check, or of when it was first seen
+        self.task: Optional[asyncio.Task] = None
+
+    def _due(self, now: float) -> list[tuple[str, int]]:
+        scheduled = self.schedule_timer.items()
+        # Forget downloads that started or were cancelled
+        self.checked_at = {url: self.checked_at.get(url, now) for url, _ in scheduled}
+        return [(url, utcepoch) for url, utcepoch in scheduled
+                if now - self.checked_at[url] >= revalidate_interval(utcepoch - now, self.intervals)]
+
+    async def _check(self, url: str, utcepoch: int, rescheduled: list, dropped: list):
+        try:
+            info = await asyncio.to_thread(self.downloader.get_info, url)
+        except Exception as e:
+            if is_unavailable_error(str(e)):
+                logger.info(f'Dropping scheduled download of {url}, the video is gone: {e}')
+                dropped.append((url, utcepoch))
+            else:
+                logger.info(f'Could not check the start time of {url}: {e}')
+            return
+        if info is None:
+            return
+        if info.get('live_status') != 'is_upcoming':
+            logger.info(f'{url} is {info.get("live_status")} already, starting its scheduled download now')
+            rescheduled.append((url, utcepoch, int(time.time())))
+        elif (release_timestamp := info.get('release_timestamp')) and int(release_timestamp) != utcepoch:
+            logger.info(f'Start time of {url} moved from {utcepoch} to {release_timestamp}')
+            rescheduled.append((url, utcepoch, int(release_timestamp)))
+
+    async def revalidate(self):
+        """Checks every scheduled download that is due for a check and applies the changes"""
+        now = time.time()
+        due = self._due(now)
+        if not due:
+            return
+        rescheduled, dropped = [], []
+        limit = asyncio.Semaphore(self.concurrency)
+        async def _check_limited(url, utcepoch):
+            async with limit:
+                await self._check(url, utcepoch, rescheduled, dropped)
+        await asyncio.gather(*(_check_limited(url, utcepoch) for url, utcepoch in due))
+        for url, _ in due:
+            self.checked_at[url] = now
+        if not rescheduled and not dropped:
+            return
+        changed = set(await self.download_repository.reschedule_future_downloads(rescheduled, dropped))
+        for url, _, new_utcepoch in rescheduled:
+            if url in changed:
+                self.schedule_timer.add(url, new_utcepoch)
+        for url, _ in dropped:
+            if url in changed:
+                self.schedule_timer.remove(url)
+        logger.info(f'Checked {len(due)} scheduled start times, {len(rescheduled)} moved, {len(dropped)} dropped')
+
+    async def _run(self):
+        while True:
+            try:
+                await self.revalidate()
+            except Exception as e:
+                logger.error(f'Checking scheduled start times failed: {e}')
+            await asyncio.sleep(self.intervals[0])
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
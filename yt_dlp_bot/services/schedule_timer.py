@@ -0,0 +1,72 @@
+import asyncio
+import heapq
+import time
+from typing import Iterable, Optional
+
+# Longest sleep between checks of the next start time, so wall clock jumps and suspends are caught up
+MAX_SLEEP_S = 300.0
+
+class ScheduleTimer:
+    """Start times of the scheduled downloads in memory, earliest first.
+
+    Entries live in a min-heap of (utcepoch, url). Rescheduling or removing a url
+    only updates the url's current time, stale heap entries are dropped when they
+    reach the top. wait_until_due sleeps until the earliest start time, or lead_s
+    before it, and wakes early when an earlier one is added."""
+    def __init__(self):
+        self._heap = [] # (utcepoch, url), may hold stale entries
+        self._times = {} # url -> current utcepoch
+        self._changed = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._times)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._times
+
+    def load(self, scheduled: Iterable[tuple[str, int]]):
+        """Adds the (url, utcepoch) rows of the scheduled downloads"""
+        for url, utcepoch in scheduled:
+            self.add(url, utcepoch)
+
+    def add(self, url: str, utcepoch: int):
+        """Schedules url for utcepoch, replacing its previous time"""
+        self._times[url] = utcepoch
+        heapq.heappush(self._heap, (utcepoch, url))
+        if self._heap[0] == (utcepoch, url):
+            self._changed.set()
+
+    def items(self) -> list[tuple[str, int]]:
+        """The (url, utcepoch) entries in no particular order"""
+        return list(self._times.items())
+
+    def remove(self, url: str) -> bool:
+        return self._times.pop(url, None) is not None
+
+    def next_time(self) -> Optional[int]:
+        """The earliest start time, None when nothing is scheduled"""
+        while self._heap and self._times.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> list[tuple[str, int]]:
+        """Removes and returns the (url, utcepoch) entries starting at or before now, earliest first"""
+        due = []
+        while (next_time := self.next_time()) is not None and next_time <= now:
+            utcepoch, url = heapq.heappop(self._heap)
+            del self._times[url]
+            due.append((url, utcepoch))
+        return due
+
+    async def wait_until_due(self, lead_s: float = 0.0):
+        """Returns once the earliest start time is at most lead_s seconds away"""
+        while True:
+            self._changed.clear()
+            next_time = self.next_time()
+            delay = MAX_SLEEP_S if next_time is None else min(next_time - lead_s - time.time(), MAX_SLEEP_S)
+            if delay <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._changed.wait(), delay)
+            except TimeoutError:
+                pass
@@ -1,49 +1,167 @@
 import logging
 import asyncio
-from discord.ext import tasks
-import datetime
+import time
+from typing import Optional
 
 from yt_dlp_bot.repositories.download_repository import DownloadRepository
+from yt_dlp_bot.repositories.async_repository import AsyncRepository
 from yt_dlp_bot.services.download_manager import DownloadManager
-from yt_dlp_bot.helpers import config
+from yt_dlp_bot.services.download_queue import DownloadPriority
+from yt_dlp_bot.services.metadata_cache import VideoUnavailableError, is_unavailable_error
+from yt_dlp_bot.services.schedule_timer import ScheduleTimer
+from yt_dlp_bot.services.schedule_revalidator import ScheduleRevalidator
 
 logger = logging.getLogger(__name__)
 
+# How often a started scheduled download is checked for its first data
+START_LAG_POLL_S = 1.0
+
+def wait_for_live_interval(seconds_to_start: float, min_s: float, max_s: float) -> float:
+    """Seconds until the next check of a video that is not live yet. Checks tighten towards
+    the start time, land on it, and back off again the later the video is."""
+    if seconds_to_start > 0:
+        return min(max(seconds_to_start / 2, min_s), max_s, seconds_to_start)
+    return min(max(-seconds_to_start / 4, min_s), max_s)
+
 class SchedulerService:
-    def __init__(self, download_repository: DownloadRepository, download_manager: DownloadManager):
+    """Starts scheduled downloads at their start time.
+
+    The start times are kept in schedule_timer, loaded from future_downloads once
+    and kept up to date by everything that schedules or cancels a download, so the
+    database is only touched when a download is due.
+
+    prewarm_s seconds before the start time the download is readied, so yt-dlp
+    starts from a warm instance instead of setting up while the stream is running.
+    From then on the scheduler checks whether the video is live, between
+    wait_interval_s[0] and wait_interval_s[1] seconds apart, and hands the download
+    to yt-dlp only once it is, so no download thread or slot sits waiting. Videos
+    that are private or removed, or still not live wait_timeout_s after their start
+    time, are dropped, and ones whose start moved further out go back on the timer. The delay between the start time
+    and the first downloaded data is logged for every scheduled download.
+
+    The start times still on the timer are kept current by revalidator, which runs
+    alongside the scheduler."""
+    def __init__(self, download_repository: AsyncRepository[DownloadRepository], download_manager: DownloadManager,
+                 schedule_timer: ScheduleTimer, prewarm_s: float = 0.0,
+                 wait_interval_s: tuple[float, float] = (15.0, 60.0), wait_timeout_s: float = 12 * 3600,
+                 revalidator: Optional[ScheduleRevalidator] = None):
         self.download_repository = download_repository
         self.download_manager = download_manager
-        self.running_scheduled_downloads = {} # To keep track of tasks started by the scheduler
-
-    @tasks.loop(seconds=config.polling_interval_s, reconnect=True)
-    async def _check_scheduled_downloads(self):
-        urls = self.download_repository.get_downloads_now(config.polling_interval_s * 2) # Get downloads scheduled for the next two polling intervals
-        [self.download_repository.delete_future_download(url) for url in urls]
-        if urls:
-            logger.info(f'Scheduler initiating downloads for: {urls}')
-
-        extra_args = {'wait_for_video': [15, 60]}
-
-        # Start asyncio tasks for each video to be downloaded
-        new_tasks = {}
-        for url in urls:
-            # The download_manager.start_download adds the task to its internal current_downloads
-            # The scheduler needs to keep its own reference to tasks it initiates for proper management
-            await self.download_manager.start_download(url, notify=True, extra_args=extra_args, streamlink=False)
-            # We don't directly manage the task here, as DownloadManager already does.
-            # But we need to ensure that the DownloadManager's tasks are awaited.
-            # For simplicity, we assume DownloadManager manages its lifecycle, and Scheduler just triggers.
-            # If a detailed task tracking is needed by the scheduler, DownloadManager should return the task.
-            # For now, let's keep track of URLs that were triggered.
-            new_tasks[url] = True # Placeholder to indicate it was triggered.
-
-        self.download_repository.cleanup_future_downloads()
-
-        # Clean up completed tasks from DownloadManager (if DownloadManager exposes a way to query)
-        # For now, this is implicitly handled by DownloadManager itself.
+        self.schedule_timer = schedule_timer
+        self.prewarm_s = prewarm_s
+        self.wait_interval_s = wait_interval_s
+        self.wait_timeout_s = wait_timeout_s
+        self.revalidator = revalidator
+        self.task: Optional[asyncio.Task] = None
+        self.scheduled_tasks = set() # tasks readying and starting the downloads taken off the timer
+
+    async def load(self):
+        """Loads the scheduled downloads, call before anything else schedules a download"""
+        await self.download_repository.cleanup_future_downloads()
+        self.schedule_timer.load(await self.download_repository.get_all_scheduled_downloads())
+        logger.info(f'Loaded {len(self.schedule_timer)} scheduled downloads')
+
+    def _dispatch_due(self):
+        for url, utcepoch in self.schedule_timer.pop_due(time.time() + self.prewarm_s):
+            task = asyncio.create_task(self._run_scheduled(url, utcepoch))
+            self.scheduled_tasks.add(task)
+            task.add_done_callback(self.scheduled_tasks.discard)
+
+    async def _probe(self, url: str) -> Optional[dict]:
+        """Extracts the info of url with the download's yt-dlp instance, which also keeps it warm.
+        Raises VideoUnavailableError if the video is private or removed."""
+        start = time.monotonic()
+        try:
+            info = await self.download_manager.prewarm_download(url)
+        except Exception as e:
+            if is_unavailable_error(str(e)):
+                raise VideoUnavailableError(str(e)) from e
+            logger.warning(f'Checking whether {url} is live failed: {e}')
+            return None
+        logger.debug(f'Checked {url} in {time.monotonic() - start:.1f}s')
+        return info
+
+    async def _reschedule(self, url: str, utcepoch: int, new_utcepoch: int):
+        """Hands a download whose start moved past the pre-warm window back to the timer"""
+        if await self.download_repository.reschedule_future_downloads([(url, utcepoch, new_utcepoch)], []):
+            logger.info(f'Start time of {url} moved from {utcepoch} to {new_utcepoch}')
+            self.schedule_timer.add(url, new_utcepoch)
+
+    async def _still_scheduled(self, url: str, utcepoch: int) -> bool:
+        row = await self.download_repository.get_future_download(url)
+        return row is not None and row[0] == utcepoch and bool(row[1])
+
+    async def _wait_for_live(self, url: str, utcepoch: int) -> Optional[dict]:
+        """Polls url until the video is live and returns its info dict. Returns None if the
+        scheduled download was cancelled or moved, or the video is gone or not live in time."""
+        if self.prewarm_s <= 0 and (delay := utcepoch - time.time()) > 0:
+            await asyncio.sleep(delay)
+        waiting = False
+        while True:
+            try:
+                info = await self._probe(url)
+            except VideoUnavailableError as e:
+                logger.info(f'Dropping scheduled download of {url}, the video is gone: {e}')
+                return None
+            # Upcoming videos have no formats yet
+            if info and info.get('live_status') != 'is_upcoming':
+                return info
+            release_timestamp = int(info.get('release_timestamp') or 0) if info else 0
+            if release_timestamp != utcepoch and release_timestamp > time.time() + self.prewarm_s:
+                await self._reschedule(url, utcepoch, release_timestamp)
+                return None
+            if not waiting:
+                logger.info(f'Waiting for {url} to go live, it is scheduled for {utcepoch}')
+                waiting = True
+            seconds_to_start = utcepoch - time.time()
+            if -seconds_to_start > self.wait_timeout_s:
+                logger.warning(f'{url} is still not live {-seconds_to_start:.0f}s after its start time, giving up')
+                return None
+            await asyncio.sleep(wait_for_live_interval(seconds_to_start, *self.wait_interval_s))
+            if not await self._still_scheduled(url, utcepoch):
+                return None
+
+    async def _log_start_lag(self, url: str, utcepoch: int):
+        while (download_task := self.download_manager.get_download(url)) and download_task.progress.started_at is None:
+            await asyncio.sleep(START_LAG_POLL_S)
+        if download_task:
+            slot_lag = (download_task.started_at or download_task.progress.started_at) - utcepoch
+            logger.info(f'Scheduled download of {url} started {slot_lag:.1f}s after its start time, '
+                        f'first data after {download_task.progress.started_at - utcepoch:.1f}s')
+
+    async def _run_scheduled(self, url: str, utcepoch: int):
+        try:
+            info = await self._wait_for_live(url, utcepoch)
+            # Cancelled or rescheduled downloads no longer match their row, ones given up on are dropped with it
+            if not await self.download_repository.claim_future_download(url, utcepoch):
+                logger.info(f'Scheduled download of {url} at {utcepoch} was cancelled or rescheduled')
+                return
+            if info is None:
+                return
+            logger.info(f'Scheduler initiating download of {url}')
+            # DownloadManager tracks the download from here on
+            await self.download_manager.start_download(url, notify=True, streamlink=False, priority=DownloadPriority.LIVE, info=info)
+            await self.download_repository.cleanup_future_downloads()
+            await self._log_start_lag(url, utcepoch)
+        except Exception as e:
+            logger.error(f'Starting scheduled download of {url} failed: {e}')
+
+    async def _run(self):
+        while True:
+            await self.schedule_timer.wait_until_due(self.prewarm_s)
+            self._dispatch_due()
 
     def start(self):
-        self._check_scheduled_downloads.start()
+        # on_ready fires again after every reconnect
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        if self.revalidator:
+            self.revalidator.start()
 
     def stop(self):
-        self._check_scheduled_downloads.cancel()
\ No newline at end of file
+        if self.task:
+            self.task.cancel()
+        if self.revalidator:
+            self.revalidator.stop()
+        for task in self.scheduled_tasks:
+            task.cancel()
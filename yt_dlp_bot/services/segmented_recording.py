@@ -0,0 +1,96 @@
+import logging
+import os
+import shutil
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_NAME = 'index.m3u8'
+INIT_NAME = 'init.mp4'
+# Records how far the segments were appended, so an interrupted append resumes cleanly
+PROGRESS_NAME = 'appended'
+
+def segment_dir_for(output: str) -> str:
+    return output + '.segments'
+
+def hls_segment_args(work_dir: str, segment_duration_s: int) -> list:
+    """ffmpeg output arguments cutting the input into fixed-duration fragmented MP4 segments.
+    The init segment followed by every media segment in order is itself a valid fragmented MP4."""
+    return ['-f', 'hls',
+            '-hls_time', str(segment_duration_s),
+            '-hls_list_size', '0',
+            '-hls_segment_type', 'fmp4',
+            '-hls_fmp4_init_filename', INIT_NAME,
+            '-hls_segment_filename', os.path.join(work_dir, 'segment_%06d.m4s'),
+            os.path.join(work_dir, PLAYLIST_NAME)]
+
+def _completed_segments(work_dir: str) -> list:
+    # ffmpeg only lists a segment in the playlist once it has been fully written
+    playlist = os.path.join(work_dir, PLAYLIST_NAME)
+    if not os.path.exists(playlist):
+        return []
+    with open(playlist) as f:
+        names = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return [os.path.join(work_dir, os.path.basename(name)) for name in names]
+
+def _read_progress(work_dir: str) -> tuple[Optional[str], int]:
+    """The last segment appended to the part file and the part's length after it"""
+    try:
+        with open(os.path.join(work_dir, PROGRESS_NAME)) as f:
+            name, length = f.read().split()
+        return name, int(length)
+    except (FileNotFoundError, ValueError):
+        return None, 0
+
+def _write_progress(work_dir: str, name: str, length: int):
+    path = os.path.join(work_dir, PROGRESS_NAME)
+    with open(path + '.tmp', 'w') as f:
+        f.write(f'{name} {length}\n')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+def append_completed_segments(work_dir: str, part_path: str) -> int:
+    """Appends the completed segments in work_dir to part_path and deletes them.
+    Returns the number of media segments appended.
+
+    The last appended segment and the part's length after it are recorded in work_dir
+    after every segment. A run interrupted mid-copy or before deleting a segment is
+    picked up from there, the part is cut back to the recorded length first."""
+    completed = _completed_segments(work_dir)
+    if not completed:
+        return 0
+    last_appended, length = _read_progress(work_dir)
+    names = [os.path.basename(path) for path in completed]
+    appended = names.index(last_appended) + 1 if last_appended in names else 0
+    for path in completed[:appended]:
+        # Appended before an interruption that came ahead of its deletion
+        if os.path.exists(path):
+            os.remove(path)
+    pending = [path for path in completed[appended:] if os.path.exists(path)]
+    if not pending:
+        return 0
+    with open(part_path, 'ab') as out:
+        out.truncate(length)
+        if length == 0:
+            pending.insert(0, os.path.join(work_dir, INIT_NAME))
+        for path in pending:
+            with open(path, 'rb') as segment:
+                shutil.copyfileobj(segment, out, 1024 * 1024)
+            if os.path.basename(path) == INIT_NAME:
+                continue
+            out.flush()
+            os.fsync(out.fileno())
+            _write_progress(work_dir, os.path.basename(path), os.fstat(out.fileno()).st_size)
+            os.remove(path)
+    return len(pending) - (1 if length == 0 else 0)
+
+def finalize_segments(work_dir: str, part_path: str, output: str) -> bool:
+    """Appends whatever segments are left and moves the joined recording to output"""
+    append_completed_segments(work_dir, part_path)
+    if not os.path.exists(part_path):
+        logger.warning(f'No segments were recorded into {part_path}')
+        return False
+    os.replace(part_path, output)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return True
@@ -3,23 +3,29 @@ from typing import Optional
 
 from yt_dlp_bot.repositories.subscription_repository import SubscriptionRepository
 from yt_dlp_bot.repositories.download_repository import DownloadRepository
+from yt_dlp_bot.repositories.async_repository import AsyncRepository
 from yt_dlp_bot.pikl_api.http_client import AsyncHttpClient
 from yt_dlp_bot.services.download_service import DownloadService
+from yt_dlp_bot.services.download_queue import DownloadPriority
+from yt_dlp_bot.services.schedule_timer import ScheduleTimer
+from yt_dlp_bot.services.metadata_cache import MetadataCache
 from yt_dlp_bot.database import YoutubeWaitingRoom, YoutubeVideo, RoomKind, SubscriptionModel
-from yt_dlp_bot.helpers import Config
+from yt_dlp_bot.helpers import Config, channel_url_for
 
 logger = logging.getLogger(__name__)
 
 class SubscriptionService:
-    def __init__(self, subscription_repository: SubscriptionRepository, http_client: AsyncHttpClient, download_service: DownloadService, download_repository: DownloadRepository, config: Config):
+    def __init__(self, subscription_repository: AsyncRepository[SubscriptionRepository], http_client: AsyncHttpClient, download_service: DownloadService, download_repository: AsyncRepository[DownloadRepository], schedule_timer: ScheduleTimer, metadata_cache: MetadataCache, config: Config):
         self.subscription_repository = subscription_repository
         self.http_client = http_client
         self.download_service = download_service
         self.download_repository = download_repository
+        self.schedule_timer = schedule_timer
+        self.metadata_cache = metadata_cache
         self.config = config
 
-    def subscribe_to_channel(self, youtube_channel: str, kind: RoomKind, guild_id: int, channel_id: int):
-        self.subscription_repository.subscribe_to_channel(youtube_channel, kind, guild_id, channel_id)
+    async def subscribe_to_channel(self, youtube_channel: str, kind: RoomKind, guild_id: int, channel_id: int):
+        await self.subscription_repository.subscribe_to_channel(youtube_channel, kind, guild_id, channel_id)
         # Assuming http_client.subscribe_to_channel is synchronous or we don't need to await it
         # For now, it's called here, but if it's async, it should be awaited.
         # Check AsyncHttpClient in yt_dlp_bot/pikl_api/waiting_room_client.py
@@ -32,35 +38,39 @@ class SubscriptionService:
         # No, the cog will call this method. The cog handles the await.
         pass # The actual API call will be done in the cog
 
-    def unsubscribe_from_channel(self, youtube_channel: str, kind: RoomKind | None, guild_id: int):
-        self.subscription_repository.unsubscribe_from_channel(youtube_channel, kind, guild_id)
+    async def unsubscribe_from_channel(self, youtube_channel: str, kind: RoomKind | None, guild_id: int):
+        await self.subscription_repository.unsubscribe_from_channel(youtube_channel, kind, guild_id)
         # Similar to subscribe, http_client call will be in cog
         pass
 
-    def receive_waiting_room(self, room: YoutubeWaitingRoom):
+    async def receive_waiting_room(self, room: YoutubeWaitingRoom):
         # Logic from Downloader.receive_waiting_room
-        if self.download_repository.add_subscribed_waiting_room(room, room.url):
-            guild_info = self.subscription_repository.get_guild_info_for_subscription(room.channel_id, room.kind)
+        if await self.download_repository.add_subscribed_waiting_room(room, room.url):
+            self.schedule_timer.add(room.url, room.utcepoch)
+            # Lets scans check the recording against one listing of its channel
+            await self.metadata_cache.record_channel(room.url, channel_url_for(room.channel_id))
+            guild_info = await self.subscription_repository.get_guild_info_for_subscription(room.channel_id, room.kind)
             for (guild_id, channel_id) in guild_info:
                 logger.info(f"Adding completion for {room.url}")
-                self.download_repository.add_completion_for_url(guild_id, channel_id, room.url)
+                await self.download_repository.add_completion_for_url(guild_id, channel_id, room.url)
 
     async def receive_stream_notification(self, video: YoutubeVideo):
         # Logic from Downloader.receive_stream_notification
-        guild_info = self.subscription_repository.get_guild_info_for_subscription(video.channel_id, RoomKind.STREAM)
+        guild_info = await self.subscription_repository.get_guild_info_for_subscription(video.channel_id, RoomKind.STREAM)
         if guild_info:
+            await self.metadata_cache.record_channel(video.url, channel_url_for(video.channel_id))
             # We take the first guild/channel as a "primary" for the initiate_download call
             # But we record completion for all of them
             for (guild_id, channel_id) in guild_info:
                 logger.info(f"Adding completion for {video.url}")
-                self.download_repository.add_completion_for_url(guild_id, channel_id, video.url)
+                await self.download_repository.add_completion_for_url(guild_id, channel_id, video.url)
             
             # Use the first one to start the download through service
             first_guild, first_channel = guild_info[0]
-            await self.download_service.initiate_download(video.url, first_guild, first_channel, streamlink=self.config.use_streamlink_for_subscriptions)
+            await self.download_service.initiate_download(video.url, first_guild, first_channel, streamlink=self.config.use_streamlink_for_subscriptions, priority=DownloadPriority.LIVE)
 
-    def get_subscriptions(self, guild_id: int) -> list[SubscriptionModel]:
-        raw_subscriptions = self.subscription_repository.get_subscriptions(guild_id)
+    async def get_subscriptions(self, guild_id: int) -> list[SubscriptionModel]:
+        raw_subscriptions = await self.subscription_repository.get_subscriptions(guild_id)
         subscriptions = []
         for guild_id, channel_id, youtube_channel, room_kind_value in raw_subscriptions:
             subscriptions.append(SubscriptionModel(
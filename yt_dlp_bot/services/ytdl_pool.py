@@ -0,0 +1,86 @@
+import json
+import logging
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+
+logger = logging.getLogger(__name__)
+
+class YoutubeDLPool:
+    """Pool of initialized YoutubeDL instances keyed by their option set.
+
+    Creating a YoutubeDL parses the options, loads the cookie jar and sets up
+    extractors, and each instance keeps its own HTTP session. Checking an instance
+    out of the pool instead reuses all of that along with the open connections.
+    An instance is used by one caller at a time and is reset when it is returned.
+    Cookies are saved when an instance is discarded or the pool is closed, not
+    after every use, so instances sharing a cookie file don't keep rewriting it."""
+    def __init__(self, max_idle_per_key: int = 4):
+        self.max_idle_per_key = max_idle_per_key
+        self._idle = {} # option key -> list of idle YoutubeDL
+        self._params = {} # YoutubeDL -> params right after construction
+        self._lock = threading.Lock()
+
+    def _key(self, options: dict) -> str:
+        return json.dumps(options, sort_keys=True, default=repr)
+
+    @contextmanager
+    def checkout(self, options: dict, progress_hooks: list = ()):
+        """Yields a YoutubeDL built from options, progress_hooks only apply to this use"""
+        key = self._key(options)
+        with self._lock:
+            idle = self._idle.get(key)
+            ydl = idle.pop() if idle else None
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(options)
+            self._params[ydl] = dict(ydl.params)
+        for hook in progress_hooks:
+            ydl.add_progress_hook(hook)
+        try:
+            yield ydl
+        finally:
+            self._checkin(key, ydl, progress_hooks)
+
+    def _reset(self, ydl, progress_hooks: list):
+        # Undo per-use changes such as ratelimit updates
+        ydl.params.clear()
+        ydl.params.update(self._params[ydl])
+        # yt-dlp has no public way to remove progress hooks or reset its counters. An instance
+        # whose hooks can't be removed is discarded rather than reused with another caller's hooks.
+        if progress_hooks:
+            if not isinstance(getattr(ydl, '_progress_hooks', None), list):
+                raise RuntimeError('its progress hooks cannot be removed')
+            ydl._progress_hooks.clear()
+        if hasattr(ydl, '_download_retcode'):
+            ydl._download_retcode = 0
+        # Counts towards max_downloads and %(autonumber)s
+        if hasattr(ydl, '_num_downloads'):
+            ydl._num_downloads = 0
+
+    def _checkin(self, key: str, ydl, progress_hooks: list = ()):
+        try:
+            self._reset(ydl, progress_hooks)
+        except Exception as e:
+            logger.warning(f'Discarding YoutubeDL instance that failed to reset: {e}')
+            self._discard(ydl)
+            return
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(ydl)
+                return
+        self._discard(ydl)
+
+    def _discard(self, ydl):
+        self._params.pop(ydl, None)
+        # Saves the cookies
+        ydl.close()
+
+    def close(self):
+        """Closes the idle instances, call on shutdown"""
+        with self._lock:
+            idle = [ydl for instances in self._idle.values() for ydl in instances]
+            self._idle.clear()
+        for ydl in idle:
+            self._discard(ydl)